@@ -79,6 +79,7 @@ if not( 'RIFT_LOWLATENCY'  in os.environ):
     print(" - No healpy - ")
 
 from RIFT.integrators.statutils import  update,finalize, init_log,update_log,finalize_log
+from RIFT.integrators.statutils import  log_aggregate_to_array, log_aggregate_from_array, save_checkpoint, load_checkpoint
 
 #from multiprocessing import Pool
 
@@ -421,6 +422,30 @@ class MCSampler(object):
         self.delta_V  = delta_V
         
 
+    def checkpoint_state(self):
+        """
+        Flat dictionary of numpy arrays describing the current hypercube set (bin widths, occupied bins, draws per bin).
+        The live-point reservoir is owned by integrate_log, which adds it to this dictionary.
+        """
+        state = {}
+        state['params_ordered'] = numpy.array([str(p) for p in self.params_ordered])
+        state['nbins'] = numpy.array(self.nbins, dtype=float)
+        state['dx'] = numpy.array(self.dx, dtype=float)
+        state['binunique'] = numpy.array(self.binunique)
+        state['ninbin'] = numpy.array(self.ninbin, dtype=int)
+        return state
+
+    def restore_state(self, state):
+        """
+        Inverse of checkpoint_state.  Call after setup().
+        """
+        if list(state['params_ordered']) != [str(p) for p in self.params_ordered]:
+            raise ValueError(" mcsamplerAV: checkpoint parameters {} do not match sampler {} ".format(list(state['params_ordered']), self.params_ordered))
+        self.nbins = state['nbins']
+        self.dx = state['dx']
+        self.binunique = state['binunique']
+        self.ninbin = state['ninbin']
+
     @profile
     def integrate_log(self, lnF, *args, xpy=xpy_default,**kwargs):
         """
@@ -441,6 +466,7 @@ class MCSampler(object):
         floor_level -- *total probability* of a uniform distribution, averaged with the weighted sampled distribution, to generate a new sampled distribution
         n_adapt -- number of chunks over which to allow the pdf to adapt. Default is zero, which will turn off adaptive sampling regardless of other settings
         convergence_tests - dictionary of function pointers, each accepting self._rvs and self.params as arguments. CURRENTLY ONLY USED FOR REPORTING
+        checkpoint_file -- if provided, the hypercube set, threshold, and live points are saved there every checkpoint_every cycles, and restored from it (if present) on start. Removed on successful completion.
         Pinning a value: By specifying a kwarg with the same of an existing parameter, it is possible to "pin" it. The sample draws will always be that value, and the sampling prior will use a delta function at that value.
         """
 
@@ -473,6 +499,8 @@ class MCSampler(object):
         n = int(kwargs["n"] if "n" in kwargs else min(100000, nmax))
         convergence_tests = kwargs["convergence_tests"] if "convergence_tests" in kwargs else None
         save_no_samples = kwargs["save_no_samples"] if "save_no_samples" in kwargs else None
+        checkpoint_file = kwargs["checkpoint_file"] if "checkpoint_file" in kwargs else None
+        checkpoint_every = int(kwargs["checkpoint_every"]) if "checkpoint_every" in kwargs else 1
 
 
         #
@@ -543,7 +571,34 @@ class MCSampler(object):
           allloglkl = identity_convert_togpu(allloglkl)
 
         ntotal_true = 0
+
+        # Resume from checkpoint, if one is present
+        if checkpoint_file and os.path.exists(checkpoint_file):
+            state = load_checkpoint(checkpoint_file)
+            self.restore_state(state)
+            current_log_aggregate = log_aggregate_from_array(state['log_aggregate'], xpy=xpy)
+            self.ntotal = current_log_aggregate[0]
+            allx = xpy_here.asarray(state['allx'])
+            allloglkl = xpy_here.asarray(state['allloglkl'])
+            allp = xpy_here.asarray(state['allp'])
+            loglkl_thr, trunc_p, V, eff_samp = [float(state[x]) for x in ['loglkl_thr', 'trunc_p', 'V', 'eff_samp']]
+            ntotal_true, cycle = int(state['ntotal_true']), int(state['cycle'])
+            print(" mcsamplerAV: resuming from checkpoint {} at cycle {}, ntotal = {} ".format(checkpoint_file, cycle, ntotal_true))
+
         while (eff_samp < neff and ntotal_true < nmax ): #  and (not bConvergenceTests):
+            # Checkpoint: state as of the end of the previous cycle
+            if checkpoint_file and cycle > 1 and ((cycle-1) % checkpoint_every == 0):
+                state = self.checkpoint_state()
+                state['log_aggregate'] = log_aggregate_to_array(current_log_aggregate)
+                state['allx'] = identity_convert(allx)
+                state['allloglkl'] = identity_convert(allloglkl)
+                state['allp'] = identity_convert(allp)
+                for name, val in [['loglkl_thr', loglkl_thr], ['trunc_p', trunc_p], ['V', V], ['eff_samp', eff_samp]]:
+                    state[name] = numpy.float64(identity_convert(val))
+                state['ntotal_true'] = numpy.int64(ntotal_true)
+                state['cycle'] = numpy.int64(cycle)
+                save_checkpoint(checkpoint_file, state)
+
             # Draw samples. Note state variables binunique, ninbin -- so we can re-use the sampler later outside the loop
             rv, log_joint_p_prior = self.draw_simple()  # Beware reversed order of rv
             ntotal_true += len(rv)
@@ -635,6 +690,10 @@ class MCSampler(object):
             if cycle > 1000:
                 break
 
+        # Integration finished: checkpoint no longer needed (and must not be picked up by a later integral)
+        if checkpoint_file and os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+
         # VT approach was to accumulate samples, but then prune them.  So we have all the lnL and x draws
 
         # write in variables requested in the standard format
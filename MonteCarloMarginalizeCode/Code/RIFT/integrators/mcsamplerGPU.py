@@ -79,6 +79,7 @@ if not( 'RIFT_LOWLATENCY'  in os.environ):
     print(" - No healpy - ")
 
 from ..integrators.statutils import  update,finalize, init_log,update_log,finalize_log
+from ..integrators.statutils import  log_aggregate_to_array, log_aggregate_from_array, save_checkpoint, load_checkpoint
 
 #from multiprocessing import Pool
 
@@ -308,6 +309,58 @@ class MCSampler(object):
         self.histogram_values[param] = histogram_values
 
 
+    def compute_hist_batched(self, x_samples, params, weights=None, floor_level=0):
+        """
+        Same as compute_hist, for several parameters at once: one histogram call and one cumsum for all of them.
+        x_samples has shape (len(params), n_samples), or is a list of such 1d arrays.  All params must have the same number of bins.
+        """
+        n_bins = self.n_bins[params[0]]
+        x_min = self.xpy.asarray([self.x_min[p] for p in params])[:,None]
+        x_max_minus_min = self.xpy.asarray([self.x_max_minus_min[p] for p in params])[:,None]
+        histogram_values = vectorized_general_tools.histogram_batched(
+            x_samples, n_bins,
+            xpy=self.xpy,
+            weights=weights,
+            x_min=x_min, x_max_minus_min=x_max_minus_min
+        )
+        # renormalize, mix with uniform, and build CDF, as in compute_hist
+        histogram_values *= 1./self.xpy.sum(histogram_values, axis=1)[:,None]
+        histogram_values = histogram_values*(1-floor_level) + floor_level/n_bins
+        histogram_cdf = self.xpy.zeros((len(params), n_bins+1), dtype=numpy.float64)
+        self.xpy.cumsum(histogram_values, axis=1, out=histogram_cdf[:,1:])
+        histogram_values /= x_max_minus_min/n_bins
+
+        for indx, p in enumerate(params):
+            self.histogram_cdf[p] = histogram_cdf[indx]
+            self.histogram_values[p] = histogram_values[indx]
+
+    def use_hist_sampling(self, param):
+        """
+        Sample param from its current histogram.  The cdf inverse is tagged, so draw_simplified can draw
+        all histogram-sampled parameters together.
+        """
+        def pdf_here(arg):
+            return self.pdf_from_hist(arg, param)
+        def cdf_inv_here(arg):
+            return self.cdf_inverse_from_hist(arg, param)
+        cdf_inv_here.from_hist = True
+        self.pdf[param] = pdf_here
+        self.cdf_inv[param] = cdf_inv_here
+
+    def update_hist_sampling(self, rvs, params, n_history, weights=None, floor_level=0):
+        """
+        Rebuild the histogram sampling distributions of params from the last n_history samples in rvs, and sample from them.
+        Parameters with the same number of bins are histogrammed together.
+        """
+        groups = defaultdict(list)
+        for p in params:
+            groups[self.n_bins[p]].append(p)
+        for params_here in groups.values():
+            points = [rvs[p][-n_history:] for p in params_here]
+            self.compute_hist_batched(points, params_here, weights=weights, floor_level=floor_level)
+        for p in params:
+            self.use_hist_sampling(p)
+
     def cdf_inverse_from_hist(self, P, param,old_style=False):
         # Compute the value of the inverse CDF, but scaled to [0, 1].
        """
@@ -419,8 +472,36 @@ class MCSampler(object):
         joint_p_s = self.xpy.ones(n_samples, dtype=numpy.float64)
         joint_p_prior = self.xpy.ones(n_samples, dtype=numpy.float64)
 
+        # Parameters sampled from histograms are drawn together: one uniform draw and one inverse-cdf pass per bin count
+        hist_groups = defaultdict(list)
+        for i, param in enumerate(args):
+            if getattr(self.cdf_inv.get(param), 'from_hist', False):
+                hist_groups[self.n_bins[param]].append(i)
+        for n_bins_here, indx_here in hist_groups.items():
+            params_here = [args[i] for i in indx_here]
+            unif_samples = self.xpy.random.uniform(0.0, 1.0, (len(params_here), n_samples))
+            histogram_cdf = self.xpy.stack([self.histogram_cdf[p] for p in params_here])
+            y_samples, indices = vectorized_general_tools.inverse_cdf_batched(unif_samples, histogram_cdf, xpy=self.xpy, return_bins=True)
+            x_min = self.xpy.asarray([self.x_min[p] for p in params_here])[:,None]
+            x_max_minus_min = self.xpy.asarray([self.x_max_minus_min[p] for p in params_here])[:,None]
+            y_samples *= x_max_minus_min
+            y_samples += x_min
+            rv[indx_here] = y_samples
+            # sampling pdf: histogram value in the bin of each sample
+            for k, p in enumerate(params_here):
+                joint_p_s *= self.histogram_values[p][indices[k]]
+        indx_hist = set(i for indx_here in hist_groups.values() for i in indx_here)
+
         # Iterate over the parameters.
         for i, param in enumerate(args):
+            if i in indx_hist:
+                param_samples = rv[i]
+                prior_vals = self.prior_pdf[param](param_samples)
+                if isinstance(prior_vals, self.xpy.ndarray):
+                  joint_p_prior *= prior_vals
+                else:
+                  joint_p_prior *= identity_convert_togpu(prior_vals)
+                continue
             # Do inverse CDF sampling for the parameter.
             unif_samples = self.xpy.random.uniform(0.0, 1.0, n_samples)
             param_samples = self.cdf_inv[param](unif_samples)
@@ -549,24 +630,46 @@ class MCSampler(object):
       if weights_alt.dtype == numpy.float128:
         weights_alt = weights_alt.astype(numpy.float64,copy=False)
 
-      def function_wrapper(f, p):
-          def inner(arg):
-            return f(arg, p)
-          return inner
-
-
-      for itr, p in enumerate(self.params_ordered):
-                # # FIXME: The second part of this condition should be made more
-                # # specific to pinned parameters
-                if p not in self.adaptive or p in list(kwargs.keys()):
-                    continue
+      # # FIXME: The second part of this condition should be made more
+      # # specific to pinned parameters
+      params_adapt = [p for p in self.params_ordered if p in self.adaptive and not(p in kwargs)]
+      self.update_hist_sampling(rvs_here, params_adapt, n_history_to_use, weights=weights_alt, floor_level=floor_integrated_probability)
 
-                points = rvs_here[p][-n_history_to_use:]
-                self.compute_hist(points, p,weights=weights_alt,floor_level=floor_integrated_probability)
-                self.pdf[p] = function_wrapper(self.pdf_from_hist, p)
-                self.cdf_inv[p] = function_wrapper(self.cdf_inverse_from_hist, p)
 
 
+    def checkpoint_state(self):
+        """
+        Flat dictionary of numpy arrays describing the adapted sampling distribution (1d histograms) and the retained samples (self._rvs).
+        Together with the running log aggregate, this is what integrate_log needs to resume.
+        """
+        state = {}
+        state['params_ordered'] = numpy.array([str(p) for p in self.params_ordered])
+        hist_params = [p for p in self.params_ordered if p in self.histogram_values]
+        state['hist_params'] = numpy.array(hist_params, dtype=str)
+        for p in hist_params:
+            state['hist_values:'+p] = identity_convert(self.histogram_values[p])
+            state['hist_cdf:'+p] = identity_convert(self.histogram_cdf[p])
+        for key in self._rvs:
+            state['rvs:'+key] = identity_convert(self._rvs[key])
+        return state
+
+    def restore_state(self, state):
+        """
+        Inverse of checkpoint_state.  Histograms must already be set up (setup_hist_single_param) with the same number of bins.
+        """
+        if list(state['params_ordered']) != [str(p) for p in self.params_ordered]:
+            raise ValueError(" mcsamplerGPU: checkpoint parameters {} do not match sampler {} ".format(list(state['params_ordered']), self.params_ordered))
+        for p in state['hist_params']:
+            p = str(p)
+            if len(state['hist_cdf:'+p]) != len(self.histogram_cdf[p]):
+                raise ValueError(" mcsamplerGPU: checkpoint histogram size mismatch for {} ".format(p))
+            self.histogram_values[p] = self.xpy.asarray(state['hist_values:'+p])
+            self.histogram_cdf[p] = self.xpy.asarray(state['hist_cdf:'+p])
+            self.use_hist_sampling(p)
+        self._rvs = {}
+        for key in state:
+            if key.startswith('rvs:'):
+                self._rvs[key[4:]] = self.xpy.asarray(state[key])
 
     @profile
     def integrate_log(self, lnF, *args, xpy=xpy_default,**kwargs):
@@ -588,6 +691,7 @@ class MCSampler(object):
         floor_level -- *total probability* of a uniform distribution, averaged with the weighted sampled distribution, to generate a new sampled distribution
         n_adapt -- number of chunks over which to allow the pdf to adapt. Default is zero, which will turn off adaptive sampling regardless of other settings
         convergence_tests - dictionary of function pointers, each accepting self._rvs and self.params as arguments. CURRENTLY ONLY USED FOR REPORTING
+        checkpoint_file -- if provided, the running integral, adapted histograms, and retained samples are saved there every checkpoint_every chunks, and restored from it (if present) on start. Removed on successful completion.
         Pinning a value: By specifying a kwarg with the same of an existing parameter, it is possible to "pin" it. The sample draws will always be that value, and the sampling prior will use a delta function at that value.
         """
 
@@ -625,6 +729,8 @@ class MCSampler(object):
         n = int(kwargs["n"] if "n" in kwargs else min(1000, nmax))
         convergence_tests = kwargs["convergence_tests"] if "convergence_tests" in kwargs else None
         save_no_samples = kwargs["save_no_samples"] if "save_no_samples" in kwargs else None
+        checkpoint_file = kwargs["checkpoint_file"] if "checkpoint_file" in kwargs else None
+        checkpoint_every = int(kwargs["checkpoint_every"]) if "checkpoint_every" in kwargs else 1
 
 
         #
@@ -674,8 +780,31 @@ class MCSampler(object):
             bConvergenceTests = False    # if tests are not available, assume not converged. The other criteria will stop it
             last_convergence_test = defaultdict(lambda: False)   # need record of tests to be returned always
         n_zero_prior =0
+        n_chunks_done = 0
+
+        # Resume from checkpoint, if one is present
+        if checkpoint_file and os.path.exists(checkpoint_file):
+            state = load_checkpoint(checkpoint_file)
+            self.restore_state(state)
+            current_log_aggregate = log_aggregate_from_array(state['log_aggregate'], xpy=xpy)
+            outvals = finalize_log(current_log_aggregate,xpy=xpy)
+            self.ntotal = current_log_aggregate[0]
+            maxlnL, maxval, eff_samp = float(state['maxlnL']), float(state['maxval']), float(state['eff_samp'])
+            n_chunks_done = int(state['n_chunks_done'])
+            print(" mcsamplerGPU: resuming from checkpoint {} after {} chunks, ntotal = {} ".format(checkpoint_file, n_chunks_done, self.ntotal))
+
         while (eff_samp < neff and self.ntotal < nmax): #  and (not bConvergenceTests):
 
+            # Checkpoint: state as of the end of the previous chunk (including any adaptation)
+            if checkpoint_file and n_chunks_done > 0 and (n_chunks_done % checkpoint_every == 0):
+                state = self.checkpoint_state()
+                state['log_aggregate'] = log_aggregate_to_array(current_log_aggregate)
+                state['maxlnL'] = numpy.float64(identity_convert(maxlnL))
+                state['maxval'] = numpy.float64(identity_convert(maxval))
+                state['eff_samp'] = numpy.float64(identity_convert(eff_samp))
+                state['n_chunks_done'] = numpy.int64(n_chunks_done)
+                save_checkpoint(checkpoint_file, state)
+
             # Draw our sample points
             # Non-log draw
             joint_p_s, joint_p_prior, rv = self.draw_simplified(
@@ -759,6 +888,7 @@ class MCSampler(object):
               current_log_aggregate = update_log(current_log_aggregate, log_integrand,xpy=xpy,special=xpy_special_default)
             outvals = finalize_log(current_log_aggregate,xpy=xpy)
             self.ntotal = current_log_aggregate[0]
+            n_chunks_done += 1
             # effective samples
             maxval = max(maxval, identity_convert(self.xpy.max(log_integrand) ))
 
@@ -797,30 +927,18 @@ class MCSampler(object):
                 continue
 
             #
-            # Iterate through each of the parameters, updating the sampling
-            # prior PDF according to the 1-D marginalization
+            # Update the sampling prior PDF of all adaptive parameters according to their 1-D marginalizations
             #
-            def function_wrapper(f, p):
-                def inner(arg):
-                    return f(arg, p)
-                return inner
-
             weights_alt = self._rvs["log_integrand"][-n_history:]+np.max([maxlnL, 200])  # try to make sure we have some dynamic range here
             weights_alt = self.xpy.maximum(weights_alt, 1e-5)  # prevent negative weights. NOTE THIS IS IMPORTANT: if you are integrating a function with lnL<0, use an offset!
             weights_alt = weights_alt/(weights_alt.sum())
             if weights_alt.dtype == numpy.float128:
               weights_alt = weights_alt.astype(numpy.float64,copy=False)
 
-            for itr, p in enumerate(self.params_ordered):
-                # # FIXME: The second part of this condition should be made more
-                # # specific to pinned parameters
-                if p not in self.adaptive or p in list(kwargs.keys()):
-                    continue
-
-                points = self._rvs[p][-n_history:]
-                self.compute_hist(points, p,weights=weights_alt,floor_level=floor_integrated_probability)
-                self.pdf[p] = function_wrapper(self.pdf_from_hist, p)
-                self.cdf_inv[p] = function_wrapper(self.cdf_inverse_from_hist, p)
+            # # FIXME: The second part of this condition should be made more
+            # # specific to pinned parameters
+            params_adapt = [p for p in self.params_ordered if p in self.adaptive and not(p in kwargs)]
+            self.update_hist_sampling(self._rvs, params_adapt, n_history, weights=weights_alt, floor_level=floor_integrated_probability)
 
         # If we were pinning any values, undo the changes we did before
         self.cdf_inv.update(tempcdfdict)
@@ -828,6 +946,10 @@ class MCSampler(object):
         self._pdf_norm.update(temppdfnormdict)
         self.prior_pdf.update(temppriordict)
 
+        # Integration finished: checkpoint no longer needed (and must not be picked up by a later integral)
+        if checkpoint_file and os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+
         # Clean out the _rvs arrays for 'irrelevant' points
         #   - find and remove samples with  lnL less than maxlnL - deltalnL (latter user-specified)
         #   - create the cumulative weights
@@ -1202,14 +1324,8 @@ class MCSampler(object):
                 continue
 
             #
-            # Iterate through each of the parameters, updating the sampling
-            # prior PDF according to the 1-D marginalization
+            # Update the sampling prior PDF of all adaptive parameters according to their 1-D marginalizations
             #
-            def function_wrapper(f, p):
-                def inner(arg):
-                    return f(arg, p)
-                return inner
-
             if not(save_intg):
                 print("Direct access ")
                 weights_alt = int_vals**tempering_exp
@@ -1232,20 +1348,10 @@ class MCSampler(object):
               weights_alt = weights_alt.astype(numpy.float64,copy=False)
 #            weights_alt = floor_integrated_probability*xpy_default.ones(len(weights_alt))/len(weights_alt) + (1-floor_integrated_probability)*weights_alt
 
-            for itr, p in enumerate(self.params_ordered):
-                # # FIXME: The second part of this condition should be made more
-                # # specific to pinned parameters
-                if p not in self.adaptive or p in list(kwargs.keys()):
-                    continue
-
-                points = self._rvs[p][-n_history:]
-                self.compute_hist(points, p,weights=weights_alt,floor_level=floor_integrated_probability)
-            #    if p == 'declination':
-            #          vals = identity_convert(self.histogram_values[p])
-            #          print(vals)
-            #          print(np.mean(vals),np.std(vals))
-                self.pdf[p] = function_wrapper(self.pdf_from_hist, p)
-                self.cdf_inv[p] = function_wrapper(self.cdf_inverse_from_hist, p)
+            # # FIXME: The second part of this condition should be made more
+            # # specific to pinned parameters
+            params_adapt = [p for p in self.params_ordered if p in self.adaptive and not(p in kwargs)]
+            self.update_hist_sampling(self._rvs, params_adapt, n_history, weights=weights_alt, floor_level=floor_integrated_probability)
 
         # If we were pinning any values, undo the changes we did before
         self.cdf_inv.update(tempcdfdict)
@@ -9,6 +9,7 @@ np=numpy #import numpy as np
 from scipy import integrate, interpolate, special
 import itertools
 import functools
+import time
 
 from copy import deepcopy
 
@@ -114,6 +115,35 @@ def portfolio_default_weights(n_ess_list, wt_previous, portfolio_probability_flo
   net = (rewt * history_factor + wt_previous*(1-history_factor))
   return net/np.sum(net) # make SURE normalized correctly
 
+def portfolio_cost_weights(n_ess_list, wt_previous, cost_list=None, portfolio_probability_floor=0.01, history_factor=0.5, xpy=xpy_default, identity_convert=lambda x:x, **kwargs):
+  """
+  Reweight members by effective samples per second of wallclock (n_ess/cost), rather than by n_ess alone.
+  cost_list : seconds charged to each member for the last chunk (draw + share of lnL evaluation + sampler update)
+  Members with no cost this chunk (e.g., inactive before their breakpoint) get no credit, only the probability floor.
+  Falls back to portfolio_default_weights if no usable cost information is available.
+  """
+  assert len(n_ess_list) == len(wt_previous)
+  if cost_list is None:
+    return portfolio_default_weights(n_ess_list, wt_previous, portfolio_probability_floor=portfolio_probability_floor, history_factor=history_factor)
+  cost = np.array(cost_list,dtype=float)
+  if len(cost) != len(n_ess_list):
+    return portfolio_default_weights(n_ess_list, wt_previous, portfolio_probability_floor=portfolio_probability_floor, history_factor=history_factor)
+  indx_costed = np.logical_and(np.isfinite(cost), cost > 0)
+  if not(np.any(indx_costed)):
+    return portfolio_default_weights(n_ess_list, wt_previous, portfolio_probability_floor=portfolio_probability_floor, history_factor=history_factor)
+
+  vals = np.array(n_ess_list,dtype=float) - 1  # will be non-negative
+  # don't update if we have insane answers
+  if any(np.isnan(vals[indx_costed])):
+    return wt_previous
+  rewt = np.zeros(len(vals))
+  rewt[indx_costed] = vals[indx_costed]/cost[indx_costed]   # effective samples per second
+  if np.sum(rewt) <= 0:
+    return wt_previous
+  rewt = np.ones(len(rewt))*portfolio_probability_floor + (rewt/np.sum(rewt)) * (1-portfolio_probability_floor)
+  net = (rewt * history_factor + wt_previous*(1-history_factor))
+  return net/np.sum(net) # make SURE normalized correctly
+
 
 ###
 ### PORTFOLIO CLASS
@@ -178,6 +208,20 @@ class MCSampler(object):
         # extra args, created during setup
         self.extra_args = {}
 
+        # wallclock cost bookkeeping, per member.  '_last' arrays hold the most recent chunk/update
+        self.reset_portfolio_timing()
+
+    def reset_portfolio_timing(self):
+        n_members = len(self.portfolio_realizations)
+        self.portfolio_time_draw_last = np.zeros(n_members)
+        self.portfolio_time_update_last = np.zeros(n_members)
+        self.portfolio_n_draw_last = np.zeros(n_members,dtype=int)
+        self.portfolio_time_draw = np.zeros(n_members)
+        self.portfolio_time_update = np.zeros(n_members)
+        self.portfolio_time_lnL = np.zeros(n_members)  # share of integrand evaluation time, in proportion to samples drawn
+        self.portfolio_n_draw = np.zeros(n_members,dtype=int)
+        self.portfolio_n_ess = np.zeros(n_members)
+
     def add_parameter(self, params, pdf,  **kwargs):
         """
         Add one (or more) parameters to sample dimensions. params is either a string describing the parameter, or a tuple of strings. The tuple will indicate to the sampler that these parameters must be sampled together. left_limit and right_limit are on the infinite interval by default, but can and probably should be specified. If several params are given, left_limit, and right_limit must be a set of tuples with corresponding length. Sampling PDF is required, and if not provided, the cdf inverse function will be determined numerically from the sampling PDF.
@@ -253,9 +297,15 @@ class MCSampler(object):
         portfolio_active = [self.portfolio_realizations[x] for x in indx_active] # get the active portfolio members
 #        print(" \t ",indx_active, self.portfolio_breakpoints, self.portfolio_draw_iteration)
 
+        self.portfolio_time_draw_last[:] = 0
+        self.portfolio_n_draw_last[:] = 0
+
         # if only one method is active, just call the low-level function
         if len(indx_active) == 1:
+           t_start = time.perf_counter()
            joint_p_s, joint_p_prior, rv = self.portfolio[indx_active[0]].draw_simplified(n_samples, *self.params_ordered, **kwargs)
+           self.portfolio_time_draw_last[indx_active[0]] = time.perf_counter() - t_start
+           self.portfolio_n_draw_last[indx_active[0]] = n_samples
         else:
           # Identify number of samples per member of the portfolio. Can be zero.
           n_samples_per_member = ((np.array(weights_active))*n_samples).astype(int)
@@ -274,9 +324,12 @@ class MCSampler(object):
           # Draw in blocks, and copy in place
           # only draw from ACTIVE members
           for indx_member, member in enumerate(portfolio_active):
+            t_start = time.perf_counter()
             joint_p_s_here, joint_p_prior_here, rv_here = member.draw_simplified(
                 n_samples_per_member[indx_member], *self.params_ordered, **kwargs
                 )
+            self.portfolio_time_draw_last[indx_active[indx_member]] = time.perf_counter() - t_start
+            self.portfolio_n_draw_last[indx_active[indx_member]] = n_samples_per_member[indx_member]
             # type convert as needed, to GPU
             if not(isinstance( type(joint_p_s_here), type(joint_p_s))):
               joint_p_s_here = self.identity_convert_togpu(joint_p_s_here)
@@ -322,7 +375,10 @@ class MCSampler(object):
         n = int(kwargs["n"] if "n" in kwargs else min(100000, nmax))
         convergence_tests = kwargs["convergence_tests"] if "convergence_tests" in kwargs else None
         save_no_samples = kwargs["save_no_samples"] if "save_no_samples" in kwargs else None
-        portfolio_wt_func = kwargs['portfolio_schedule'] if 'portfolio_schedule' in kwargs else portfolio_default_weights
+        portfolio_cost_aware = kwargs['portfolio_cost_aware'] if 'portfolio_cost_aware' in kwargs else False
+        portfolio_wt_func = portfolio_cost_weights if portfolio_cost_aware else portfolio_default_weights
+        if 'portfolio_schedule' in kwargs and kwargs['portfolio_schedule']:
+            portfolio_wt_func = kwargs['portfolio_schedule']
 
         #
         # Adaptive sampling parameters
@@ -376,6 +432,8 @@ class MCSampler(object):
 #        self.setup()  # sets up self.my_ranges, self.dx initially
 
 
+        self.reset_portfolio_timing()
+
         n_zero_prior =0
         it_max_oracle = 3
         it_now  =0
@@ -412,10 +470,12 @@ class MCSampler(object):
             unpacked = dict(list(zip(params, unpacked)))
 
             # Evaluate function, protecting argument order
+            t_start = time.perf_counter()
             if 'no_protect_names' in kwargs:
                 lnL = lnF(*unpacked0)  # do not protect order
             else:
                 lnL= lnF(**unpacked)  # protect order using dictionary
+            t_lnL = time.perf_counter() - t_start
             # take log if we are NOT using lnL
             if cupy_ok:
               if not(isinstance(lnL,cupy.ndarray)):
@@ -473,10 +533,6 @@ class MCSampler(object):
                 print("WARNING: User requested maximum number of samples reached... bailing.", file=sys.stderr)
 
 
-            if self.ntotal > n_adapt*n:
-                print(n_adapt,self.n_total)
-                continue
-
             ###
             ### PORTFOLIO REPORT BLOCK (and reweighting of member priority)
             ###
@@ -505,7 +561,20 @@ class MCSampler(object):
             print("\t",portfolio_report)
             # Weight based on n_ESS from batch.  remember these are >=1, so no negatives or 0 will happen
             dat =np.array([ portfolio_report[k][1] for k in range(len(self.portfolio))])
-            self.portfolio_weights = portfolio_wt_func(dat, self.portfolio_weights, xpy=self.xpy, identity_convert=self.identity_convert) # call weighting function
+            # Wallclock cost of this chunk, per member: own draw time, share of lnL evaluation (by number of samples), and most recent update
+            n_draw_now = np.sum(self.portfolio_n_draw_last)
+            time_lnL_here = t_lnL*self.portfolio_n_draw_last/n_draw_now if n_draw_now > 0 else np.zeros(len(self.portfolio))
+            cost_now = self.portfolio_time_draw_last + time_lnL_here + self.portfolio_time_update_last
+            self.portfolio_time_draw += self.portfolio_time_draw_last
+            self.portfolio_time_lnL += time_lnL_here
+            self.portfolio_n_draw += self.portfolio_n_draw_last
+            self.portfolio_n_ess += dat
+            if self.ntotal > n_adapt*n:
+                # adaptation finished: timing stays cumulative, but weights and samplers are no longer updated
+                continue
+            if portfolio_cost_aware:
+                print("\t cost (s) ", cost_now, " n_ess/s ", dat/np.maximum(cost_now, 1e-12))
+            self.portfolio_weights = portfolio_wt_func(dat, self.portfolio_weights, cost_list=cost_now, xpy=self.xpy, identity_convert=self.identity_convert) # call weighting function
 
               
             ###
@@ -540,15 +609,19 @@ class MCSampler(object):
             update_dict = {}
             update_dict.update(self.extra_args)
             update_dict['tempering_exp'] =tempering_exp
+            self.portfolio_time_update_last[:] = 0
             for indx, member in enumerate(self.portfolio_realizations):
                 # update sampling prior, using ALL past data
                 # Don't update samples which are not being drawn
                 if self.portfolio_weights[indx] > self.portfolio_freeze_wt and self.portfolio_draw_iteration > self.portfolio_breakpoints[indx]:  
+                  t_start = time.perf_counter()
                   if not(hasattr(member, 'is_varaha')):
                     member.update_sampling_prior(log_weights, n_history,external_rvs=rvs_train,log_scale_weights=True, **update_dict)
                   else:
                     # just do a single VARAHA step, independent of others
                     member.update_sampling_prior_selfish(lnF)
+                  self.portfolio_time_update_last[indx] = time.perf_counter() - t_start
+                  self.portfolio_time_update[indx] += self.portfolio_time_update_last[indx]
                 else:
                   if self.portfolio_draw_iteration > self.portfolio_breakpoints[indx]:  
                     print("   - frozen sampling for member {} {}".format(indx, self.portfolio_weights[indx]))
@@ -615,6 +688,18 @@ class MCSampler(object):
 
         # Create extra dictionary to return things
         dict_return ={}
+        # per-member wallclock accounting (seconds), cumulative over this integration
+        time_total = self.portfolio_time_draw + self.portfolio_time_lnL + self.portfolio_time_update
+        dict_return['portfolio_timing'] = {
+            'weights': np.array(self.portfolio_weights),
+            'n_samples': np.array(self.portfolio_n_draw),
+            'n_ess': np.array(self.portfolio_n_ess),
+            'time_draw': np.array(self.portfolio_time_draw),
+            'time_lnL': np.array(self.portfolio_time_lnL),
+            'time_update': np.array(self.portfolio_time_update),
+            'time_total': time_total,
+            'n_ess_per_second': np.where(time_total>0, self.portfolio_n_ess/np.maximum(time_total,1e-12), 0)
+            }
         # if convergence_tests is not None:
         #     dict_return["convergence_test_results"] = None # last_convergence_test
 
@@ -1,3 +1,4 @@
+import os
 import numpy
 import scipy.special
 
@@ -192,3 +193,73 @@ def finalize_log(existingAggregate,xpy=numpy):
          return float('nan')
     else:
          return (log_mean,  log_sampleVariance)
+
+
+#
+# Checkpoint utilities: persist the running log aggregate (and other sampler state) so preempted jobs can resume
+#
+
+def log_aggregate_to_array(existingLogAggregate):
+    """
+    Pack a log aggregate (n, log_mean, log_M2, log_ref) into a float64 numpy array, for saving.  Works for cupy scalars too.
+    """
+    return numpy.array([float(x) for x in existingLogAggregate], dtype=numpy.float64)
+
+def log_aggregate_from_array(arr, xpy=numpy):
+    """
+    Inverse of log_aggregate_to_array.  Scalars are placed on the device of xpy, to be consistent with update_log
+    """
+    conv = numpy.float64 if xpy is numpy else xpy.asarray
+    return (int(arr[0]), conv(arr[1]), conv(arr[2]), conv(arr[3]))
+
+def save_checkpoint(fname, state):
+    """
+    Write a flat dictionary of numpy arrays to fname (uncompressed npz, no pickles).
+    The file is written under a temporary name and renamed, so a job preempted mid-write keeps the previous checkpoint.
+    """
+    fname_tmp = fname + ".tmp"
+    with open(fname_tmp, 'wb') as f:
+        numpy.savez(f, **state)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(fname_tmp, fname)
+
+def load_checkpoint(fname):
+    """
+    Read a checkpoint written by save_checkpoint, returning a dictionary of numpy arrays
+    """
+    with numpy.load(fname, allow_pickle=False) as dat:
+        return {k: dat[k] for k in dat.files}
+
+def chain_checkpoint_file(fname, indx_chain):
+    """
+    Checkpoint file for chain indx_chain of a run with checkpoint file fname: the chain index goes before the extension (x.npz -> x_chain0.npz)
+    """
+    base, ext = os.path.splitext(fname)
+    return base + "_chain{}".format(indx_chain) + ext
+
+def merge_chain_estimates(res_chains, var_chains, n_draws, use_lnL=False):
+    """
+    Merge independent estimates of one integral (mean and variance of the mean, per chain) into the estimate one run drawing all
+    the samples would give: the mean weighted by the number of samples each chain drew, w = n_draws/sum(n_draws), with variance
+    sum w^2 var.  With use_lnL, the inputs and outputs are ln I and ln var(I).
+    """
+    n_draws = numpy.asarray(n_draws, dtype=float)
+    wt_chain = n_draws/numpy.sum(n_draws)
+    if use_lnL:
+        return scipy.special.logsumexp(res_chains, b=wt_chain), scipy.special.logsumexp(var_chains, b=wt_chain**2)
+    return numpy.sum(wt_chain*numpy.asarray(res_chains)), numpy.sum(wt_chain**2*numpy.asarray(var_chains))
+
+def merge_chain_samples(rvs_chains, n_chain_samples):
+    """
+    Merge the retained samples (dictionaries of per-sample arrays) of independent chains, which kept n_chain_samples samples each:
+    arrays with one entry per sample of their chain are concatenated; anything else is taken from the first chain
+    """
+    rvs_merged = {}
+    for key in rvs_chains[0]:
+        vals = [rvs[key] for rvs in rvs_chains]
+        if all(hasattr(v,'__len__') and len(v) == n for v,n in zip(vals, n_chain_samples)):
+            rvs_merged[key] = numpy.concatenate(vals)
+        else:
+            rvs_merged[key] = vals[0]
+    return rvs_merged
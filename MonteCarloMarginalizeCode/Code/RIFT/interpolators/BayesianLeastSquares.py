@@ -9,6 +9,129 @@ import scipy.linalg as linalg
 import numpy as np
 
 
+def monomial_features(z, powers):
+    """
+    monomial_features(z, powers) : design matrix F[:,i] = prod_j z[:,j]**powers[i,j], built column by column (repeated products, no (n,p,d) temporaries)
+    """
+    F = np.empty((len(z), len(powers)))
+    for indx, row in enumerate(powers):
+        F[:,indx] = 1
+        for dim in np.flatnonzero(row):
+            for k in range(int(row[dim])):
+                F[:,indx] *= z[:,dim]
+    return F
+
+
+def weighted_least_squares(F, y, weights=None, gamma=None):
+    """
+    weighted_least_squares(F, y) : coefficients minimizing (y - F c).W.(y - F c), W = diag(weights) (or the matrix gamma; default identity).
+    Solved from the Gram matrix F^T W F, with the columns of F scaled to unit norm first; falls back to lstsq if the Gram matrix is singular.
+    """
+    if gamma is None:
+        w = np.ones(len(y)) if weights is None else np.asarray(weights, dtype=float)
+        col_scale = np.sqrt(np.dot(w, F*F))
+        col_scale[col_scale == 0] = 1
+        Fw = F*w[:,np.newaxis]
+        Gram = np.dot(F.T, Fw)/np.outer(col_scale, col_scale)
+        rhs = np.dot(Fw.T, y)/col_scale
+    else:
+        gamma = np.asarray(gamma, dtype=float)
+        col_scale = np.sqrt(np.abs(np.einsum('ij,ij->j', F, np.dot(gamma, F))))
+        col_scale[col_scale == 0] = 1
+        Fs = F/col_scale
+        Fg = np.dot(gamma, Fs)
+        Gram = np.dot(Fs.T, Fg)
+        rhs = np.dot(Fg.T, y)
+    try:
+        coef = linalg.solve(Gram, rhs, assume_a='pos')
+    except (linalg.LinAlgError, ValueError):
+        coef = linalg.lstsq(Gram, rhs)[0]
+    return coef/col_scale
+
+
+def affine_scaling(x, symmetry_list=None, x0=None):
+    """
+    affine_scaling(x) : (center, scale) so z = (x-center)/scale is O(1) for the sample.  Coordinates odd under the discrete symmetry
+    (symmetry_list[k] <= 0) are centered at x0 (default 0) instead, so the symmetry-constrained model is the same in z as in x
+    """
+    x = np.asarray(x, dtype=float)
+    center = np.mean(x, axis=0)
+    scale = np.std(x, axis=0)
+    scale[scale == 0] = 1
+    if not(symmetry_list is None):
+        odd = np.array(symmetry_list) <= 0
+        center[odd] = 0 if x0 is None else np.asarray(x0, dtype=float)[odd]
+    return center, scale
+
+
+class QuadraticForm(object):
+    """
+    QuadraticForm(c, x0, lin, quad) : evaluator for c + l.(x-x0) + (x-x0).A.(x-x0), A symmetric.
+    For a negative-definite A this is the lnL Mahalanobis form  peak - (x-mu).Gamma.(x-mu)/2 ; the (x0, l, A) parameterization is kept
+    so degenerate fits evaluate identically.  Batched: one matrix product per n_chunk points.
+    """
+    def __init__(self, c, x0, lin, quad, n_chunk=100000):
+        self.c = float(c)
+        self.x0 = np.array(x0, dtype=float)
+        self.lin = np.array(lin, dtype=float)
+        self.quad = np.array(quad, dtype=float)
+        self.n_chunk = n_chunk
+
+    def predict(self, x):
+        x = np.asarray(x, dtype=float)
+        x = np.reshape(x, (-1, len(self.x0)))
+        y_out = np.empty(len(x))
+        for indx_start in range(0, len(x), self.n_chunk):
+            dx = x[indx_start:indx_start+self.n_chunk] - self.x0
+            y_here = np.einsum('ij,ij->i', np.dot(dx, self.quad), dx)
+            y_here += np.dot(dx, self.lin)
+            y_out[indx_start:indx_start+len(dx)] = y_here + self.c
+        return y_out
+
+    def __call__(self, x):
+        return self.predict(x)
+
+
+class PolynomialForm(object):
+    """
+    PolynomialForm(powers, coef, intercept, x_center, x_scale) : evaluator for intercept + sum_i coef_i prod_j z_j^powers_ij, z = (x-x_center)/x_scale
+    """
+    def __init__(self, powers, coef, intercept=0., x_center=None, x_scale=None, n_chunk=100000):
+        self.powers = np.array(powers, dtype=np.int64)
+        self.coef = np.array(coef, dtype=float)
+        self.intercept = float(intercept)
+        n_dim = self.powers.shape[1]
+        self.x_center = np.zeros(n_dim) if x_center is None else np.array(x_center, dtype=float)
+        self.x_scale = np.ones(n_dim) if x_scale is None else np.array(x_scale, dtype=float)
+        self.n_chunk = n_chunk
+
+    def predict(self, x):
+        x = np.asarray(x, dtype=float)
+        y_out = np.empty(len(x))
+        for indx_start in range(0, len(x), self.n_chunk):
+            z = (x[indx_start:indx_start+self.n_chunk] - self.x_center)/self.x_scale
+            y_out[indx_start:indx_start+len(z)] = np.dot(monomial_features(z, self.powers), self.coef) + self.intercept
+        return y_out
+
+    def __call__(self, x):
+        return self.predict(x)
+
+
+def fit_polynomial_least_squares(x, y, powers, weights=None, symmetry_list=None):
+    """
+    fit_polynomial_least_squares(x,y,powers) : PolynomialForm with the monomials in powers (constant term, if any, is the intercept),
+    weighted least squares solved in scaled coordinates (affine_scaling)
+    """
+    powers = np.array(powers, dtype=np.int64)
+    powers = powers[np.sum(powers, axis=1) > 0]
+    x_center, x_scale = affine_scaling(x, symmetry_list=symmetry_list)
+    F = np.empty((len(x), len(powers)+1))
+    F[:,0] = 1
+    F[:,1:] = monomial_features((np.asarray(x, dtype=float) - x_center)/x_scale, powers)
+    coef = weighted_least_squares(F, np.asarray(y, dtype=float), weights=weights)
+    return PolynomialForm(powers, coef[1:], coef[0], x_center, x_scale)
+
+
 def fit_quadratic(x,y,x0=None,variable_symmetry_list=None,gamma_x=None,prior_x_gamma=None,prior_quadratic_gamma=None,verbose=False,n_digits=None,hard_regularize_negative=False,hard_regularize_scale=1):
     """
     Simple least squares to a quadratic.
@@ -21,35 +144,26 @@ def fit_quadratic(x,y,x0=None,variable_symmetry_list=None,gamma_x=None,prior_x_g
         best_val_est, 
         my_fisher_est, 
         linear_term_est,
-        fit_here     : python function providing best fit.  Usually what you want, but cannot be pickled/saved to text
+        fit_here     : best fit, as a QuadraticForm (callable; attributes c, x0, lin, quad)
     OPTIONAL
         variable_symmetry_list =  list of length x, indicating symmetry under ONE discrete symmetry (so far)
+        gamma_x = weights: either the vector of weights (1/sigma^2) of each point, or an (npts,npts) inverse covariance matrix
     """
+    x = np.asarray(x, dtype=float)
     x0_val = np.zeros(len(x[0]))
     if not (x0 is None):
         if verbose:
             print(" Fisher: Using reference point ", x0)
-        x0_val = x0
+        x0_val = np.asarray(x0, dtype=float)
 
     dim = len(x[0])   
     npts = len(x)
     if verbose:
         print(" Fisher : dimension, npts = " ,dim, npts)
-    # Constant, linear, quadratic functions. 
-    # Beware of lambda:  f_list = [(lambda x: k) for k in range(5)] does not  work, but this does
-    #     f_list = [(lambda x,k=k: k) for k in range(5)]
-    f0 = [lambda z: np.ones(len(z),dtype=np.float128)]
-    # indx_lookup_linear = {}   # protect against packing errors
-    # indx_here = len(f0)
-    # f_linear = []
-    # for k in np.arange(dim):
-    #     f_linear.append( (lambda z,k=k,x0V=x0_val: z.T[k] - x0V[k]))
-    #     indx_lookup_linear[k] =indx_here
-    #     indx_here+=1
-    f_linear = [(lambda z,k=k,x0V=x0_val: z.T[k] - x0V[k]) for k in np.arange(dim)]
-    f_quad = []
+    # Constant, linear, quadratic monomials of (x-x0), in the order of lambdaHat
+    powers = [np.zeros(dim, dtype=int)] + list(np.eye(dim, dtype=int))
     indx_lookup = {}
-    indx_here =len(f0)+len(f_linear) 
+    indx_here = len(powers)
     for k in np.arange(dim):
         for q in range(k,dim):
             if variable_symmetry_list:
@@ -57,44 +171,54 @@ def fit_quadratic(x,y,x0=None,variable_symmetry_list=None,gamma_x=None,prior_x_g
                     if verbose:
                         print(" Not including quadratic term because of symmetry", (k,q))
                     continue  # skip the remaining part
-            f_quad.append( (lambda z,k=k,q=q: (z.T[k] - x0_val[k])*(z.T[q]-x0_val[q]))   )
+            row = np.zeros(dim, dtype=int); row[k] += 1; row[q] += 1
+            powers.append(row)
             indx_lookup[(k,q)] = indx_here
             indx_here+=1
-    f_list=f0+f_linear + f_quad
-    n_params_model = len(f_list)
+    n_params_model = len(powers)
     if verbose:
         print(" ---- Dimension:  --- ", n_params_model)
         print(" ---- index pattern (paired only; for manual identification of quadratic terms) --- ")
         print(indx_lookup)
-    # if verbose:
-    #     print " ---- check quadratic --- "
-    #     for pair in indx_lookup:
-    #         fn_now = f_list[indx_lookup[pair]]
-    #         print " Grid test " , pair,  fn_now(np.array([1,0])), fn_now(np.array([0,1])), fn_now(np.array([1,1])) ,fn_now(np.array([1,-1])) 
-
-
-    F = np.matrix(np.zeros((len(x), n_params_model),dtype=np.float128))
-    for q in np.arange(n_params_model):
-        fval = f_list[q](np.array(x,dtype=np.float128))
-        F[:,q] = np.reshape(fval, (len(x),1))
-    gamma = np.matrix( np.diag(np.ones(npts,dtype=np.float128)))
-    if not(gamma_x is None):
-        gamma = np.matrix(gamma_x)
-    Gamma = F.T * gamma * F      # Fisher matrix for the fit
-    Sigma = linalg.inv(Gamma)  # Covariance matrix for the fit. WHICH CODE YOU USE HERE IS VERY IMPORTANT.
-    # if verbose:
-    #     print " -- should be identity (error here is measure of overall error) --- "
-    #     print "   Fisher: Matrix inversion/manipulation error ", np.linalg.norm(Sigma*Gamma - np.eye(len(Sigma))) , " which can be large if the fit coordinates are not centered near the peak"
-    #     print " --  --- "
-    lambdaHat =  np.array((Sigma* F.T*gamma* np.matrix(y).T))[:,0]  # point estimate for the fit parameters (i.e., fisher matrix and best fit point)
+
+    # Solve in scaled coordinates z = (x-center)/scale (same model space), then convert back to monomials of (x-x0)
+    sym_list = None
+    if variable_symmetry_list:
+        sym_list = variable_symmetry_list
+    x_center, x_scale = affine_scaling(x, symmetry_list=sym_list, x0=x0_val)
+    F = monomial_features((x - x_center)/x_scale, powers)
+    if gamma_x is None or np.ndim(gamma_x) == 1:
+        coef = weighted_least_squares(F, np.asarray(y, dtype=float), weights=gamma_x)
+    else:
+        coef = weighted_least_squares(F, np.asarray(y, dtype=float), gamma=gamma_x)
+    quad_z = np.zeros((dim,dim))
+    for pair in indx_lookup:
+        k = pair[0]; q=pair[1]
+        quad_z[k,q] += 0.5*coef[indx_lookup[pair]]
+        quad_z[q,k] += 0.5*coef[indx_lookup[pair]]
+    lin_z = coef[1:dim+1]
+    #   z = D (x-x0) + D delta,  D = diag(1/scale), delta = x0 - center
+    dz0 = (x0_val - x_center)/x_scale
+    quad_here = quad_z/np.outer(x_scale, x_scale)
+    lin_here = (lin_z + 2*np.dot(quad_z, dz0))/x_scale
+    lambdaHat = np.zeros(n_params_model)
+    lambdaHat[0] = coef[0] + np.dot(lin_z, dz0) + np.dot(dz0, np.dot(quad_z, dz0))
+    lambdaHat[1:dim+1] = lin_here
+    for pair in indx_lookup:
+        k = pair[0]; q=pair[1]
+        lambdaHat[indx_lookup[pair]] = quad_here[k,k] if k==q else 2*quad_here[k,q]
     if n_digits:
-        lambdaHat = np.array(map(lambda z: round(z,n_digits),lambdaHat))
+        lambdaHat = np.round(lambdaHat, n_digits)
     if verbose:
         print(" Fisher: LambdaHat = ", lambdaHat)
     if verbose:
         print(" Generating predictive function ")
-    def fit_here(x):
-        return  np.sum(list(map(lambda z: z[1]*z[0](x), zip(f_list,lambdaHat) )),axis=0)
+    quad_here = np.zeros((dim,dim))
+    for pair in indx_lookup:
+        k = pair[0]; q=pair[1]
+        quad_here[k,q] += 0.5*lambdaHat[indx_lookup[pair]]
+        quad_here[q,k] += 0.5*lambdaHat[indx_lookup[pair]]
+    fit_here = QuadraticForm(lambdaHat[0], x0_val, lambdaHat[1:dim+1], quad_here)
     if verbose:
         my_resid = y - fit_here(x)
         print(" Fisher: Residuals ", np.std(my_resid))
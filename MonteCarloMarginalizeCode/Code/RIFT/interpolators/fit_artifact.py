@@ -0,0 +1,267 @@
+#
+# fit_artifact.py
+#
+# GOAL
+#   - portable, versioned storage of the fits CIP makes (util_ConstructIntrinsicPosterior_GenericCoordinates.py)
+#   - no pickle, no eval: an artifact is a directory holding
+#        manifest.json   : format name/version, fit kind, scalar metadata, and (for GPs) a json kernel spec
+#        <name>.npy      : one file per array, loaded memory-mapped, so many workers can share one fit and start quickly
+#   - loading returns a lightweight predictor with predict(x) (and __call__), using only numpy (plus sklearn kernels for GPs)
+#
+# KINDS
+#   gp          : sklearn GaussianProcessRegressor (X_train_, alpha_, kernel_)
+#   gp-local    : RIFT.interpolators.local_GP.LocalExpertGP
+#   forest      : sklearn ExtraTreesRegressor / RandomForestRegressor, flattened to node arrays (+ training points, if given)
+#   quadratic   : c + l.(x-x0) + (x-x0).A.(x-x0)
+#   polynomial  : intercept + sum_i coef_i prod_j z_j^powers_ij, z = (x - x_center)/x_scale (if saved; else z = x)
+#   mlp         : senni Interpolator network (SELU layers), evaluated in numpy
+
+import json
+import os
+
+import numpy as np
+
+from RIFT.interpolators.forest_predictor import ForestPredictor, flatten_forest
+from RIFT.interpolators.BayesianLeastSquares import QuadraticForm, PolynomialForm
+
+artifact_format = "RIFT-fit"
+artifact_version = 1
+
+
+def save_artifact(fname, kind, arrays, meta=None):
+    """
+    save_artifact(fname, kind, arrays, meta) : write the artifact directory fname.
+    arrays is a dict of numpy arrays, meta a dict of json-serializable values
+    """
+    if not os.path.exists(fname):
+        os.makedirs(fname)
+    manifest = {'format': artifact_format, 'version': artifact_version, 'kind': kind, 'arrays': sorted(arrays.keys())}
+    manifest['meta'] = {} if meta is None else meta
+    for name in arrays:
+        np.save(os.path.join(fname, name+".npy"), np.ascontiguousarray(arrays[name]))
+    # manifest written last, so a partially-written artifact is never loadable
+    with open(os.path.join(fname, "manifest.json"), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    print(" Fit artifact saved: ", fname, kind, manifest['arrays'])
+
+
+def read_artifact(fname, mmap=True):
+    """
+    read_artifact(fname) : returns (kind, arrays, meta), arrays memory-mapped unless mmap=False
+    """
+    with open(os.path.join(fname, "manifest.json"), 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != artifact_format:
+        raise ValueError(" Not a fit artifact: " + fname)
+    if manifest['version'] > artifact_version:
+        raise ValueError(" Fit artifact {} has version {}, newer than this code ({}) ".format(fname, manifest['version'], artifact_version))
+    arrays = {}
+    for name in manifest['arrays']:
+        arrays[name] = np.load(os.path.join(fname, name+".npy"), mmap_mode='r' if mmap else None)
+    return manifest['kind'], arrays, manifest['meta']
+
+
+###
+### Kernel specs (sklearn gaussian_process kernels <-> json)
+###
+
+def kernel_to_spec(kernel):
+    from sklearn.gaussian_process import kernels
+    if isinstance(kernel, (kernels.Sum, kernels.Product)):
+        return {'type': type(kernel).__name__, 'k1': kernel_to_spec(kernel.k1), 'k2': kernel_to_spec(kernel.k2)}
+    if isinstance(kernel, kernels.ConstantKernel):
+        return {'type': 'ConstantKernel', 'constant_value': float(kernel.constant_value)}
+    if isinstance(kernel, kernels.WhiteKernel):
+        return {'type': 'WhiteKernel', 'noise_level': float(kernel.noise_level)}
+    if isinstance(kernel, kernels.Matern):   # before RBF: Matern is a subclass
+        return {'type': 'Matern', 'length_scale': np.atleast_1d(kernel.length_scale).tolist(), 'nu': float(kernel.nu)}
+    if isinstance(kernel, kernels.RBF):
+        return {'type': 'RBF', 'length_scale': np.atleast_1d(kernel.length_scale).tolist()}
+    raise ValueError(" Fit artifact: kernel not supported " + str(kernel))
+
+
+def kernel_from_spec(spec):
+    from sklearn.gaussian_process import kernels
+    if spec['type'] in ['Sum', 'Product']:
+        return getattr(kernels, spec['type'])(kernel_from_spec(spec['k1']), kernel_from_spec(spec['k2']))
+    if spec['type'] == 'ConstantKernel':
+        return kernels.ConstantKernel(spec['constant_value'], constant_value_bounds='fixed')
+    if spec['type'] == 'WhiteKernel':
+        return kernels.WhiteKernel(spec['noise_level'], noise_level_bounds='fixed')
+    if spec['type'] == 'Matern':
+        return kernels.Matern(np.array(spec['length_scale']), length_scale_bounds='fixed', nu=spec['nu'])
+    if spec['type'] == 'RBF':
+        return kernels.RBF(np.array(spec['length_scale']), length_scale_bounds='fixed')
+    raise ValueError(" Fit artifact: kernel type not supported " + spec['type'])
+
+
+###
+### Predictors
+###
+
+class GPPredictor(object):
+    """
+    Mean of a conditioned GP: y_mean + y_std * K(x, X_train) alpha
+    """
+    def __init__(self, kernel, X_train, alpha, y_train_mean=0., y_train_std=1., n_chunk=10000):
+        self.kernel = kernel
+        self.X_train = X_train
+        self.alpha = alpha
+        self.y_train_mean = y_train_mean
+        self.y_train_std = y_train_std
+        self.n_chunk = n_chunk
+
+    def predict(self, x):
+        x = np.asarray(x, dtype=float)
+        y_out = np.empty(len(x))
+        for indx_start in range(0, len(x), self.n_chunk):
+            x_here = x[indx_start:indx_start+self.n_chunk]
+            y_out[indx_start:indx_start+len(x_here)] = np.dot(self.kernel(x_here, self.X_train), self.alpha)
+        return self.y_train_std*y_out + self.y_train_mean
+
+    def __call__(self, x):
+        return self.predict(x)
+
+
+def _selu(x):
+    alpha = 1.6732632423543772848170429916717
+    scale = 1.0507009873554804934193349852946
+    return scale*np.where(x > 0, x, alpha*np.expm1(np.minimum(x, 0)))
+
+
+class MLPPredictor(object):
+    """
+    senni network: SELU on every hidden layer, linear output, undo target scaling.  As senni.Interpolator.evaluate, the input
+    standardization is folded into the first layer (double precision), so raw inputs are used directly; the other layers are float32, like torch.
+    """
+    def __init__(self, weights, biases, mu_x, sigma_x, target_mu, target_sigma):
+        self.weights = [np.asarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.mu_x = mu_x
+        self.sigma_x = sigma_x
+        self.target_mu = float(target_mu)
+        self.target_sigma = float(target_sigma)
+        self.W_raw = np.asarray(weights[0], dtype=float)/np.asarray(sigma_x, dtype=float)
+        self.b_raw = np.asarray(biases[0], dtype=float) - np.dot(self.W_raw, np.asarray(mu_x, dtype=float))
+
+    def predict(self, x):
+        h = np.dot(np.asarray(x, dtype=float), self.W_raw.T) + self.b_raw
+        for indx in np.arange(1, len(self.weights)):
+            h = _selu(h).astype(np.float32)
+            h = np.dot(h, self.weights[indx].T) + self.biases[indx]
+        return h[:, 0].astype(float)*self.target_sigma + self.target_mu
+
+    def __call__(self, x):
+        return self.predict(x)
+
+
+###
+### Export: one function per kind of fit object
+###
+
+def export_gp(fname, gp, meta=None):
+    meta = {} if meta is None else dict(meta)
+    meta['kernel'] = kernel_to_spec(gp.kernel_)
+    meta['y_train_mean'] = float(np.mean(gp._y_train_mean))
+    meta['y_train_std'] = float(np.mean(gp._y_train_std))
+    save_artifact(fname, 'gp', {'X_train': gp.X_train_, 'alpha': gp.alpha_}, meta)
+
+
+def export_local_gp(fname, lgp, meta=None):
+    meta = {} if meta is None else dict(meta)
+    meta['kernel'] = kernel_to_spec(lgp.kernel_)
+    meta['n_blend'] = int(lgp.n_blend)
+    meta['has_tree'] = lgp.tree is not None
+    arrays = {
+        'X_train': np.concatenate([gp.X_train_ for gp in lgp.experts]),
+        'alpha': np.concatenate([gp.alpha_ for gp in lgp.experts]),
+        'offsets': np.cumsum([0]+[len(gp.alpha_) for gp in lgp.experts]),
+        'y_train_mean': np.array([np.mean(gp._y_train_mean) for gp in lgp.experts]),
+        'y_train_std': np.array([np.mean(gp._y_train_std) for gp in lgp.experts]),
+        'centers': lgp.centers, 'scale': lgp.scale}
+    save_artifact(fname, 'gp-local', arrays, meta)
+
+
+def export_forest(fname, forest, meta=None, x_train=None):
+    """
+    ExtraTreesRegressor/RandomForestRegressor (single output), or its flat node arrays (flatten_forest, merge_forests) -> flat node arrays.
+    x_train (optional): training points, so a later fit can tell which points are new (warm start)
+    """
+    arrays = dict(forest) if isinstance(forest, dict) else flatten_forest(forest)
+    if not(x_train is None):
+        arrays['X_train'] = np.asarray(x_train, dtype=float)
+    save_artifact(fname, 'forest', arrays, meta)
+
+
+def export_quadratic(fname, c, x0, lin, quad, meta=None):
+    meta = {} if meta is None else dict(meta)
+    meta['c'] = float(c)
+    save_artifact(fname, 'quadratic', {'x0': np.asarray(x0, dtype=float), 'lin': np.asarray(lin, dtype=float), 'quad': np.asarray(quad, dtype=float)}, meta)
+
+
+def export_polynomial(fname, powers, coef, intercept, meta=None, x_center=None, x_scale=None):
+    meta = {} if meta is None else dict(meta)
+    meta['intercept'] = float(intercept)
+    arrays = {'powers': np.asarray(powers, dtype=np.int64), 'coef': np.asarray(coef, dtype=float)}
+    if not(x_center is None):
+        arrays['x_center'] = np.asarray(x_center, dtype=float)
+        arrays['x_scale'] = np.asarray(x_scale, dtype=float)
+    save_artifact(fname, 'polynomial', arrays, meta)
+
+
+def export_senni(fname, interpolator, meta=None):
+    """
+    senni Interpolator/AdaptiveInterpolator -> layer weights and scalings.  Layers are taken in order of definition.
+    """
+    meta = {} if meta is None else dict(meta)
+    meta['target_mu'] = float(interpolator.target_mu)
+    meta['target_sigma'] = float(interpolator.target_sigma)
+    state = interpolator.net.state_dict()
+    layer_names = [name[:-len('.weight')] for name in state if name.endswith('.weight')]
+    meta['n_layers'] = len(layer_names)
+    sigma_x = np.asarray(interpolator.store_sigma_x, dtype=float)
+    arrays = {'mu_x': np.asarray(interpolator.store_mu_x, dtype=float), 'sigma_x': np.where(sigma_x == 0, 1, sigma_x)}   # as senni preprocessing
+    for indx, name in enumerate(layer_names):
+        arrays['W{}'.format(indx)] = state[name+'.weight'].detach().cpu().numpy()
+        arrays['b{}'.format(indx)] = state[name+'.bias'].detach().cpu().numpy()
+    save_artifact(fname, 'mlp', arrays, meta)
+
+
+###
+### Load
+###
+
+def load_fit(fname, mmap=True):
+    """
+    load_fit(fname) : predictor (with predict(x), callable) for the artifact fname, and its metadata dict
+    """
+    kind, arrays, meta = read_artifact(fname, mmap=mmap)
+    print(" Fit artifact loaded: ", fname, kind)
+    if kind == 'gp':
+        fit = GPPredictor(kernel_from_spec(meta['kernel']), arrays['X_train'], arrays['alpha'], meta['y_train_mean'], meta['y_train_std'])
+    elif kind == 'gp-local':
+        from RIFT.interpolators import local_GP
+        from scipy.spatial import cKDTree
+        kernel = kernel_from_spec(meta['kernel'])
+        offsets = arrays['offsets']
+        fit = local_GP.LocalExpertGP.__new__(local_GP.LocalExpertGP)   # predict() only needs the attributes below
+        fit.experts = [GPPredictor(kernel, arrays['X_train'][offsets[i]:offsets[i+1]], arrays['alpha'][offsets[i]:offsets[i+1]],
+                                   arrays['y_train_mean'][i], arrays['y_train_std'][i]) for i in np.arange(len(offsets)-1)]
+        fit.kernel_ = kernel
+        fit.centers = np.array(arrays['centers'])
+        fit.scale = np.array(arrays['scale'])
+        fit.n_blend = meta['n_blend']
+        fit.n_chunk = 10000
+        fit.tree = cKDTree(fit.centers) if meta['has_tree'] else None
+    elif kind == 'forest':
+        fit = ForestPredictor.from_arrays(arrays)
+    elif kind == 'quadratic':
+        fit = QuadraticForm(meta['c'], arrays['x0'], arrays['lin'], arrays['quad'])
+    elif kind == 'polynomial':
+        fit = PolynomialForm(arrays['powers'], arrays['coef'], meta['intercept'], arrays.get('x_center'), arrays.get('x_scale'))
+    elif kind == 'mlp':
+        fit = MLPPredictor([arrays['W{}'.format(i)] for i in np.arange(meta['n_layers'])], [arrays['b{}'.format(i)] for i in np.arange(meta['n_layers'])],
+                           arrays['mu_x'], arrays['sigma_x'], meta['target_mu'], meta['target_sigma'])
+    else:
+        raise ValueError(" Fit artifact: unknown kind " + kind)
+    return fit, meta
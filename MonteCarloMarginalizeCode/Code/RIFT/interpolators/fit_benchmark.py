@@ -0,0 +1,104 @@
+'''
+fit_benchmark.py
+
+k-fold cross-validation of lnL fit methods on one data set, as used by
+util_ConstructIntrinsicPosterior_GenericCoordinates.py --fit-benchmark-method ...
+
+For each method and fold, the fit is made on the other folds and evaluated on the held-out points:
+  - held-out residuals: rms over all held-out points, and rms/max over the high-likelihood ones (lnL > max lnL - lnL_window)
+  - fit time (wall clock, in the process doing the fit; does not include writing the artifact)
+  - prediction throughput (points/s), evaluating n_throughput points (the held-out points, repeated)
+  - artifact size (bytes of the fit artifact directory, if the method can save one)
+Tasks (method, fold) run in a process pool (fork) if n_procs > 1.  Timings are then only comparable if n_procs <= number of cores.
+The table has one line per method (fold averages), with a header naming the columns.
+'''
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+benchmark_columns = ['method', 'n_folds', 'n_points', 'rms_heldout', 'rms_heldout_high', 'max_heldout_high', 'fit_time_s', 'predict_points_per_s', 'artifact_bytes']
+
+_context = {}   # fit functions and data, set before forking the pool
+
+
+def kfold_indices(n, n_folds, random_state=0):
+    """
+    kfold_indices(n, n_folds) : list of n_folds (train, test) index array pairs, test sets a shuffled partition of range(n)
+    """
+    indx = np.random.RandomState(random_state).permutation(n)
+    folds = np.array_split(indx, n_folds)
+    return [(np.concatenate(folds[:k] + folds[k+1:]), folds[k]) for k in np.arange(n_folds)]
+
+
+def directory_size(path):
+    if not os.path.isdir(path):
+        return np.nan
+    return float(np.sum([os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)]))
+
+
+def _benchmark_task(args):
+    method, indx_train, indx_test = args
+    fit_function = _context['fit_functions'][method]
+    x, y, y_err = _context['x'], _context['y'], _context['y_err']
+    artifact_dir = tempfile.mkdtemp(prefix='fit_benchmark_')
+    shutil.rmtree(artifact_dir)   # fit creates it only if it can save an artifact
+    try:
+        t_start = time.time()
+        fit, write_artifact = fit_function(x[indx_train], y[indx_train], None if y_err is None else y_err[indx_train], artifact_dir)
+        t_fit = time.time() - t_start
+        if write_artifact:
+            write_artifact()
+        y_pred = np.asarray(fit(x[indx_test]), dtype=float)
+        x_rate = np.resize(x[indx_test], (_context['n_throughput'], x.shape[1]))
+        t_start = time.time()
+        fit(x_rate)
+        t_predict = time.time() - t_start
+        artifact_bytes = directory_size(artifact_dir)
+    finally:
+        if os.path.isdir(artifact_dir):
+            shutil.rmtree(artifact_dir)
+    resid = y_pred - y[indx_test]
+    indx_high = y[indx_test] > _context['y_max'] - _context['lnL_window']
+    rms_high = np.sqrt(np.mean(resid[indx_high]**2)) if np.any(indx_high) else np.nan
+    max_high = np.max(np.abs(resid[indx_high])) if np.any(indx_high) else np.nan
+    return {'method': method, 'rms_heldout': np.sqrt(np.mean(resid**2)), 'rms_heldout_high': rms_high, 'max_heldout_high': max_high,
+            'fit_time_s': t_fit, 'predict_points_per_s': len(x_rate)/np.max([t_predict, 1e-9]), 'artifact_bytes': artifact_bytes}
+
+
+def run_benchmark(fit_functions, methods, x, y, y_err=None, n_folds=5, n_procs=1, lnL_window=10, n_throughput=100000, random_state=0):
+    """
+    run_benchmark(fit_functions, methods, x, y) : list of result dicts (keys benchmark_columns), one per method.
+    fit_functions[method](x_train, y_train, y_err_train, artifact_dir) returns (fit, write_artifact): a callable fit, and a callable (or None) that
+    saves its artifact to artifact_dir, if the method can.  write_artifact is called after the fit is timed
+    """
+    _context.update({'fit_functions': fit_functions, 'x': np.asarray(x), 'y': np.asarray(y, dtype=float), 'y_err': y_err,
+                     'y_max': np.max(y), 'lnL_window': lnL_window, 'n_throughput': n_throughput})
+    folds = kfold_indices(len(y), n_folds, random_state=random_state)
+    tasks = [(method, indx_train, indx_test) for method in methods for indx_train, indx_test in folds]
+    if n_procs > 1:
+        import multiprocessing
+        with multiprocessing.get_context('fork').Pool(int(np.min([n_procs, len(tasks)]))) as pool:
+            results = pool.map(_benchmark_task, tasks)
+    else:
+        results = list(map(_benchmark_task, tasks))
+    summary = []
+    for method in methods:
+        results_here = [r for r in results if r['method'] == method]
+        line = {'method': method, 'n_folds': len(results_here), 'n_points': len(y)}
+        for name in benchmark_columns[3:]:
+            line[name] = np.nanmean([r[name] for r in results_here]) if not(np.all(np.isnan([r[name] for r in results_here]))) else np.nan
+        summary.append(line)
+    return summary
+
+
+def write_table(fname, summary):
+    with open(fname, 'w') as f:
+        f.write("# " + " ".join(benchmark_columns) + "\n")
+        for line in summary:
+            f.write(" ".join([line['method'], str(line['n_folds']), str(line['n_points'])] + ["{:.6g}".format(line[name]) for name in benchmark_columns[3:]]) + "\n")
+    print(" Fit benchmark written to ", fname)
@@ -26,15 +26,29 @@ from __future__ import print_function, division, unicode_literals
 
 from scipy.sparse import csc_matrix, linalg as sla
 
+def compact_kernel_tree(X, thetas):
+    '''
+    compact_kernel_tree: KD-tree of X, in the scaled coordinates
+        used by compact_kernel.  Build once and pass as tree_p/tree_q
+        to reuse it for several kernel evaluations.
+    '''
+    import numpy as np
+    from scipy.spatial import cKDTree
+    return cKDTree(np.asarray(X, dtype=float)/thetas)
+
 def compact_kernel(Xp, Xq,
                     thetas,
                     white_noise,
+                    tree_p=None,
+                    tree_q=None,
                     ):
     '''
     compact_kernel: Return a sparse representation of the 
         compact kernel described on page 88 of R&W.
-        Most of the functions which generate the sparse kernel
-        involve non-sparse matricies.
+        Only pairs of points closer than the (unit, after scaling)
+        support radius are found, using KD-trees, so memory and time
+        scale with the number of nonzero entries, not with the
+        product of the number of points.
 
     Inputs:
         Xp: Dense array containing input vector
@@ -43,47 +57,42 @@ def compact_kernel(Xp, Xq,
                 transpose of the true kernel
         thetas: Hyperparameters
             thetas[0]: Scale length used to construct sparse matrix.
+        tree_p, tree_q: optional, compact_kernel_tree(Xp, thetas) and
+            compact_kernel_tree(Xq, thetas), if already available
     Outputs:
         K: Sparse kernel representation (csc matrix)
     '''
     import numpy as np
-    
+    from scipy.sparse import eye as sparse_eye
+
     # If no Xq, make one
     if Xq is None:
-        Xq = np.copy(Xp)
-
-    # Copy Xp
-    Xp = np.copy(Xp).astype(float)
-    Xq = np.copy(Xq).astype(float)
+        Xq = Xp
+        tree_q = tree_p
 
     # Identify dimensionality
     ndim = len(thetas)
     j = np.floor(float(ndim)/2.0) + 2
 
-    # Scale by thetas
-    if len(thetas) >= 1:
-        for i in range(ndim):
-            Xp[:,i] = Xp[:,i]/thetas[i]
-            Xq[:,i] = Xq[:,i]/thetas[i]
-
-    # Compute the difference matrix
-    x2 = ((np.ones((Xq.shape + (Xp.shape[0],)))*Xp.T).T)
-    x1 = (np.ones((Xp.shape + (Xq.shape[0],)))*Xq.T)
-
-    # Assumption: real X and real k
-    r = np.linalg.norm(x2 - x1, axis = 1)
+    # Scale by thetas, and find all pairs within unit distance
+    if tree_p is None:
+        tree_p = compact_kernel_tree(Xp, thetas)
+    if tree_q is None:
+        tree_q = compact_kernel_tree(Xq, thetas)
+    pairs = tree_p.sparse_distance_matrix(tree_q, 1.0, output_type='ndarray')
+    r = pairs['v']
 
     # K = ((1 - r)^2)_+
     eta = (1.0 - r)
     eta[eta < 0.0] = 0.0
     #K = eta**2
-    K = (eta**(j + 1))*((j + 1)*r + 1.0)
-
-    if white_noise != 0.0:
-        K += white_noise*np.eye(K.shape[0], K.shape[1])
+    K_vals = (eta**(j + 1))*((j + 1)*r + 1.0)
 
     # Construct sparse matrix
-    K = csc_matrix(K)
+    K = csc_matrix((K_vals, (pairs['i'], pairs['j'])), shape=(tree_p.n, tree_q.n))
+
+    if white_noise != 0.0:
+        K = K + white_noise*sparse_eye(K.shape[0], K.shape[1], format='csc')
 
     return K
 
@@ -91,16 +100,26 @@ def compact_kernel(Xp, Xq,
 
 def GP_fit_function(x_train, y_train, thetas, white_noise,
                     kernel_function = compact_kernel,
+                    n_chunk = 10000,
                     **kwargs):
     '''
     Objective: return a function which can sample the distribution
         with only the test inputs as an input.
         This function only needs to return a mean.
+        Test inputs are evaluated n_chunk at a time, so memory is bounded
+        for any number of test points.
     '''
+    import numpy as np
     from sksparse.cholmod import cholesky
     ## Guarantee dimensionality ##
     ## Find initial kernel ##
-    K = kernel_function(x_train, x_train, thetas, white_noise)
+    extra_kernel_args = {}
+    if kernel_function is compact_kernel:
+        tree_train = compact_kernel_tree(x_train, thetas)
+        extra_kernel_args = {'tree_q': tree_train}
+        K = kernel_function(x_train, None, thetas, white_noise, tree_p=tree_train)
+    else:
+        K = kernel_function(x_train, x_train, thetas, white_noise)
     # find the alphas using cholesky decomposition
     L_factor = cholesky(K)
     alpha = L_factor(y_train)
@@ -108,8 +127,12 @@ def GP_fit_function(x_train, y_train, thetas, white_noise,
     ## Construct function ##
     def my_fit(x_sample):
         #print(len(x_sample))
-        Kt = kernel_function(x_sample, x_train, thetas, white_noise = 0.0)
-        y_mean = Kt.dot(alpha)
+        x_sample = np.asarray(x_sample, dtype=float)
+        y_mean = np.empty(len(x_sample))
+        for indx_start in range(0, len(x_sample), n_chunk):
+            x_here = x_sample[indx_start:indx_start+n_chunk]
+            Kt = kernel_function(x_here, x_train, thetas, white_noise = 0.0, **extra_kernel_args)
+            y_mean[indx_start:indx_start+len(x_here)] = Kt.dot(alpha)
         return y_mean
 
     return my_fit
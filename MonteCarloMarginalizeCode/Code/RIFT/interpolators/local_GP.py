@@ -0,0 +1,207 @@
+'''
+local_GP.py
+
+Scalable wrapper around the sklearn GaussianProcessRegressor, for use by
+util_ConstructIntrinsicPosterior_GenericCoordinates.py (--fit-method gp-local)
+
+  - fit_gp_restarts: hyperparameter optimization with the optimizer restarts
+      farmed out to a process pool.  Each restart is an independent
+      GaussianProcessRegressor fit started from a random point in the (log) kernel
+      hyperparameter bounds, exactly as sklearn's own n_restarts_optimizer draws them.
+  - LocalExpertGP: local-expert GP.  Hyperparameters are fit once (on a subset),
+      the training data is split by a balanced KD partition (in units of the fitted
+      length scales) into leaves of at most n_expert points, and one GP with the
+      fixed kernel is conditioned on each leaf.  Cost is O(n n_expert^2), not O(n^3).
+      Predictions blend the n_blend nearest experts (inverse squared distance to the
+      leaf centers), n_chunk test points at a time.
+
+If the training set is no larger than n_expert, LocalExpertGP is a single GP with the
+same kernel and number of restarts as the usual fit.
+'''
+from __future__ import print_function
+
+import numpy as np
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import RBF
+
+
+def _gp_restart(args):
+    x, y, kernel, alpha = args
+    gp = GaussianProcessRegressor(kernel=kernel, alpha=alpha, n_restarts_optimizer=0)
+    gp.fit(x, y)
+    return gp.log_marginal_likelihood_value_, gp.kernel_.theta
+
+
+def fit_gp_restarts(x, y, kernel, alpha=1e-10, n_restarts=8, n_procs=1, random_state=None):
+    """
+    fit_gp_restarts(x,y,kernel) : optimize the kernel hyperparameters of a GaussianProcessRegressor,
+    starting once from the kernel as given and n_restarts more times from random points in its bounds.
+    With n_procs > 1, the (independent) restarts run in a multiprocessing pool.
+    Returns the GaussianProcessRegressor fit with the best hyperparameters found.
+    """
+    rng = np.random.RandomState(random_state)
+    bounds = kernel.bounds
+    kernel_list = [kernel]
+    for indx in np.arange(n_restarts):
+        kernel_list.append(kernel.clone_with_theta(rng.uniform(bounds[:, 0], bounds[:, 1])))
+    args_list = [(x, y, k, alpha) for k in kernel_list]
+    if n_procs > 1:
+        import multiprocessing
+        with multiprocessing.Pool(int(np.min([n_procs, len(args_list)]))) as pool:
+            results = pool.map(_gp_restart, args_list)
+    else:
+        results = list(map(_gp_restart, args_list))
+    lml_vals = np.array([r[0] for r in results])
+    indx_best = np.argmax(lml_vals)
+    print(" GP restarts: lnL(marginal) ", lml_vals, " best ", indx_best)
+    # condition on the data at the best hyperparameters: no further optimization
+    gp = GaussianProcessRegressor(kernel=kernel.clone_with_theta(results[indx_best][1]), alpha=alpha, optimizer=None)
+    gp.fit(x, y)
+    return gp
+
+
+def warm_start_kernel(kernel, kernel_prev):
+    """
+    warm_start_kernel(kernel, kernel_prev) : copy of kernel, with its free hyperparameters set to the values in kernel_prev
+    (a previous fit with the same kernel expression), clipped to the bounds of kernel.  Hyperparameters that kernel_prev does
+    not have, or has with a different shape, keep their values from kernel.
+    """
+    params_prev = kernel_prev.get_params()
+    params_new = {}
+    for hyp in kernel.hyperparameters:
+        if hyp.fixed or not(hyp.name in params_prev):
+            continue
+        val_prev = params_prev[hyp.name]
+        if np.shape(val_prev) != np.shape(kernel.get_params()[hyp.name]):
+            continue
+        params_new[hyp.name] = val_prev
+    kernel_warm = kernel.clone_with_theta(kernel.theta)
+    kernel_warm.set_params(**params_new)
+    bounds = kernel.bounds
+    return kernel_warm.clone_with_theta(np.clip(kernel_warm.theta, bounds[:, 0], bounds[:, 1]))
+
+
+def kernel_length_scales(kernel):
+    """
+    Length scales of the (first) RBF kernel inside a fitted kernel expression, or None
+    """
+    for name, val in kernel.get_params().items():
+        if isinstance(val, RBF):
+            return np.atleast_1d(val.length_scale)
+    return None
+
+
+def kd_partition(x, n_leaf):
+    """
+    kd_partition(x, n_leaf) : list of index arrays, splitting x at the median of its widest
+    dimension recursively until every leaf has at most n_leaf points
+    """
+    leaves = []
+    todo = [np.arange(len(x))]
+    while todo:
+        indx = todo.pop()
+        if len(indx) <= n_leaf:
+            leaves.append(indx)
+            continue
+        x_here = x[indx]
+        dim = np.argmax(np.max(x_here, axis=0) - np.min(x_here, axis=0))
+        order = np.argsort(x_here[:, dim], kind='stable')
+        n_half = len(indx)//2
+        todo.append(indx[order[:n_half]])
+        todo.append(indx[order[n_half:]])
+    return leaves
+
+
+class LocalExpertGP(object):
+    """
+    LocalExpertGP(x,y,kernel) : local-expert gaussian process regression; see module docstring.
+    Has predict(x), like GaussianProcessRegressor, so it can be saved and reloaded with joblib.
+    """
+    def __init__(self, x, y, kernel, alpha=1e-10, n_expert=2000, n_hyper=None, n_blend=2,
+                 n_restarts=8, n_procs=1, n_chunk=10000, random_state=None):
+        from scipy.spatial import cKDTree
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        alpha = np.broadcast_to(np.asarray(alpha, dtype=float), y.shape)
+        self.n_blend = n_blend
+        self.n_chunk = n_chunk
+        if n_hyper is None:
+            n_hyper = n_expert
+
+        # Hyperparameters: one fit, on a random subset if needed
+        indx_hyper = np.arange(len(x))
+        if len(x) > n_hyper:
+            indx_hyper = np.random.RandomState(random_state).choice(len(x), size=n_hyper, replace=False)
+        gp = fit_gp_restarts(x[indx_hyper], y[indx_hyper], kernel, alpha=alpha[indx_hyper],
+                             n_restarts=n_restarts, n_procs=n_procs, random_state=random_state)
+        self.kernel_ = gp.kernel_
+        print(" GP local: kernel ", self.kernel_)
+        if len(x) <= n_expert:
+            self.experts = [gp]
+            self.centers = np.zeros((1, x.shape[1]))
+            self.scale = np.ones(x.shape[1])
+            self.tree = None
+            return
+
+        # Partition in units of the fitted length scales, and condition one GP per leaf
+        self.scale = kernel_length_scales(self.kernel_)
+        if self.scale is None:
+            self.scale = np.std(x, axis=0)
+        self.scale = np.broadcast_to(self.scale, (x.shape[1],)).copy()
+        x_scaled = x/self.scale
+        leaves = kd_partition(x_scaled, n_expert)
+        print(" GP local: ", len(leaves), " experts, sizes ", np.min([len(l) for l in leaves]), np.max([len(l) for l in leaves]))
+        self.experts = []
+        self.centers = np.zeros((len(leaves), x.shape[1]))
+        for indx, leaf in enumerate(leaves):
+            gp_here = GaussianProcessRegressor(kernel=self.kernel_, alpha=alpha[leaf], optimizer=None)
+            gp_here.fit(x[leaf], y[leaf])
+            self.experts.append(gp_here)
+            self.centers[indx] = np.mean(x_scaled[leaf], axis=0)
+        self.tree = cKDTree(self.centers)
+
+    def predict(self, x, return_std=False):
+        """
+        predict(x) : blended prediction.  With return_std, also the predictive standard deviation (the same blend of the experts' std)
+        """
+        x = np.asarray(x, dtype=float)
+        if self.tree is None:
+            y_out = np.empty(len(x))
+            y_std = np.empty(len(x))
+            for indx_start in range(0, len(x), self.n_chunk):
+                if return_std:
+                    y_out[indx_start:indx_start+self.n_chunk], y_std[indx_start:indx_start+self.n_chunk] = self.experts[0].predict(x[indx_start:indx_start+self.n_chunk], return_std=True)
+                else:
+                    y_out[indx_start:indx_start+self.n_chunk] = self.experts[0].predict(x[indx_start:indx_start+self.n_chunk])
+            if return_std:
+                return y_out, y_std
+            return y_out
+        n_blend = int(np.min([self.n_blend, len(self.experts)]))
+        y_out = np.zeros(len(x))
+        y_std = np.zeros(len(x))
+        for indx_start in range(0, len(x), self.n_chunk):
+            x_here = x[indx_start:indx_start+self.n_chunk]
+            dist, indx_near = self.tree.query(x_here/self.scale, k=n_blend)
+            dist = dist.reshape(len(x_here), n_blend)
+            indx_near = indx_near.reshape(len(x_here), n_blend)
+            wt = 1./(dist**2 + 1e-12)
+            wt /= np.sum(wt, axis=1)[:, np.newaxis]
+            y_here = np.zeros(len(x_here))
+            std_here = np.zeros(len(x_here))
+            # each expert predicts once, for all test points that use it
+            for indx_expert in np.unique(indx_near):
+                rows, cols = np.nonzero(indx_near == indx_expert)
+                if return_std:
+                    y_expert, std_expert = self.experts[indx_expert].predict(x_here[rows], return_std=True)
+                    std_here[rows] += wt[rows, cols]*std_expert
+                else:
+                    y_expert = self.experts[indx_expert].predict(x_here[rows])
+                y_here[rows] += wt[rows, cols]*y_expert
+            y_out[indx_start:indx_start+len(x_here)] = y_here
+            y_std[indx_start:indx_start+len(x_here)] = std_here
+        if return_std:
+            return y_out, y_std
+        return y_out
+
+    def __call__(self, x):
+        return self.predict(x)
@@ -30,7 +30,12 @@ class Net(torch.nn.Module):
                 self.linear9 = torch.nn.Linear(hlayer_size, n_outputs)
       
             def forward(self, x):
-                x = torch.selu(self.linear1(x))
+                return self.forward_hidden(torch.selu(self.linear1(x)))
+
+            def forward_hidden(self, x):
+                '''
+                Network after the first layer (and its activation)
+                '''
                 x = self.dropout1(torch.selu(self.linear2(x)))
                 x = self.dropout2(torch.selu(self.linear3(x)))
                 x = self.dropout3(torch.selu(self.linear4(x)))
@@ -47,11 +52,12 @@ class Interpolator(object): # interpolator
       def __init__(self, input, target, errors, frac=0.1, test_frac=0.1, hlayer_size=32, p_drop=0, regularize=False,
                    epochs=100, learning_rate=1e-2, betas=(0.9, 0.99), eps=1e-2, weight_decay=1e-6,
                    epochs_per_lr=20, lr_divisions=5, lr_frac=1./3., batch_size=128, shuffle=True, 
-                   working_dir='.', loss_func='chi2', no_pad=False):
+                   working_dir='.', loss_func='chi2', no_pad=False, patience=None, n_threads=None):
 
             '''
             :input: Input column vector with each column representing one input with size (n_samples, n_dim)
             :target: Target column vector of shape (n_samples, 1)
+            :errors: Errors on target, same shape (None: unit errors)
             :frac: The fraction of the input vector taken to be the size of the validation set
             :test_frac: The fraction of the input vector taken to be the size of the test set
             :hlayer_size: Number of hidden neurons in each hidden layer
@@ -64,14 +70,14 @@ class Interpolator(object): # interpolator
             :lr_frac: Fraction by which the learning_rate is multiplied every epochs_per_lr epochs
             :batch_size: Size of the batches used during training
             :shuffle: Boolean deciding whether the data batches are shuffled prior to training
+            :patience: Stop training once the validation loss has not improved for this many epochs, and keep the best network (None: no early stopping)
+            :n_threads: Number of CPU threads torch may use (None: torch default, usually all cores)
             '''
 
             import numpy as np
-            import os
-
-            try: os.mkdir(working_dir+'/models')
-            except: pass
 
+            if n_threads:
+                  torch.set_num_threads(int(n_threads))
             self.select_device()
 
             self.working_dir = working_dir
@@ -84,80 +90,41 @@ class Interpolator(object): # interpolator
             self.epochs = epochs
             self.batch_size = batch_size
             self.shuffle = shuffle
-            self.store_mu_x =[]
-            self.store_sigma_x=[]
+            self.patience = patience
 
-            self.store_mu_x = np.zeros(len(input[0]))
-            self.store_sigma_x = np.zeros(len(input[0]))
-
-            for dim in xrange(self.n_inputs):
-                  self.store_mu_x[dim] = np.mean(input[:,dim])
-                  self.store_sigma_x[dim] = np.std(input[:,dim])
-                  print( " Computing scaling factors on raw data ", dim, self.store_mu_x[dim], self.store_sigma_x[dim])
+            input = np.asarray(input, dtype=float)
+            target = np.asarray(target, dtype=float)
+            if errors is None:
+                  errors = np.ones(target.shape)
+            self.store_mu_x = np.mean(input, axis=0)
+            self.store_sigma_x = np.std(input, axis=0)
+            print( " Computing scaling factors on raw data ", self.store_mu_x, self.store_sigma_x)
 
             input_train, target_train, errors_train, input_valid, target_valid, errors_valid, input_test, target_test, errors_test \
             = self.set_separation(input, target, errors, frac, test_frac)
 
             # set the scaling of the 'y' variable to the ORIGINAL problem, not allowing for any padding
             # also use the WHOLE sample to get the scaling factors
-            target_copy = np.copy(target)
-            _, self.target_mu, self.target_sigma = self.preprocessing(target_copy)
+            _, self.target_mu, self.target_sigma = self.preprocessing(target)
             print( " Computing scaling factors on scaled output ", self.target_mu, self.target_sigma)
 
-            # Create copies to extend, based on input values
-            #  - do *not* try to edit these on the fly, since we need to loop through the *original* sample
-            input_train_revised = np.array(input_train)
-            target_train_revised = np.array(target_train)
-            errors_train_revised = np.array(errors_train)
-            
-            p_epsilon = 1e-3
-            
             if not no_pad:
-              for dim in xrange(self.n_inputs):
-                  # take the max and min values of the array
-                  #   - don't use actual min and max, in case of crazy outliers that will leave large gaps in NN coverage
-                  true_min,true_max = np.percentile(input_train[:,dim],p_epsilon*100),np.percentile(input_train[:,dim],100*(1-p_epsilon))
-                  # find target range
-                  #   - choice depends on if signs are different!
-                  #   - if same sign, use a factor 
-                  test_min, test_max = 0.5*true_min,2*true_max
-                  if test_min*test_max < 0: # two different signs for this parameter
-                      test_min, test_max = 2*true_min, 2*true_max
-                  # Creating fake samples. Note size scaled so TOTAL number of fake samples scales with total sample size
-#                  print " Extending range to ", test_min, test_max, input_train[:,dim], "; cutoffs  in physical coordinates are ", self.store_mu_x[dim]+self.store_sigma_x[dim]*np.array([test_min,true_min, true_max, test_max])
-                  n_samples_to_add = int(0.3*input_train.shape[0]/(1.0*self.n_inputs))
-                  fakesamples = np.random.uniform(test_min, test_max, n_samples_to_add)
-                  # remove all the values which occur in the dataset (keep np.where(newv<min) and np.where(newv>max))
-                  bad_idxs = np.where((fakesamples > (true_min)) & (fakesamples < (true_max)))
-                  fakesamples = np.delete(fakesamples, bad_idxs)
- #                 print " Adding fake samples to dimension ",dim, len(fakesamples), n_samples_to_add, "note mean, width of scaled variable are ",np.mean(input_train[:,dim]),np.std(input_train[:,dim])
-                  # set random values (draw from normal) for other parameters and then set likelihood = 0
-                  otherdims = np.random.normal(size=(fakesamples.shape[0], self.n_inputs-1))
-                  # insert the non-random fakesamples into the relevant dimension index
-                  fakesamples = np.insert(otherdims, dim, fakesamples.T, axis=1)
-                  zerolnLs = np.ones(fakesamples.shape[0])*1e-5
-                  zerolnLs = zerolnLs[:, np.newaxis]
-                  unitysigmas = np.ones(fakesamples.shape[0])
-                  unitysigmas = unitysigmas[:, np.newaxis]
-                  input_train_revised = np.append(input_train_revised, fakesamples, axis=0)
-                  target_train_revised = np.append(target_train_revised, zerolnLs, axis=0)
-                  errors_train_revised = np.append(errors_train_revised, 0.001*unitysigmas, axis=0) # assume these zeros for lnL are well-known!
-
-            input_train = input_train_revised
-            target_train = target_train_revised
-            errors_train = errors_train_revised
+                  fakesamples = self.padding_samples(input_train)
+                  # lnL = 0 at the padding points; these zeros are assumed well-known
+                  input_train = np.concatenate([input_train, fakesamples])
+                  target_train = np.concatenate([target_train, 1e-5*np.ones((len(fakesamples), self.n_outputs))])
+                  errors_train = np.concatenate([errors_train, 0.001*np.ones((len(fakesamples), self.n_outputs))])
 
             # scale the output scale *including* the padded points
             target_train, self.target_mu, self.target_sigma = self.preprocessing(target_train)
             target_valid, _, _ = self.preprocessing(target_valid, self.target_mu, self.target_sigma)
             target_test, _, _ = self.preprocessing(target_test, self.target_mu, self.target_sigma)
 
-            for dim in xrange(self.n_inputs):
-                  mu, sigma = self.store_mu_x[dim], self.store_sigma_x[dim]
-                  input_train[:, dim], _, _ = self.preprocessing(input_train[:, dim],mu=mu,sigma=sigma)
-                  input_valid[:, dim], _, _ = self.preprocessing(input_valid[:, dim], mu=mu, sigma=sigma)
-                  input_test[:, dim], _, _ = self.preprocessing(input_test[:, dim], mu=mu, sigma=sigma)
+            input_train = self.scale_input(input_train)
+            input_valid = self.scale_input(input_valid)
+            input_test = self.scale_input(input_test)
 
+            # tensors are created once, on the device; training batches are slices of these
             self.input_train = torch.from_numpy(input_train).float().to(self.device)
             self.input_valid = torch.from_numpy(input_valid).float().to(self.device)
             self.input_test = torch.from_numpy(input_test).float().to(self.device)
@@ -177,6 +144,38 @@ class Interpolator(object): # interpolator
 
             return
 
+      def padding_samples(self, input_train, p_epsilon=1e-3):
+            '''
+            Synthetic points outside the range of the training data, where the network is taught lnL = 0.
+            For each dimension: values in [0.5*min, 2*max] ([2*min, 2*max] if the range straddles zero) but outside the central
+            (1-2 p_epsilon) of the training data -- not its actual min and max, in case of outliers -- with the other inputs drawn
+            from a unit normal.  The total number of synthetic points scales with the training set size.
+            '''
+            import numpy as np
+
+            true_min = np.percentile(input_train, p_epsilon*100, axis=0)
+            true_max = np.percentile(input_train, 100*(1-p_epsilon), axis=0)
+            test_min, test_max = 0.5*true_min, 2*true_max
+            two_signs = test_min*test_max < 0
+            test_min[two_signs] = 2*true_min[two_signs]
+            n_samples_to_add = int(0.3*input_train.shape[0]/(1.0*self.n_inputs))
+            dims = np.repeat(np.arange(self.n_inputs), n_samples_to_add)
+            vals = np.random.uniform(test_min[dims], test_max[dims])
+            keep = (vals <= true_min[dims]) | (vals >= true_max[dims])
+            dims, vals = dims[keep], vals[keep]
+            fakesamples = np.random.normal(size=(len(vals), self.n_inputs))
+            fakesamples[np.arange(len(vals)), dims] = vals
+            return fakesamples
+
+      def scale_input(self, input):
+            '''
+            Inputs in the scaled coordinates used by the network, using the scaling factors of the raw training data
+            '''
+            import numpy as np
+
+            sigma = np.where(self.store_sigma_x == 0, 1, self.store_sigma_x)  # special case, as preprocessing
+            return (np.asarray(input, dtype=float) - self.store_mu_x)/sigma
+
       def set_separation(self, input, target, errors, frac, test_frac):
             '''
             Separates the input data array into training, validation, and test sets. Size of validation/test sets is based on fraction of whole input array.
@@ -184,15 +183,14 @@ class Interpolator(object): # interpolator
             '''
             import numpy as np
 
-            idxs = np.random.choice(target.shape[0], int(target.shape[0]*frac), replace=False) # validation set indices
-
-            input_valid, target_valid, errors_valid = input[idxs, :], target[idxs, :], errors[idxs, :]
-            input_train, target_train, errors_train = np.delete(input, idxs, 0), np.delete(target, idxs, 0), np.delete(errors, idxs, 0)
+            n_valid = int(target.shape[0]*frac)
+            n_test = int(target.shape[0]*test_frac)
+            idxs = np.random.permutation(target.shape[0])
+            idxs_valid, idxs_test, idxs_train = idxs[:n_valid], idxs[n_valid:n_valid+n_test], idxs[n_valid+n_test:]
 
-            idxs2 = np.random.choice(target_train.shape[0], int(target.shape[0]*test_frac), replace=False) # test set indices
-
-            input_test, target_test, errors_test = input_train[idxs2, :], target_train[idxs2, :], errors_train[idxs2, :]
-            input_train, target_train, errors_train = np.delete(input_train, idxs2, 0), np.delete(target_train, idxs2, 0), np.delete(errors_train, idxs2, 0)
+            input_valid, target_valid, errors_valid = input[idxs_valid], target[idxs_valid], errors[idxs_valid]
+            input_test, target_test, errors_test = input[idxs_test], target[idxs_test], errors[idxs_test]
+            input_train, target_train, errors_train = input[idxs_train], target[idxs_train], errors[idxs_train]
 
             return input_train, target_train, errors_train, input_valid, target_valid, errors_valid, input_test, target_test, errors_test
 
@@ -245,6 +243,32 @@ class Interpolator(object): # interpolator
             else:
                   self.net = Net(self.n_inputs, self.hlayer_size, self.n_outputs, self.p_drop).apply(weights_init)
 
+      def set_weights(self, weights, biases, mu_x=None, sigma_x=None, target_mu=None, target_sigma=None):
+            '''
+            Initializes the network from the weights and biases of a previous fit (linear layers in order, e.g. from a fit artifact).
+            If the input (mu_x, sigma_x) and output (target_mu, target_sigma) scalings of the previous fit are given, the first and
+            last layers are rescaled so the network starts from exactly the previous fit, in this interpolator's scalings.
+            '''
+            import numpy as np
+
+            layers = [layer for layer in self.net.children() if isinstance(layer, torch.nn.Linear)]
+            if len(layers) != len(weights) or any([tuple(layer.weight.shape) != np.shape(W) for layer, W in zip(layers, weights)]):
+                  raise ValueError(" senni: previous network has a different architecture ")
+            weights = [np.array(W, dtype=float) for W in weights]
+            biases = [np.array(b, dtype=float) for b in biases]
+            if not (mu_x is None):
+                  sigma_new = np.where(self.store_sigma_x == 0, 1, self.store_sigma_x)
+                  biases[0] = biases[0] + np.dot(weights[0], (self.store_mu_x - mu_x)/sigma_x)
+                  weights[0] = weights[0]*(sigma_new/sigma_x)
+            if not (target_mu is None):
+                  biases[-1] = (biases[-1]*target_sigma + target_mu - self.target_mu)/self.target_sigma
+                  weights[-1] = weights[-1]*target_sigma/self.target_sigma
+            with torch.no_grad():
+                  for layer, W, b in zip(layers, weights, biases):
+                        layer.weight.copy_(torch.from_numpy(W).float())
+                        layer.bias.copy_(torch.from_numpy(b).float())
+            self.fold_input_scaling()
+
       def optim_init(self, learning_rate, betas, eps, weight_decay):
             '''
             Optimizer initialization, specifically Adam for now, using network parameters and specified optimizer parameters
@@ -290,31 +314,48 @@ class Interpolator(object): # interpolator
             t_max = torch.max(target)
             return torch.sum((output-target)**2*torch.exp(-0.2*torch.abs(t_max-output))/(error)**2)/(output.shape[0]-self.n_inputs) + 1e-6*weight_mag
 
+      def validation_loss_value(self):
+            '''
+            Loss on the validation set, network in evaluation mode (no dropout)
+            '''
+            self.net.eval()
+            with torch.no_grad():
+                  if self.loss_func == 'mape':
+                      validation_loss = self.MAPEloss(self.net(self.input_valid), self.target_valid, self.target_mu, self.target_sigma)
+                  if self.loss_func == 'chi2':
+                      validation_loss = self.reducedchisquareloss(self.net(self.input_valid), self.target_valid, self.errors_valid)
+            self.net.train()
+            return validation_loss
+
       def train(self,debug=True):
             '''
             Training on the inputs
             Inputs and target should be of the form [array1, array2, ...]
+            Mini-batches are index slices of the training tensors (no per-sample data loader).  The best network so far
+            (validation loss) is kept in memory and restored at each learning rate reduction.  If self.patience is set, training
+            stops early once the validation loss has not improved for self.patience epochs, and the best network is restored at the end.
             '''
+            import copy
             import numpy as np
-            from torch.autograd import Variable
-            import torch.utils.data as Data
-
-            try: os.system('rm ' + working_dir + '/models/bestmodel.pt')
-            except: pass
-
-            dataset = Data.TensorDataset(self.input_train, self.target_train, self.errors_train)
-
-            loader = Data.DataLoader(dataset=dataset, batch_size=self.batch_size, shuffle=self.shuffle)
 
+            self.input_layer_raw = None
+            n_train = self.input_train.shape[0]
             validation_threshold = 1e10
+            best_state = None
+            epoch_best = 0
+            self.net.train()
 
             for epoch in np.arange(1, self.epochs+1):
 
-                  for step, (batch_input, batch_target, batch_error) in enumerate(loader):
-
-                        batch_inputs = Variable(batch_input)
-                        batch_targets = Variable(batch_target)
-                        batch_errors = Variable(batch_error)
+                  if self.shuffle:
+                        order = torch.randperm(n_train, device=self.device)
+                  else:
+                        order = torch.arange(n_train, device=self.device)
+                  for indx_start in range(0, n_train, self.batch_size):
+                        indx_batch = order[indx_start:indx_start+self.batch_size]
+                        batch_inputs = self.input_train[indx_batch]
+                        batch_targets = self.target_train[indx_batch]
+                        batch_errors = self.errors_train[indx_batch]
 
                         prediction = self.net(batch_inputs)
 
@@ -327,63 +368,67 @@ class Interpolator(object): # interpolator
                         loss.backward()      
                         self.optim.step()
 
-                  if self.loss_func == 'mape':
-                      validation_loss = self.MAPEloss(self.net(self.input_valid), self.target_valid, self.target_mu, self.target_sigma)
-                  if self.loss_func == 'chi2':
-                      validation_loss = self.reducedchisquareloss(self.net(self.input_valid), self.target_valid, self.errors_valid)
+                  validation_loss = self.validation_loss_value()
 
                   # L2 regularization on *weights*. 
                   # ALREADY implemented in the optimizer with weight_decay: redundant to do both!
                   if self.regularize:
-                      reg_loss = None
-                      for param in self.net.named_parameters():
-                          param_name =param[0]
-                          param=param[1]
-# Don't regularize last layer (as that sets overall scale of function, rather than structure).
-#                      if 'linear9' in param_name:
-#                          continue
-#  do not regularize bias terms?
-#                          if 'bias' in param_name:
-#                              continue
-                          if reg_loss is None:
-                              reg_loss = 0.5 * torch.sum(param**2)
-                          else:
-                              reg_loss = reg_loss + 0.5 * param.norm(2)**2
+                      with torch.no_grad():
+                          reg_loss = 0
+                          for param_name, param in self.net.named_parameters():
+                              reg_loss = reg_loss + 0.5 * torch.sum(param**2)
                       validation_loss += 0.9*reg_loss
-                  
 
                   if validation_loss < 1e-6:
                       print( "   ... should we stop? ")
                       break
 
                   if validation_loss < validation_threshold:
-
                         validation_threshold = validation_loss
-
-                        torch.save({
-                        'model_state_dict': self.net.state_dict(),
-                        }, self.working_dir+'/models/bestmodel.pt')
+                        best_state = copy.deepcopy(self.net.state_dict())
+                        epoch_best = epoch
 
                   if epoch % self.epochs_per_lr == 0 and epoch <= self.lr_divisions*self.epochs_per_lr:
-                      if os.path.exists(self.working_dir+'/models/bestmodel.pt'):
-                        savedmodel = torch.load(self.working_dir+'/models/bestmodel.pt')
-                        self.net.load_state_dict(savedmodel['model_state_dict'])
+                      if not (best_state is None):
+                        self.net.load_state_dict(best_state)
 
                   self.sched.step()
                   
                   if debug:
-                      print( "Epoch %d out of %d complete" % (epoch, self.epochs), '  loss ', validation_loss)
+                      print( "Epoch %d out of %d complete" % (epoch, self.epochs), '  loss ', float(validation_loss))
+
+                  if self.patience and epoch - epoch_best >= self.patience:
+                      print( "   Stopping at epoch %d: no improvement in validation loss since epoch %d " % (epoch, epoch_best))
+                      break
 
-            if self.loss_func == 'mape':
+            if self.patience and not (best_state is None):
+                  self.net.load_state_dict(best_state)
+
+            self.net.eval()
+            with torch.no_grad():
+              if self.loss_func == 'mape':
                 self.train_loss = self.MAPEloss(self.net(self.input_train), self.target_train, self.target_mu, self.target_sigma)
                 self.valid_loss = self.MAPEloss(self.net(self.input_valid), self.target_valid, self.target_mu, self.target_sigma)
                 if debug:
                     print( "   Loss (MAPE) ", self.train_loss, self.valid_loss)
-            if self.loss_func == 'chi2':
+              if self.loss_func == 'chi2':
                 self.train_loss = self.reducedchisquareloss(self.net(self.input_train), self.target_train, self.errors_train)
                 self.valid_loss = self.reducedchisquareloss(self.net(self.input_valid), self.target_valid, self.errors_valid)
                 if debug:
                     print( "   Loss (chi2) ", self.train_loss, self.valid_loss)
+            self.fold_input_scaling()
+
+      def fold_input_scaling(self):
+            '''
+            First layer acting on raw (unscaled) inputs: the input shift and scale folded into its weights and bias, in double precision
+            (raw inputs can be large compared to their spread).  Used by evaluate; recomputed whenever the weights change
+            '''
+            import numpy as np
+
+            sigma = np.where(self.store_sigma_x == 0, 1, self.store_sigma_x)
+            W = self.net.linear1.weight.detach().cpu().double().numpy()/sigma
+            b = self.net.linear1.bias.detach().cpu().double().numpy() - np.dot(W, self.store_mu_x)
+            self.input_layer_raw = (torch.from_numpy(W).to(self.device), torch.from_numpy(b).to(self.device))
 
       def save(self, filename):
             '''
@@ -402,22 +447,29 @@ class Interpolator(object): # interpolator
             savedmodel = torch.load(filename)
             self.net.load_state_dict(savedmodel['model_state_dict'])
             self.optim.load_state_dict(savedmodel['optimizer_state_dict'])
+            self.fold_input_scaling()
             print( 'Loaded model %s' % filename)
             return
 
-      def evaluate(self, input):
+      def evaluate(self, input, n_chunk=100000):
             '''
-            Uses the currently loaded model to evaluate an input array
+            Uses the currently loaded model to evaluate an input array.
+            Raw inputs go straight to the first layer, with the input scaling folded in (fold_input_scaling; double precision),
+            then through the rest of the network without gradient tracking, n_chunk points at a time
             '''
             import numpy as np
 
-            input_copy = np.zeros(input.shape)
-            for dim in xrange(np.size(input, 1)):
-                  input_copy[:, dim], _, _ = self.preprocessing(input[:, dim],mu=self.store_mu_x[dim],sigma=self.store_sigma_x[dim])
-
+            if getattr(self, 'input_layer_raw', None) is None:
+                  self.fold_input_scaling()
+            W_raw, b_raw = self.input_layer_raw
+            input = np.asarray(input, dtype=float)
+            output = np.empty(len(input))
             self.net.eval()
-
-            output = self.net(torch.from_numpy(input_copy).float().to(self.device)).detach().cpu().numpy()[:,0] # convert back to 1d output
+            with torch.no_grad():
+                  for indx_start in range(0, len(input), n_chunk):
+                        input_here = torch.from_numpy(input[indx_start:indx_start+n_chunk]).to(self.device)
+                        hidden_here = torch.selu(torch.nn.functional.linear(input_here, W_raw, b_raw)).float()
+                        output[indx_start:indx_start+n_chunk] = self.net.forward_hidden(hidden_here).cpu().numpy()[:,0] # convert back to 1d output
             output *= self.target_sigma
             output += self.target_mu
 
@@ -428,7 +480,7 @@ class AdaptiveInterpolator(Interpolator):
       def __init__(self, input, target, errors, frac=0.1, test_frac=0.1, hlayer_size=32, p_drop=0,
                    epochs=100, learning_rate=1e-2, betas=(0.9, 0.99), eps=1e-2, weight_decay=1e-6,
                    epochs_per_lr=20, lr_divisions=5, lr_frac=1./3., batch_size=128, shuffle=True, 
-                   working_dir='.', loss_func='chi2', no_pad=False):
+                   working_dir='.', loss_func='chi2', no_pad=False, patience=None, n_threads=None):
 
             self.input = input
             self.target = target
@@ -450,11 +502,13 @@ class AdaptiveInterpolator(Interpolator):
             self.working_dir = working_dir
             self.loss_func = loss_func
             self.no_pad = no_pad
+            self.patience = patience
+            self.n_threads = n_threads
 
             Interpolator.__init__(self, self.input, self.target, self.errors, frac=self.frac, test_frac=self.test_frac, hlayer_size=self.hlayer_size, p_drop=self.p_drop,
                    epochs=self.epochs, learning_rate=self.learning_rate, betas=self.betas, eps=self.eps, weight_decay=self.weight_decay, epochs_per_lr=self.epochs_per_lr, 
                    lr_divisions=self.lr_divisions, lr_frac=self.lr_frac, batch_size=self.batch_size, shuffle=self.shuffle, working_dir=self.working_dir,
-                   loss_func=self.loss_func, no_pad=self.no_pad)
+                   loss_func=self.loss_func, no_pad=self.no_pad, patience=self.patience, n_threads=self.n_threads)
 
       def train(self):
 
@@ -466,18 +520,18 @@ class AdaptiveInterpolator(Interpolator):
 
             while self.valid_loss < 1e-3:
 
-                  self.hlayer_size /= 2
+                  self.hlayer_size = int(self.hlayer_size/2)
 
                   print('Decreasing until reasonable layer size reached, currently trying %d' % self.hlayer_size)
 
                   Interpolator.__init__(self, self.input, self.target, self.errors, frac=self.frac, test_frac=self.test_frac, hlayer_size=self.hlayer_size, p_drop=self.p_drop,
                    epochs=self.epochs, learning_rate=self.learning_rate, betas=self.betas, eps=self.eps, weight_decay=self.weight_decay, epochs_per_lr=self.epochs_per_lr, 
                    lr_divisions=self.lr_divisions, lr_frac=self.lr_frac, batch_size=self.batch_size, shuffle=self.shuffle, working_dir=self.working_dir,
-                   loss_func=self.loss_func, no_pad=self.no_pad)
+                   loss_func=self.loss_func, no_pad=self.no_pad, patience=self.patience, n_threads=self.n_threads)
 
                   super(AdaptiveInterpolator, self).train()
 
-            if self.valid_loss < 1: self.hlayer_size /= 2
+            if self.valid_loss < 1: self.hlayer_size = int(self.hlayer_size/2)
 
             ceiling = 2*self.hlayer_size
 
@@ -496,7 +550,7 @@ class AdaptiveInterpolator(Interpolator):
                   Interpolator.__init__(self, self.input, self.target, self.errors, frac=self.frac, test_frac=self.test_frac, hlayer_size=self.hlayer_size, p_drop=self.p_drop,
                    epochs=self.epochs, learning_rate=self.learning_rate, betas=self.betas, eps=self.eps, weight_decay=self.weight_decay, epochs_per_lr=self.epochs_per_lr, 
                    lr_divisions=self.lr_divisions, lr_frac=self.lr_frac, batch_size=self.batch_size, shuffle=self.shuffle, working_dir=self.working_dir,
-                   loss_func=self.loss_func, no_pad=self.no_pad)
+                   loss_func=self.loss_func, no_pad=self.no_pad, patience=self.patience, n_threads=self.n_threads)
 
                   super(AdaptiveInterpolator, self).train()
 
@@ -510,7 +564,7 @@ class AdaptiveInterpolator(Interpolator):
             Interpolator.__init__(self, self.input, self.target, self.errors, frac=self.frac, test_frac=self.test_frac, hlayer_size=self.hlayer_size, p_drop=self.p_drop,
                    epochs=self.epochs, learning_rate=self.learning_rate, betas=self.betas, eps=self.eps, weight_decay=self.weight_decay, epochs_per_lr=self.epochs_per_lr, 
                    lr_divisions=self.lr_divisions, lr_frac=self.lr_frac, batch_size=self.batch_size, shuffle=self.shuffle, working_dir=self.working_dir,
-                   loss_func=self.loss_func, no_pad=self.no_pad)
+                   loss_func=self.loss_func, no_pad=self.no_pad, patience=self.patience, n_threads=self.n_threads)
 
             print( '-------OPTIMAL HIDDEN LAYERS FOUND TO BE %d, RE-TRAINING WITH THIS SETTING-------' % self.hlayer_size)
 
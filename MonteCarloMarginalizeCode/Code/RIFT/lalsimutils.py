@@ -5315,7 +5315,263 @@ def DataRollTime(ht,DeltaT):  # ONLY FOR TIME DOMAIN. ACTS IN PLACE
     return DataRollBins(ht, nL)            
 
 
-def convert_waveform_coordinates(x_in,coord_names=['mc', 'eta'],low_level_coord_names=['m1','m2'],enforce_kerr=False,source_redshift=0):
+###
+### Vectorized coordinate engine
+###
+#   Each coordinate is defined once, as a numpy function acting on a dict of arrays ('state') holding the attributes of
+#   ChooseWaveformParams (m1, m2, s1x,...,s2z, lambda1, lambda2, eccentricity, theta (=beta), phi (=lambda), ...).
+#   Assignments mirror ChooseWaveformParams.assign_param, including what is held fixed, so applying them in the order
+#   of low_level_coord_names reproduces the per-sample assign_param loop.  Extractions mirror extract_param.
+#   Any coordinate in these two registries can therefore be converted to any other, without building one
+#   ChooseWaveformParams per sample.
+
+vector_state_names = ['m1','m2','s1x','s1y','s1z','s2x','s2y','s2z','lambda1','lambda2','eccentricity','meanPerAno','dist','incl','phiref','theta','phi','psi','tref','fmin','fref']
+
+def _vector_Lhat(state):
+    if spin_convention == "L":
+        return 0., 0., 1.
+    return np.sin(state['incl']), 0., np.cos(state['incl'])
+
+def _vector_set_masses(state, m1, m2):
+    state['m1'], state['m2'] = m1, m2
+
+def _vector_assign_mtot(state, val):
+    q = state['m2']/state['m1']
+    _vector_set_masses(state, 1./(1+q)*val, q/(1.+q)*val)
+def _vector_assign_q(state, val):
+    mtot = state['m2']+state['m1']
+    _vector_set_masses(state, 1./(1+val)*mtot, val/(1.+val)*mtot)
+def _vector_assign_mc(state, val):
+    eta = symRatio(state['m1'], state['m2'])
+    _vector_set_masses(state, *m1m2(val, eta))
+def _vector_assign_eta(state, val):
+    mc = mchirp(state['m1'], state['m2'])
+    _vector_set_masses(state, *m1m2(mc, val))
+def _vector_assign_delta(state, val):
+    M = state['m1']+state['m2']
+    _vector_set_masses(state, M*(1+val)/2, M*(1-val)/2)
+
+def _vector_assign_perp_bar(indx, use_u=False):
+    def assign(state, val):
+        Rb = np.power(val, 1./p_R) if use_u else val
+        sx, sy, sz = ['s{}{}'.format(indx, c) for c in 'xyz']
+        phi = np.arctan2(state[sy], state[sx])
+        chi_perp_new = Rb*np.sqrt(1-state[sz]**2)
+        state[sx], state[sy] = chi_perp_new*np.cos(phi), chi_perp_new*np.sin(phi)
+    return assign
+
+def _vector_assign_chi(indx):
+    def assign(state, val):
+        sx, sy, sz = ['s{}{}'.format(indx, c) for c in 'xyz']
+        chi_mag = np.sqrt(state[sx]**2+state[sy]**2+state[sz]**2)
+        Lhat = _vector_Lhat(state)
+        aligned = chi_mag < 1e-5   # no direction to preserve: spin along L, as in assign_param
+        with np.errstate(divide='ignore', invalid='ignore'):
+            state[sx], state[sy], state[sz] = [np.where(aligned, val*Lhat[k], val*state[s]/chi_mag) for k, s in enumerate([sx, sy, sz])]
+    return assign
+
+def _vector_assign_theta(indx):
+    def assign(state, val):
+        sx, sy, sz = ['s{}{}'.format(indx, c) for c in 'xyz']
+        chiperp_now = np.sqrt(state[sx]**2+state[sy]**2)
+        chi_now = np.sqrt(state[sz]**2+chiperp_now**2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            aligned = chiperp_now/chi_now < 1e-9
+            s_x = np.where(aligned, chi_now*np.sin(val), chi_now*np.sin(val)*state[sx]/chiperp_now)
+            s_y = np.where(aligned, 0., chi_now*np.sin(val)*state[sy]/chiperp_now)
+        state[sx], state[sy], state[sz] = s_x, s_y, chi_now*np.cos(val)
+    return assign
+
+def _vector_assign_phi(indx):
+    def assign(state, val):
+        sx, sy = 's{}x'.format(indx), 's{}y'.format(indx)
+        chiperp_now = np.sqrt(state[sx]**2+state[sy]**2)
+        state[sx], state[sy] = chiperp_now*np.cos(val), chiperp_now*np.sin(val)
+    return assign
+
+def _vector_assign_plus_minus(name1, name2, is_plus):
+    def assign(state, val):
+        if is_plus:
+            czm, czp = (state[name1]-state[name2])/2., val
+        else:
+            czm, czp = val, (state[name1]+state[name2])/2.
+        state[name1], state[name2] = czp+czm, czp-czm
+    return assign
+
+def _vector_assign_tidal(is_delta):
+    def assign(state, val):
+        Lt, dLt = tidal_lambda_tilde(state['m1'], state['m2'], state['lambda1'], state['lambda2'])
+        if is_delta:
+            dLt = val
+        else:
+            Lt = val
+        state['lambda1'], state['lambda2'] = tidal_lambda_from_tilde(state['m1'], state['m2'], Lt, dLt)
+    return assign
+
+def _vector_assign_chieff_aligned(state, val):
+    m1, m2 = state['m1'], state['m2']
+    chiminus = (m2*state['s1z'] - m1*state['s2z'])/(m1+m2)
+    chi1_new = (m1+m2)/(m1**2+m2**2) * (m1*val + m2*chiminus)
+    chi2_new = (m1+m2)/(m1**2+m2**2) * (m2*val + m1*chiminus)
+    # equal mass: spins set to chieff, preserving spin directions (as assign_param('chi1'), assign_param('chi2'))
+    equal_mass = np.abs(m1/m2-1) <= 1e-5
+    state_equal = dict(state)
+    _vector_assign_chi(1)(state_equal, val)
+    _vector_assign_chi(2)(state_equal, val)
+    for p in ['s1x','s1y','s2x','s2y']:
+        state[p] = np.where(equal_mass, state_equal[p], state[p])
+    state['s1z'] = np.where(equal_mass, state_equal['s1z'], chi1_new)
+    state['s2z'] = np.where(equal_mass, state_equal['s2z'], chi2_new)
+
+def _vector_assign_mu(is_mu1):
+    def assign(state, val):
+        m1, m2 = state['m1'], state['m2']
+        fac_scale = np.where(m1 > 1e10, lal.MSUN_SI, 1)
+        q = m2/m1
+        mc = mchirp(m1/fac_scale, m2/fac_scale)
+        mu1, mu2, mu3 = tools.Mcqchi1chi2Tomu1mu2mu3(mc, q, state['s1z'], state['s2z'])
+        if is_mu1:
+            mu1 = val
+        else:
+            mu2 = val
+        mu1, mu2, q, s2z = np.broadcast_arrays(mu1, mu2, q, state['s2z'])
+        mcNew, q, chi1z, chi2z = tools.mu1mu2qchi2ToMcqchi1chi2(np.array(mu1,dtype=float), mu2, q, s2z)  # q,chi2z is fixed
+        state['s1z'] = chi1z
+        _vector_assign_mc(state, mcNew*fac_scale)
+    return assign
+
+def _vector_assign_attribute(name):
+    def assign(state, val):
+        state[name] = val
+    return assign
+
+vector_assign_param = {p: _vector_assign_attribute(p) for p in vector_state_names}
+vector_assign_param.update({
+    'mtot': _vector_assign_mtot, 'q': _vector_assign_q,
+    'log_mc': (lambda state, val: _vector_assign_mc(state, 10**val)),
+    'mc': _vector_assign_mc, 'mc_ecc': _vector_assign_mc,
+    'eta': _vector_assign_eta, 'delta': _vector_assign_delta,
+    'delta_mc': (lambda state, val: _vector_assign_eta(state, 0.25*(1 - val*val))),
+    'chiz_plus': _vector_assign_plus_minus('s1z', 's2z', True), 'chiz_minus': _vector_assign_plus_minus('s1z', 's2z', False),
+    's1z_bar': _vector_assign_attribute('s1z'), 's2z_bar': _vector_assign_attribute('s2z'),
+    'chi1_perp_bar': _vector_assign_perp_bar(1), 'chi1_perp_u': _vector_assign_perp_bar(1, use_u=True),
+    'chi2_perp_bar': _vector_assign_perp_bar(2), 'chi2_perp_u': _vector_assign_perp_bar(2, use_u=True),
+    'lambda': _vector_assign_attribute('phi'), 'beta': _vector_assign_attribute('theta'),
+    'cos_beta': (lambda state, val: _vector_assign_attribute('theta')(state, np.arccos(val))),
+    'lambda_plus': _vector_assign_plus_minus('lambda1', 'lambda2', True), 'lambda_minus': _vector_assign_plus_minus('lambda1', 'lambda2', False),
+    'chi1': _vector_assign_chi(1), 'chi2': _vector_assign_chi(2),
+    'theta1': _vector_assign_theta(1), 'theta2': _vector_assign_theta(2),
+    'cos_theta1': (lambda state, val: _vector_assign_theta(1)(state, np.arccos(val))),
+    'cos_theta2': (lambda state, val: _vector_assign_theta(2)(state, np.arccos(val))),
+    'phi1': _vector_assign_phi(1), 'phi2': _vector_assign_phi(2),
+    'LambdaTilde': _vector_assign_tidal(False), 'DeltaLambdaTilde': _vector_assign_tidal(True),
+    'chieff_aligned': _vector_assign_chieff_aligned,
+    'mu1': _vector_assign_mu(True), 'mu2': _vector_assign_mu(False),
+    })
+
+def _vector_spin_L(state, sign=1):
+    Lhat = _vector_Lhat(state)
+    m1, m2 = state['m1'], state['m2']
+    return sum(Lhat[k]*(m1*state['s1'+c] + sign*m2*state['s2'+c]) for k, c in enumerate('xyz'))
+
+def _vector_chi_p(state):
+    m1, m2 = state['m1'], state['m2']
+    q = m2/m1
+    A1 = (2+ 3.*q/2); A2 = (2+3./(2*q))
+    Sp = np.maximum(A1*m1**2*np.sqrt(state['s1x']**2+state['s1y']**2), A2*m2**2*np.sqrt(state['s2x']**2+state['s2y']**2))
+    return Sp/(A1*m1**2)
+
+def _vector_mu(state, indx):
+    m1, m2 = state['m1'], state['m2']
+    fac_scale = np.where(m1 > 1e10, lal.MSUN_SI, 1)
+    return tools.Mcqchi1chi2Tomu1mu2mu3(mchirp(m1, m2)/fac_scale, m2/m1, state['s1z'], state['s2z'])[indx]
+
+def _vector_S_vec(state, sign, power):
+    m1, m2 = state['m1'], state['m2']
+    return [(state['s1'+c]*m1**power + sign*state['s2'+c]*m2**power) for c in 'xyz']
+
+def _vector_perp(vec, state):
+    if spin_convention == "L":
+        return np.sqrt(vec[0]**2 + vec[1]**2), vec[2]
+    Lhat = _vector_Lhat(state)
+    v_L = sum(Lhat[k]*vec[k] for k in range(3))
+    return np.sqrt(sum(v**2 for v in vec) - v_L**2), v_L
+
+vector_extract_param = {p: (lambda p: (lambda state: state[p]))(p) for p in vector_state_names}
+vector_extract_param.update({
+    'mtot': (lambda state: state['m2']+state['m1']),
+    'q': (lambda state: state['m2']/state['m1']), 'q_mu': (lambda state: state['m2']/state['m1']),
+    'delta': (lambda state: (state['m1']-state['m2'])/(state['m1']+state['m2'])),
+    'delta_mc': (lambda state: (state['m1']-state['m2'])/(state['m1']+state['m2'])),
+    'mc': (lambda state: mchirp(state['m1'], state['m2'])),
+    'mc_ecc': (lambda state: mchirp(state['m1'], state['m2'])/np.power( 1 - 157*state['eccentricity']**2/24., 3./5.)),
+    'log_mc': (lambda state: np.log10(mchirp(state['m1'], state['m2']))),
+    'eta': (lambda state: symRatio(state['m1'], state['m2'])),
+    'chi1': (lambda state: np.sqrt(state['s1x']**2+state['s1y']**2+state['s1z']**2)),
+    'chi2': (lambda state: np.sqrt(state['s2x']**2+state['s2y']**2+state['s2z']**2)),
+    'chi1_perp': (lambda state: _vector_perp([state['s1'+c] for c in 'xyz'], state)[0]),
+    'chi2_perp': (lambda state: _vector_perp([state['s2'+c] for c in 'xyz'], state)[0]),
+    'chi1_perp_bar': (lambda state: np.sqrt(state['s1x']**2+state['s1y']**2)/np.sqrt(1-state['s1z']**2)),
+    'chi2_perp_bar': (lambda state: np.sqrt(state['s2x']**2+state['s2y']**2)/np.sqrt(1-state['s2z']**2)),
+    'chi1_perp_u': (lambda state: np.power(np.sqrt(state['s1x']**2+state['s1y']**2)/np.sqrt(1-state['s1z']**2), p_R)),
+    'chi2_perp_u': (lambda state: np.power(np.sqrt(state['s2x']**2+state['s2y']**2)/np.sqrt(1-state['s2z']**2), p_R)),
+    's1z_bar': (lambda state: state['s1z']), 's2z_bar': (lambda state: state['s2z']),
+    'xi': (lambda state: _vector_spin_L(state)/(state['m1']+state['m2'])),
+    'chieff_aligned': (lambda state: _vector_spin_L(state)/(state['m1']+state['m2'])),
+    'chiMinus': (lambda state: _vector_spin_L(state, sign=-1)/(state['m1']+state['m2'])),
+    'chiMinusAlt': (lambda state: _vector_spin_L(state, sign=-1)/(state['m1']-state['m2'])),
+    'chiz_plus': (lambda state: (state['s1z']+state['s2z'])/2.),
+    'chiz_minus': (lambda state: (state['s1z']-state['s2z'])/2.),
+    'shu': (lambda state: _vector_spin_L(state)/(state['m1']+state['m2']) - 0.5*sum(_vector_Lhat(state)[k]*(state['s1'+c]+state['s2'+c]) for k, c in enumerate('xyz'))*(state['m1']*state['m2'])/(state['m1']+state['m2'])**2),
+    'mu1': (lambda state: _vector_mu(state, 0)), 'mu2': (lambda state: _vector_mu(state, 1)),
+    'chi2z_mu': (lambda state: state['s2z']),
+    'beta': (lambda state: state['theta']), 'lambda': (lambda state: state['phi']),
+    'cos_beta': (lambda state: np.cos(state['theta'])),
+    'lambda_plus': (lambda state: (state['lambda1']+state['lambda2'])/2.),
+    'lambda_minus': (lambda state: (state['lambda1']-state['lambda2'])/2.),
+    'theta1': (lambda state: np.arccos(state['s1z']/np.sqrt(state['s1x']**2+state['s1y']**2+state['s1z']**2))),
+    'theta2': (lambda state: np.arccos(state['s2z']/np.sqrt(state['s2x']**2+state['s2y']**2+state['s2z']**2))),
+    'cos_theta1': (lambda state: np.cos(vector_extract_param['theta1'](state))),
+    'cos_theta2': (lambda state: np.cos(vector_extract_param['theta2'](state))),
+    'phi1': (lambda state: np.angle(state['s1x'] + 1j*state['s1y'])),
+    'phi2': (lambda state: np.angle(state['s2x'] + 1j*state['s2y'])),
+    'SoverM2': (lambda state: np.sqrt(sum(s**2 for s in _vector_S_vec(state, 1, 2)))/(state['m1']+state['m2'])**2),
+    'SOverM2_perp': (lambda state: _vector_perp(_vector_S_vec(state, 1, 2), state)[0]/(state['m1']+state['m2'])**2),
+    'DeltaOverM2_perp': (lambda state: _vector_perp(_vector_S_vec(state, -1, 1), state)[0]/(state['m1']+state['m2'])),
+    'DeltaOverM2_L': (lambda state: -_vector_perp(_vector_S_vec(state, -1, 1), state)[1]/(state['m1']+state['m2'])),
+    'chi_p': _vector_chi_p,
+    'LambdaTilde': (lambda state: tidal_lambda_tilde(state['m1'], state['m2'], state['lambda1'], state['lambda2'])[0]),
+    'DeltaLambdaTilde': (lambda state: tidal_lambda_tilde(state['m1'], state['m2'], state['lambda1'], state['lambda2'])[1]),
+    })
+
+def vector_coordinates_supported(coord_names, low_level_coord_names):
+    """
+    True if every coordinate in coord_names can be extracted, and every coordinate in low_level_coord_names assigned, by the vectorized coordinate engine.
+    """
+    return all(p in vector_extract_param for p in coord_names) and all((p in vector_assign_param or p == 'chi_pavg') for p in low_level_coord_names)
+
+def vector_assign_params(x_in, low_level_coord_names, source_redshift=0, P=None):
+    """
+    Vectorized equivalent of calling P.assign_param(low_level_coord_names[k], x_in[:,k]) for each row of x_in, starting from P (default: ChooseWaveformParams()).
+    Returns a dict of arrays (the 'state'), keyed by the names in vector_state_names; use vector_extract_param[p](state) to extract any coordinate p.
+    """
+    if P is None:
+        P = ChooseWaveformParams()
+    state = {p: getattr(P, p) for p in vector_state_names}
+    for indx, p in enumerate(low_level_coord_names):
+        if p == 'chi_pavg':
+            continue
+        vector_assign_param[p](state, x_in[:,indx])
+    # Apply redshift: assume input is source-frame mass, convert m1 -> m1(1+z) = m1_z, as fit used detector frame
+    if source_redshift:
+        _vector_set_masses(state, state['m1']*(1+source_redshift), state['m2']*(1+source_redshift))
+    n_samples = len(x_in)
+    for p in vector_state_names:
+        state[p] = np.broadcast_to(state[p], (n_samples,))
+    return state
+
+
+def convert_waveform_coordinates(x_in,coord_names=['mc', 'eta'],low_level_coord_names=['m1','m2'],enforce_kerr=False,source_redshift=0,x_out=None):
     """
     A wrapper for ChooseWaveformParams() 's coordinate tools (extract_param, assign_param) providing array-formatted coordinate changes.  BE VERY CAREFUL, because coordinates may be defined inconsistently (e.g., holding different variables constant: M and eta, or mc and q).  Note that if ChooseWaveformParam structuers are built ,the loops can be quite slow
 
@@ -5323,8 +5579,10 @@ def convert_waveform_coordinates(x_in,coord_names=['mc', 'eta'],low_level_coord_
       - coordinates in x_out already in x_in are copied over directly
       - xi==chi_eff, chiMinus, mu1,mu2 : transformed directly from mc, delta_mc, s1z,s2z coordinates, using fast vectorized transformations.
       - source_redshift: if nonzero, convert m1 -> m1 (1+z)=m_z, as fit is done in the detector frame.  We are **assuming source-frame sampling**
+      - x_out: if provided, an array of shape (len(x_in), len(coord_names)) which is filled and returned, so repeated calls need not allocate
     """
-    x_out = np.zeros( (len(x_in), len(coord_names) ) )
+    if x_out is None:
+        x_out = np.zeros( (len(x_in), len(coord_names) ) )
     # Check for trivial identity transformations and do those by direct copy, then remove those from the list of output coord names
     coord_names_reduced = coord_names.copy() 
     for p in low_level_coord_names:
@@ -5724,6 +5982,15 @@ def convert_waveform_coordinates(x_in,coord_names=['mc', 'eta'],low_level_coord_
     if len(coord_names_reduced)<1:
         return x_out
 
+    if vector_coordinates_supported(coord_names_reduced, low_level_coord_names):
+        state = vector_assign_params(x_in, low_level_coord_names, source_redshift=source_redshift)
+        for p in coord_names_reduced:
+            x_out[:,coord_names.index(p)] = vector_extract_param[p](state)
+        if enforce_kerr:  # insure Kerr bound satisfied: return negative infinity for all coordinates, if Kerr bound violated
+            indx_bad = np.logical_or(vector_extract_param['chi1'](state) > 1, vector_extract_param['chi2'](state) > 1)
+            x_out[indx_bad] = -np.inf
+        return x_out
+
     print(" Fallthrough to non-vector-coords for ", coord_names_reduced,low_level_coord_names)
     
     P = ChooseWaveformParams()
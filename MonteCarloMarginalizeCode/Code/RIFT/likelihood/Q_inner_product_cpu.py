@@ -0,0 +1,63 @@
+'''
+Q_inner_product_cpu.py
+
+CPU counterpart of Q_inner_product.Q_inner_product_cupy, used by DiscreteFactoredLogLikelihoodViaArrayVectorNoLoop
+when running on numpy:
+   out[i, t] = sum_lm  A[i, lm] Q[start_indices[i] + t, lm]        t = 0 .. window_size-1
+for Q of shape (npts_time_full, n_lms) and A (= conj(F Ylm)) of shape (npts_extrinsic, n_lms).
+
+The windowed copy of Q for every extrinsic point (shape (npts_extrinsic, window_size, n_lms)) is never formed:
+  - with numba: compiled loop, parallel over extrinsic points, reading each window of Q in place
+  - without numba: strided (zero-copy) sliding-window view of Q; windows are gathered chunk_size extrinsic points at a time,
+    so the temporary is at most chunk_size*window_size*n_lms complex numbers
+Both paths sum over lm in order, so agree exactly with the original einsum over the (npts_extrinsic, window_size, n_lms) copy.
+'''
+from __future__ import print_function
+
+import numpy as np
+
+try:
+    import numba
+    numba_ok = True
+except ImportError:
+    numba_ok = False
+
+default_chunk_memory_mb = 8   # numpy path, chunk_size=None: size of the gathered windows (small: stays in cache)
+
+if numba_ok:
+    @numba.njit(parallel=True, cache=True)
+    def _Q_inner_numba(Q, A, start_indices, window_size, out):
+        n_ext, n_lms = A.shape
+        for i in numba.prange(n_ext):
+            indx_start = start_indices[i]
+            for t in range(window_size):
+                val = 0j
+                for lm in range(n_lms):
+                    val += A[i, lm]*Q[indx_start+t, lm]
+                out[i, t] = val
+
+
+def Q_inner_product_cpu(Q, A, start_indices, window_size, chunk_size=None, use_numba=True):
+    """
+    Q_inner_product_cpu(Q, A, start_indices, window_size) : complex array (npts_extrinsic, window_size); same API as Q_inner_product_cupy.
+    chunk_size : number of extrinsic points handled at once (numpy path; default from default_chunk_memory_mb)
+    """
+    Q = np.ascontiguousarray(Q, dtype=np.complex128)
+    A = np.ascontiguousarray(A, dtype=np.complex128)
+    start_indices = np.asarray(start_indices, dtype=np.int64)
+    window_size = int(window_size)
+    num_time_points, num_lms = Q.shape
+    num_extrinsic_samples = len(A)
+    if num_extrinsic_samples and (np.min(start_indices) < 0 or np.max(start_indices) + window_size > num_time_points):
+        raise ValueError(" Q_inner_product_cpu: time window outside the rholm time series; check the data/template duration ")
+    out = np.empty((num_extrinsic_samples, window_size), dtype=np.complex128)
+    if use_numba and numba_ok:
+        _Q_inner_numba(Q, A, start_indices, window_size, out)
+        return out
+    if chunk_size is None:
+        chunk_size = int(np.max([1, default_chunk_memory_mb*1024**2/(16.*window_size*num_lms)]))
+    Q_windows = np.lib.stride_tricks.sliding_window_view(Q, window_size, axis=0)   # (.., n_lms, window_size), no copy
+    for indx_start in range(0, num_extrinsic_samples, chunk_size):
+        indx_here = slice(indx_start, indx_start+chunk_size)
+        out[indx_here] = np.einsum('il,ilt->it', A[indx_here], Q_windows[start_indices[indx_here]])   # same summation as the original einsum
+    return out
@@ -40,6 +40,9 @@ except:
   optimized_gpu_tools=None
   Q_inner_product=None
   xpy_default=np
+from .Q_inner_product_cpu import Q_inner_product_cpu
+Q_chunk_size_default = None   # extrinsic points per chunk in Q_inner_product_cpu (numpy path, no numba); None: automatic
+fft_workers_default = 1   # threads for the batched rholm inverse FFTs (ComputeModeIPTimeSeriesArrays)
 
 # Old code
 #from SphericalHarmonics_gpu_orig import SphericalHarmonicsVectorized_orig as SphericalHarmonicsVectorized
@@ -48,9 +51,16 @@ from .SphericalHarmonics_gpu import SphericalHarmonicsVectorized
 
 
 from scipy import interpolate, integrate
+from scipy.linalg import blas
+import scipy.fft as sp_fft
 from scipy import special
 from itertools import product, combinations
 import math
+import os
+import json
+import hashlib
+import tempfile
+from collections import OrderedDict
 
 from .vectorized_lal_tools import ComputeDetAMResponse,TimeDelayFromEarthCenter
 
@@ -117,14 +127,16 @@ def internal_hlm_generator(P,
         extra_waveform_kwargs={},
         use_gwsignal=False,
         use_gwsignal_approx=None,
-       use_external_EOB=False,nr_lookup=False,nr_lookup_valid_groups=None,no_memory=True,perturbative_extraction=False,perturbative_extraction_full=False,hybrid_use=False,hybrid_method='taper_add',use_provided_strain=False,ROM_group=None,ROM_param=None,ROM_use_basis=False,ROM_limit_basis_size=None,skip_interpolation=False,**kwargs):
+       use_external_EOB=False,use_external_EOB_executable=False,EOB_hlm_data_raw=None,nr_lookup=False,nr_lookup_valid_groups=None,no_memory=True,perturbative_extraction=False,perturbative_extraction_full=False,hybrid_use=False,hybrid_method='taper_add',use_provided_strain=False,ROM_group=None,ROM_param=None,ROM_use_basis=False,ROM_limit_basis_size=None,skip_interpolation=False,ROM_catalog=None,**kwargs):
     """
     internal_hlm_generator: top-level front end to all waveform generators used.
     Needs to be restructured so it works on a 'hook' basis, so we are not constantly changing the source code
     """
     if not( ROM_group is None) and not (ROM_param is None):
        # For ROM, use the ROM basis. Note that hlmoff -> basis_off henceforth
-       acatHere= romwf.WaveformModeCatalog(ROM_group,ROM_param,max_nbasis_per_mode=ROM_limit_basis_size,lmax=Lmax)
+       acatHere = ROM_catalog
+       if acatHere is None:
+           acatHere= romwf.WaveformModeCatalog(ROM_group,ROM_param,max_nbasis_per_mode=ROM_limit_basis_size,lmax=Lmax)
        if ROM_use_basis:
             if hybrid_use:
                # WARNING
@@ -286,25 +298,21 @@ def internal_hlm_generator(P,
 
     elif hasEOB and use_external_EOB:
             print("    Using external EOB interface (Bernuzzi)    ")
-            # Code WILL FAIL IF LAMBDA=0
-            P.taper = lsu.lsu_TAPER_START
-            lambda_crit=1e-3  # Needed to have adequate i/o output 
-            if P.lambda1<lambda_crit:
-                    P.lambda1=lambda_crit
-            if P.lambda2<lambda_crit:
-                    P.lambda2=lambda_crit
+            PrepareExternalEOBParams(P)
             if P.deltaT > 1./16384:
                     print(" Bad idea to use such a low sampling rate for EOB tidal ")
-            wfP = eobwf.WaveformModeCatalog(P,lmax=Lmax)
+            # in-process (EOBRun_module) if available, falling back to TEOBResumS.x; EOB_hlm_data_raw: mode data already generated (GenerateExternalEOBModeData)
+            wfP = eobwf.WaveformModeCatalog(P,lmax=Lmax,use_external=(True if use_external_EOB_executable else None),hlm_data_raw=EOB_hlm_data_raw)
             hlms = wfP.hlmoff(force_T=1./P.deltaF,deltaT=P.deltaT)
             # Reflection symmetric
             hlms_conj = wfP.conj_hlmoff(force_T=1./P.deltaF,deltaT=P.deltaT)
 
             # Code will not make the EOB waveform shorter, so the code can fail if you have insufficient data, later
-            print(" External EOB length check ", hlms[(2,2)].data.length, first_data.data.length, first_data.data.length*P.deltaT)
+            npts_data = int(1./P.deltaF/P.deltaT + 0.5)  # P.deltaF is the data's
+            print(" External EOB length check ", hlms[(2,2)].data.length, npts_data, npts_data*P.deltaT)
             print(" External EOB length check (in M) ", end=' ')
             print(" Comparison EOB duration check vs epoch vs window size (sec) ", wfP.estimateDurationSec(),  -hlms[(2,2)].epoch, 1./hlms[(2,2)].deltaF)
-            assert hlms[(2,2)].data.length ==first_data.data.length
+            assert hlms[(2,2)].data.length ==npts_data
             if rosDebugMessagesDictionary["DebugMessagesLong"]:
                     hlmT_ref = lsu.DataInverseFourier(hlms[(2,2)])
                     print(" External EOB: Time offset of largest sample (should be zero) ", hlms[(2,2)].epoch + np.argmax(np.abs(hlmT_ref.data.data))*P.deltaT)
@@ -328,6 +336,30 @@ def internal_hlm_generator(P,
 
     return hlms, hlms_conj
 
+def PrepareExternalEOBParams(P):
+    """
+    Settings applied (in place) to P before generating external EOB modes
+    """
+    # Code WILL FAIL IF LAMBDA=0
+    P.taper = lsu.lsu_TAPER_START
+    lambda_crit=1e-3  # Needed to have adequate i/o output 
+    if P.lambda1<lambda_crit:
+            P.lambda1=lambda_crit
+    if P.lambda2<lambda_crit:
+            P.lambda2=lambda_crit
+
+def GenerateExternalEOBModeData(P_list, n_procs=1, use_external_EOB_executable=False):
+    """
+    Raw external EOB mode data for several intrinsic points, generated concurrently by a pool of n_procs worker processes.
+    Pass each entry as EOB_hlm_data_raw to PrecomputeLikelihoodTerms for the same point; None entries (failures) are regenerated there
+    """
+    P_list_here = []
+    for P in P_list:
+        P_here = P.manual_copy()
+        PrepareExternalEOBParams(P_here)
+        P_list_here.append(P_here)
+    return eobwf.generate_hlm_data_raw_list(P_list_here, n_procs=n_procs, use_external=(True if use_external_EOB_executable else None))
+
 #
 # Main driver functions
 #
@@ -340,10 +372,20 @@ def PrecomputeLikelihoodTerms(event_time_geo, t_window, P, data_dict,
         extra_waveform_kwargs={},
         use_gwsignal=False,
         use_gwsignal_approx=None,
-       use_external_EOB=False,nr_lookup=False,nr_lookup_valid_groups=None,no_memory=True,perturbative_extraction=False,perturbative_extraction_full=False,hybrid_use=False,hybrid_method='taper_add',use_provided_strain=False,ROM_group=None,ROM_param=None,ROM_use_basis=False,ROM_limit_basis_size=None,skip_interpolation=False):
+       use_external_EOB=False,use_external_EOB_executable=False,EOB_hlm_data_raw=None,nr_lookup=False,nr_lookup_valid_groups=None,no_memory=True,perturbative_extraction=False,perturbative_extraction_full=False,hybrid_use=False,hybrid_method='taper_add',use_provided_strain=False,ROM_group=None,ROM_param=None,ROM_use_basis=False,ROM_limit_basis_size=None,skip_interpolation=False,
+        hlm_cache=None, ROM_basis_terms_dir=None, mode_pruning_cache=None):
     """
     Compute < h_lm(t) | d > and < h_lm | h_l'm' >
 
+    hlm_cache: optional RIFT.physics.WaveformModeCache.WaveformModeCache; if given, the hlms of previously seen intrinsic
+    points are loaded from it instead of generated (not for NR, external EOB, or ROM basis waveforms)
+    ROM_basis_terms_dir: with ROM_use_basis, directory of precomputed basis terms < b_k(t) | d >, < b_k | b_k' > (see SaveROMBasisTerms).
+    The terms depend on the data, the ROM and the total mass only, so are computed once per event and mass and reused by all ILE jobs
+    mode_pruning_cache: optional ModePruningCache.  Once it has learned which modes pass ignore_threshold, only those modes
+    are generated (lal ModeArray, and Lmax lowered to the largest l kept) and the per-point pruning is skipped
+    use_external_EOB_executable: with use_external_EOB, always run TEOBResumS.x, instead of the EOBRun_module python bindings when available.
+    EOB_hlm_data_raw: with use_external_EOB, the mode data for P if already generated (GenerateExternalEOBModeData)
+
     Returns:
         - Dictionary of interpolating functions, keyed on detector, then (l,m)
           e.g. rholms_intp['H1'][(2,2)]
@@ -376,24 +418,82 @@ def PrecomputeLikelihoodTerms(event_time_geo, t_window, P, data_dict,
     # Zero-pad to same length as data - NB: Assuming all FD data same resolution
     P.deltaF = first_data.deltaF
 
+    # ROM basis: the basis terms are the same for all points with this total mass (only); reuse them if already stored
+    acatHere = None
+    if ROM_use_basis:
+        acatHere = romwf.WaveformModeCatalog(ROM_group,ROM_param,max_nbasis_per_mode=ROM_limit_basis_size,lmax=Lmax)
+        if ROM_basis_terms_dir:
+            fname_rom_terms = os.path.join(ROM_basis_terms_dir, "rom_basis_terms_" + ROMBasisTermsKey(P, data_dict, psd_dict, Lmax, fMax, t_window, event_time_geo,
+                              ROM_group, ROM_param, ROM_limit_basis_size, analyticPSD_Q, inv_spec_trunc_Q, T_spec) + ".npz")
+            terms = LoadROMBasisTerms(fname_rom_terms)
+            if terms is not None:
+                rholms, crossTerms, crossTermsV, guess_snr = terms
+                print(" ROM basis terms loaded from ", fname_rom_terms)
+                for det in detectors:
+                    rholms_intp[det] = None
+                if not skip_interpolation:
+                    t_dict = {}
+                    for det in detectors:
+                        rhoXX = rholms[det][list(rholms[det].keys())[0]]
+                        t_dict[det] = np.arange(rhoXX.data.length)*rhoXX.deltaT + float(rhoXX.epoch)
+                    rholm_interpolator = RholmInterpolator(rholms, t_dict, detectors)
+                    for det in detectors:
+                        rholms_intp[det] = rholm_interpolator.mode_functions(det)
+                return rholms_intp, crossTerms, crossTermsV, rholms, guess_snr, acatHere
+
+    # Mode selection: all modes up to Lmax, unless a learned pruning decision is available
+    modes_active = None
+    Lmax_generate = Lmax
+    extra_waveform_kwargs_generate = extra_waveform_kwargs
+    use_pruning_cache = (mode_pruning_cache is not None) and not(ignore_threshold is None) and (not ROM_use_basis)
+    if use_pruning_cache:
+        modes_active = mode_pruning_cache.modes_to_generate()
+    if modes_active is not None:
+        Lmax_generate = int(np.max([mode[0] for mode in modes_active]))
+        extra_waveform_kwargs_generate = dict(extra_waveform_kwargs)
+        extra_waveform_kwargs_generate['extra_waveform_args'] = dict(extra_waveform_kwargs.get('extra_waveform_args', {}))
+        extra_waveform_kwargs_generate['extra_waveform_args']['ModeArray'] = ModeArrayFromModes(modes_active)
+        if not quiet:
+            print("  Generating only the modes ", sorted(modes_active), " (Lmax ", Lmax_generate, ")")
+
     # call internal waveform generator
-    hlms, hlms_conj = internal_hlm_generator(P,Lmax, verbose=verbose, quiet=quiet,
+    def generate_hlms():
+        return internal_hlm_generator(P,Lmax_generate, verbose=verbose, quiet=quiet,
                                              NR_group=NR_group,NR_param=NR_param, nr_lookup=nr_lookup,nr_lookup_valid_groups=nr_lookup_valid_groups,
+                                             use_external_EOB=use_external_EOB,use_external_EOB_executable=use_external_EOB_executable,EOB_hlm_data_raw=EOB_hlm_data_raw,
                                              no_memory=no_memory,perturbative_extraction=perturbative_extraction,perturbative_extraction_full=perturbative_extraction_full,
                                              hybrid_use=hybrid_use,hybrid_method=hybrid_method,use_provided_strain=use_provided_strain,
                                              ROM_group=ROM_group,ROM_param=ROM_param,ROM_use_basis=ROM_use_basis,ROM_limit_basis_size=ROM_limit_basis_size,
-                                             extra_waveform_kwargs=extra_waveform_kwargs,use_gwsignal=use_gwsignal,use_gwsignal_approx=use_gwsignal_approx,
-                                             skip_interpolation=skip_interpolation)
+                                             extra_waveform_kwargs=extra_waveform_kwargs_generate,use_gwsignal=use_gwsignal,use_gwsignal_approx=use_gwsignal_approx,
+                                             skip_interpolation=skip_interpolation, ROM_catalog=acatHere)
+    if hlm_cache is not None and not(NR_group or nr_lookup or use_external_EOB or ROM_use_basis):
+        hlms, hlms_conj = hlm_cache.cached_call(P, generate_hlms, generator='internal_hlm_generator', Lmax=Lmax_generate, no_memory=no_memory,
+                                                hybrid_use=hybrid_use, hybrid_method=hybrid_method, ROM_group=ROM_group, ROM_param=ROM_param,
+                                                extra_waveform_kwargs=extra_waveform_kwargs, use_gwsignal=use_gwsignal, use_gwsignal_approx=use_gwsignal_approx,
+                                                modes=None if modes_active is None else sorted(modes_active))
+    else:
+        hlms, hlms_conj = generate_hlms()
+    if modes_active is not None:
+        # generators that ignore the ModeArray
+        hlms = dict([(mode, hlms[mode]) for mode in hlms if mode in modes_active])
+        hlms_conj = dict([(mode, hlms_conj[mode]) for mode in hlms_conj if mode in modes_active])
                                              
 
-    if not(ignore_threshold is None) and (not ROM_use_basis):
-            crossTermsFiducial = ComputeModeCrossTermIP(hlms,hlms, psd_dict[detectors[0]], 
-                                                        P.fmin, fMax,
-                                                        1./2./P.deltaT, P.deltaF, analyticPSD_Q=analyticPSD_Q, inv_spec_trunc_Q=inv_spec_trunc_Q, T_spec=T_spec,verbose=verbose,same_waveform_Q=internal_fast_precompute)
+    # Compute cross terms < h_lm | h_l'm' > and < h_lm^* | h_l'm' >, all detectors and modes at once.
+    # The first detector's U is also the fiducial set used to prune modes below; the pruned terms are a subset
+    # PSD weights and weighted data, shared by the cross terms and the rholms, and reused by later calls
+    context_dict = GetDetectorContexts(data_dict, psd_dict, detectors, P.fmin, fMax, 1./2./P.deltaT, P.deltaF, analyticPSD_Q, inv_spec_trunc_Q, T_spec)
+    crossTerms, crossTermsV = ComputeModeCrossTermArrays(hlms, hlms_conj, psd_dict, detectors, P.fmin,
+                fMax, 1./2./P.deltaT, P.deltaF, analyticPSD_Q,
+                inv_spec_trunc_Q, T_spec,verbose=verbose, context_dict=context_dict)
+    if not(ignore_threshold is None) and (not ROM_use_basis) and (modes_active is None):
+            crossTermsFiducial = crossTerms[detectors[0]]
             theWorthwhileModes =  IdentifyEffectiveModesForDetector(crossTermsFiducial, ignore_threshold, detectors)
             # Make sure worthwhile modes satisfy reflection symmetry! Do not truncate egregiously!
             theWorthwhileModes  = theWorthwhileModes.union(  set([(p,-q) for (p,q) in theWorthwhileModes]))
             print("  Worthwhile modes : ", theWorthwhileModes)
+            if use_pruning_cache:
+                mode_pruning_cache.update(theWorthwhileModes.intersection(hlms.keys()), hlms.keys())
             hlmsNew = {}
             hlmsConjNew = {}
             for pair in theWorthwhileModes:
@@ -401,6 +501,9 @@ def PrecomputeLikelihoodTerms(event_time_geo, t_window, P, data_dict,
                     hlmsConjNew[pair] = hlms_conj[pair]
             hlms =hlmsNew
             hlms_conj= hlmsConjNew
+            for det in detectors:
+                crossTerms[det] = dict([(pair, crossTerms[det][pair]) for pair in crossTerms[det] if pair[0] in hlms and pair[1] in hlms])
+                crossTermsV[det] = dict([(pair, crossTermsV[det][pair]) for pair in crossTermsV[det] if pair[0] in hlms and pair[1] in hlms])
             if len(hlms.keys()) == 0:
                     print(" Failure ")
                     import sys
@@ -413,31 +516,34 @@ def PrecomputeLikelihoodTerms(event_time_geo, t_window, P, data_dict,
       for mode in hlms.keys():
         print(mode, first_data.data.length, hlms[mode].data.length, hlms[mode].data.length*P.deltaT, hlms[mode].epoch, hlms[mode].epoch/P.deltaT)
 
+    # Number of samples in the window [t_ref - t_window, t_ref + t_window]
+    N_window = int( 2 * t_window / P.deltaT )
+    t_det_dict = {}
+    rho_epoch_dict = {}
+    t_shift_dict = {}
+    N_shift_dict = {}
     for det in detectors:
         # This is the event time at the detector
-        t_det = ComputeArrivalTimeAtDetector(det, P.phi, P.theta,event_time_geo)
+        t_det_dict[det] = t_det = ComputeArrivalTimeAtDetector(det, P.phi, P.theta,event_time_geo)
         # The is the difference between the time of the leading edge of the
         # time window we wish to compute the likelihood in, and
         # the time corresponding to the first sample in the rholms
-        rho_epoch = data_dict[det].epoch - hlms[list(hlms.keys())[0]].epoch
-        t_shift =  float(float(t_det) - float(t_window) - float(rho_epoch))
+        rho_epoch_dict[det] = rho_epoch = data_dict[det].epoch - hlms[list(hlms.keys())[0]].epoch
+        t_shift_dict[det] = t_shift =  float(float(t_det) - float(t_window) - float(rho_epoch))
 #        assert t_shift > 0    # because NR waveforms may start at any time, they don't always have t_shift > 0 ! 
         # tThe leading edge of our time window of interest occurs
         # this many samples into the rholms
-        N_shift = int( t_shift / P.deltaT + 0.5 )  # be careful about rounding: might be one sample off!
-        # Number of samples in the window [t_ref - t_window, t_ref + t_window]
-        N_window = int( 2 * t_window / P.deltaT )
-        # Compute cross terms < h_lm | h_l'm' >
-        crossTerms[det] = ComputeModeCrossTermIP(hlms, hlms, psd_dict[det], P.fmin,
-                fMax, 1./2./P.deltaT, P.deltaF, analyticPSD_Q,
-                inv_spec_trunc_Q, T_spec,verbose=verbose,same_waveform_Q=internal_fast_precompute)
-        crossTermsV[det] = ComputeModeCrossTermIP(hlms_conj, hlms, psd_dict[det], P.fmin,
-                fMax, 1./2./P.deltaT, P.deltaF, analyticPSD_Q,
-                inv_spec_trunc_Q, T_spec,prefix="V",verbose=verbose,same_waveform_Q=internal_fast_precompute)
-        # Compute rholm(t) = < h_lm(t) | d >
-        rholms[det] = ComputeModeIPTimeSeries(hlms, data_dict[det],
-                psd_dict[det], P.fmin, fMax, 1./2./P.deltaT, N_shift, N_window,
-                analyticPSD_Q, inv_spec_trunc_Q, T_spec)
+        N_shift_dict[det] = int( t_shift / P.deltaT + 0.5 )  # be careful about rounding: might be one sample off!
+    # Compute rholm(t) = < h_lm(t) | d >, all detectors and modes in one batched inverse FFT
+    rholms = ComputeModeIPTimeSeriesArrays(hlms, data_dict, psd_dict, detectors, P.fmin, fMax, 1./2./P.deltaT,
+                N_shift_dict, N_window, analyticPSD_Q, inv_spec_trunc_Q, T_spec, context_dict=context_dict)
+
+    t_dict = {}
+    for det in detectors:
+        t_det = t_det_dict[det]
+        rho_epoch = rho_epoch_dict[det]
+        t_shift = t_shift_dict[det]
+        N_shift = N_shift_dict[det]
         rhoXX = rholms[det][list(rholms[det].keys())[0]]
         # The vector of time steps within our window of interest
         # for which we have discrete values of the rholms
@@ -458,12 +564,17 @@ def PrecomputeLikelihoodTerms(event_time_geo, t_window, P, data_dict,
             print("\tInterpolation starts at time %.20g" % t[0])
             print("\t(Should start at t_event - t_window = %.20g)" %\
                     (float(rho_epoch + N_shift * P.deltaT)))
-        # The minus N_shift indicates we need to roll left
-        # to bring the desired samples to the front of the array
-        if not skip_interpolation:
-          rholms_intp[det] =  InterpolateRholms(rholms[det], t,verbose=verbose)
-        else:
-          rholms_intp[det] = None
+        t_dict[det] = t
+    # The minus N_shift indicates we need to roll left
+    # to bring the desired samples to the front of the array
+    if not skip_interpolation:
+      # one set of spline coefficients for all detectors and modes
+      rholm_interpolator = RholmInterpolator(rholms, t_dict, detectors)
+      for det in detectors:
+        rholms_intp[det] =  rholm_interpolator.mode_functions(det)
+    else:
+      for det in detectors:
+        rholms_intp[det] = None
 
     guess_snr=None
     if True: 
@@ -488,17 +599,143 @@ def PrecomputeLikelihoodTerms(event_time_geo, t_window, P, data_dict,
     if not ROM_use_basis:
             return rholms_intp, crossTerms, crossTermsV,  rholms, guess_snr, None
     else:
+            if ROM_basis_terms_dir:
+                SaveROMBasisTerms(fname_rom_terms, rholms, crossTerms, crossTermsV, guess_snr)
             return rholms_intp, crossTerms, crossTermsV,  rholms, guess_snr,  acatHere    # labels are misleading for use_rom_basis
 
-def ReconstructPrecomputedLikelihoodTermsROM(P,acat_rom,rho_intp_rom,crossTerms_rom, crossTermsV_rom, rho_rom,verbose=True):
+def ROMBasisTermsKey(P, data_dict, psd_dict, Lmax, fMax, t_window, event_time_geo, ROM_group, ROM_param, ROM_limit_basis_size,
+                     analyticPSD_Q=False, inv_spec_trunc_Q=False, T_spec=0.):
+    """
+    Content key (sha256) for the ROM basis terms of an event: data and psd contents, settings, and the parameters of P the
+    basis time series depend on (total mass, fmin, sampling, and the sky location used to place the time window).
+    The basis terms cannot be rescaled between masses (the data are fixed in physical units), so the total mass is part of
+    the key: stored terms are reused only by points with the same total mass, e.g. a fixed-mass (intrinsic grid) job
+    """
+    h = hashlib.sha256()
+    settings = [(P.m1+P.m2)/lal.MSUN_SI, P.fmin, P.deltaT, P.deltaF, P.phi, P.theta, Lmax, fMax, t_window, float(event_time_geo),
+                ROM_group, ROM_param, ROM_limit_basis_size, analyticPSD_Q, inv_spec_trunc_Q, T_spec, rom_basis_scale]
+    h.update(json.dumps(['{:.12g}'.format(x) if isinstance(x, float) else repr(x) for x in settings]).encode('utf-8'))
+    for det in sorted(data_dict.keys()):
+        h.update(det.encode('utf-8'))
+        h.update(repr((float(data_dict[det].epoch), data_dict[det].deltaF, data_dict[det].data.length)).encode('utf-8'))
+        h.update(np.ascontiguousarray(data_dict[det].data.data).view(np.uint8))
+        if hasattr(psd_dict[det], 'data'):
+            h.update(np.ascontiguousarray(psd_dict[det].data.data).view(np.uint8))
+        else:
+            h.update(repr(psd_dict[det]).encode('utf-8'))
+    return h.hexdigest()
+
+def SaveROMBasisTerms(fname, rholms, crossTerms, crossTermsV, guess_snr=None):
+    """
+    Stores the basis terms from PrecomputeLikelihoodTerms(..., ROM_use_basis=True) in one .npz file, as dense arrays per detector:
+       rho_<det> : (n_basis, npts) < b_k(t) | d >        U_<det>, V_<det> : (n_basis, n_basis)
+    with the basis keys (l,m,k), epochs and sampling in a json header.  Written to a temporary file, then renamed into place.
+    """
+    detectors = list(rholms.keys())
+    keys = list(rholms[detectors[0]].keys())
+    rho_first = rholms[detectors[0]][keys[0]]
+    meta = {'detectors': detectors, 'keys': [[int(x) for x in key] for key in keys], 'deltaT': rho_first.deltaT, 'f0': rho_first.f0,
+            'epochs': dict([(det, [int(rholms[det][keys[0]].epoch.gpsSeconds), int(rholms[det][keys[0]].epoch.gpsNanoSeconds)]) for det in detectors]),
+            'guess_snr': None if guess_snr is None else float(guess_snr)}
+    arrays = {'meta': np.array(json.dumps(meta))}
+    for det in detectors:
+        arrays['rho_'+det] = np.array([rholms[det][key].data.data for key in keys])
+        arrays['U_'+det] = np.array([[crossTerms[det][(key1, key2)] for key2 in keys] for key1 in keys])
+        arrays['V_'+det] = np.array([[crossTermsV[det][(key1, key2)] for key2 in keys] for key1 in keys])
+    dir_out = os.path.dirname(os.path.abspath(fname))
+    if not os.path.isdir(dir_out):
+        os.makedirs(dir_out, exist_ok=True)
+    fd, fname_tmp = tempfile.mkstemp(prefix='.tmp_', suffix='.npz', dir=dir_out)
+    with os.fdopen(fd, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(fname_tmp, fname)
+    print(" ROM basis terms saved to ", fname)
+
+def LoadROMBasisTerms(fname):
+    """
+    Inverse of SaveROMBasisTerms: (rholms, crossTerms, crossTermsV, guess_snr), or None if fname is not available
+    """
+    if not os.path.exists(fname):
+        return None
+    try:
+        with np.load(fname) as dat:
+            meta = json.loads(str(dat['meta']))
+            arrays = dict([(name, dat[name]) for name in dat.files if name != 'meta'])
+    except (IOError, OSError, ValueError) as e:
+        print(" ROM basis terms: cannot read ", fname, e)
+        return None
+    keys = [tuple(key) for key in meta['keys']]
+    rholms = {}
+    crossTerms = {}
+    crossTermsV = {}
+    for det in meta['detectors']:
+        epoch = lal.LIGOTimeGPS(meta['epochs'][det][0], meta['epochs'][det][1])
+        rho = arrays['rho_'+det]
+        rholms[det] = {}
+        for indx, key in enumerate(keys):
+            rhoTS = lal.CreateCOMPLEX16TimeSeries("rho", epoch, meta['f0'], meta['deltaT'], lsu.lsu_DimensionlessUnit, rho.shape[1])
+            rhoTS.data.data = rho[indx]
+            rholms[det][key] = rhoTS
+        U = arrays['U_'+det]
+        V = arrays['V_'+det]
+        crossTerms[det] = dict([((key1, key2), U[indx1, indx2]) for indx1, key1 in enumerate(keys) for indx2, key2 in enumerate(keys)])
+        crossTermsV[det] = dict([((key1, key2), V[indx1, indx2]) for indx1, key1 in enumerate(keys) for indx2, key2 in enumerate(keys)])
+    return rholms, crossTerms, crossTermsV, meta['guess_snr']
+
+rom_basis_term_cache = {}   # dense ROM basis terms for the last (rho_rom, crossTerms_rom, crossTermsV_rom) used
+
+def ROMBasisTermArrays(acat_rom, rho_rom, crossTerms_rom, crossTermsV_rom):
+    """
+    Dense form of the basis-function terms <w_lmk|data>, <w_lmk|w_l'm'k'> from PrecomputeLikelihoodTerms(...,ROM_use_basis=True),
+    indexed like acat_rom.coefficients_array (modes in acat_rom.coefficient_modes() order, then basis index):
+       rho[det] : (n_modes, n_basis, npts)      U[det], V[det] : (n_modes, n_basis, n_modes, n_basis)
+    Basis functions not present (zero padding, l > Lmax) have zero entries.  Built once, reused while the inputs are the same objects.
+    """
+    if rom_basis_term_cache.get('inputs', None) is not None and all([a is b for a, b in zip(rom_basis_term_cache['inputs'], (acat_rom, rho_rom, crossTerms_rom, crossTermsV_rom))]):
+        return rom_basis_term_cache['arrays']
+    modes = acat_rom.coefficient_modes()
+    n_basis = int(np.max([acat_rom.nbasis_per_mode[mode] for mode in modes]))
+    indx_basis = [(mode[0], mode[1], indx) for mode in modes for indx in np.arange(n_basis)]
+    n_tot = len(indx_basis)
+    arrays = {'rho': {}, 'U': {}, 'V': {}, 'rho_template': {}}
+    for det in crossTerms_rom:
+        indx_template = [indx for indx in indx_basis if indx in rho_rom[det]][0]
+        arrays['rho_template'][det] = rho_rom[det][indx_template]
+        npts = rho_rom[det][indx_template].data.length
+        rho = np.zeros((n_tot, npts), dtype=complex)
+        U = np.zeros((n_tot, n_tot), dtype=complex)
+        V = np.zeros((n_tot, n_tot), dtype=complex)
+        for a, indx1 in enumerate(indx_basis):
+            if indx1 in rho_rom[det]:
+                rho[a] = rho_rom[det][indx1].data.data
+            for b, indx2 in enumerate(indx_basis):
+                if (indx1, indx2) in crossTerms_rom[det]:
+                    U[a, b] = crossTerms_rom[det][(indx1, indx2)]
+                    V[a, b] = crossTermsV_rom[det][(indx1, indx2)]
+        shape = (len(modes), n_basis)
+        arrays['rho'][det] = rho.reshape(shape + (npts,))
+        arrays['U'][det] = U.reshape(shape + shape)
+        arrays['V'][det] = V.reshape(shape + shape)
+    rom_basis_term_cache['inputs'] = (acat_rom, rho_rom, crossTerms_rom, crossTermsV_rom)
+    rom_basis_term_cache['arrays'] = arrays
+    return arrays
+
+def ReconstructPrecomputedLikelihoodTermsROM(P,acat_rom,rho_intp_rom,crossTerms_rom, crossTermsV_rom, rho_rom,verbose=True,coefs=None):
         """
         Using a set of ROM coefficients for hlm[lm] = coef[l,m,basis] w[basis], reconstructs <h[lm]|data>, <h[lm]|h[l'm']>
         Requires ROM also be loaded in top level, for simplicity
+           coefs : optional (n_modes, n_basis) coefficient array for P (one row of acat_rom.coefficients_array), e.g. computed
+                   for a batch of points at once.  Computed here if not provided.
         """
         # Extract coefficients
-        coefs = acat_rom.coefficients(P)
+        if coefs is None:
+            coefs = acat_rom.coefficients_array([P])[0]
         # Identify available modes
         modelist = acat_rom.modes_available      
+        coef_modes = acat_rom.coefficient_modes()
+        indx_modes = np.array([coef_modes.index(mode) for mode in modelist])
+        coefs = coefs[indx_modes]
+        basis_terms = ROMBasisTermArrays(acat_rom, rho_rom, crossTerms_rom, crossTermsV_rom)
 
         detectors = crossTerms_rom.keys()
         rholms = {}
@@ -506,45 +743,32 @@ def ReconstructPrecomputedLikelihoodTermsROM(P,acat_rom,rho_intp_rom,crossTerms_
         crossTerms = {}
         crossTermsV = {}
 
-        # Reproduce rholms and rholms_intp
-        # Loop over detectors
+        # Reproduce rholms and rholms_intp:   rho[lm] = sum_k conj(coef[lm,k]) rho[lm,k]
         for det in detectors:
               rholms[det] ={}
               rholms_intp[det] ={}
-              # Loop over available modes
-              for mode in modelist:
-                # Identify relevant terms in the sum
-                indx_list_ok = [indx for indx in coefs.keys()  if indx[0]==mode[0] and indx[1]==mode[1]]
-                # Discrete case: 
-                #   - Create data structure to hold it
-                indx0 = indx_list_ok[0]
-                rhoTS = lal.CreateCOMPLEX16TimeSeries("rho",rho_rom[det][indx0].epoch,rho_rom[det][indx0].f0,rho_rom[det][indx0].deltaT,rho_rom[det][indx0].sampleUnits,rho_rom[det][indx0].data.length)
-                rhoTS.data.data = np.zeros( rho_rom[det][indx0].data.length)   # problems with data initialization common with LAL
-                #  - fill the data structure
-                fn_list_here = []
-                wt_list_here = []
-                for indx in indx_list_ok:
-                        rhoTS.data.data+= np.conj(coefs[indx])*rho_rom[det][indx].data.data
-                        wt_list_here.append(np.conj(coefs[indx]) )
-                        fn_list_here = rho_intp_rom[det][indx]
+              rho_template = basis_terms['rho_template'][det]
+              rho_here = np.einsum('mk,mkt->mt', np.conj(coefs), basis_terms['rho'][det][indx_modes])
+              for indx_mode, mode in enumerate(modelist):
+                rhoTS = lal.CreateCOMPLEX16TimeSeries("rho",rho_template.epoch,rho_template.f0,rho_template.deltaT,rho_template.sampleUnits,rho_template.data.length)
+                rhoTS.data.data = rho_here[indx_mode]
                 rholms[det][mode]=rhoTS
-                # Interpolated case
-                #   - create a lambda structure for it, holding the coefficients.  NOT IMPLEMENTED since not used in production
-                if verbose:
-                        print(" factored_likelihood: ROM: interpolated timeseries ", det, mode, " NOT CREATED")
-                wt_list_here = np.array(wt_list_here)
-                rholms_intp[det][mode] = lambda t, fns=fn_list_here, wts=wt_list_here: np.sum(np.array(map(fn_list_here,t))*wt_list_here )
-        # Reproduce  crossTerms, crossTermsV
+                # Interpolated case: same linear combination of the basis interpolants
+                fn_list_here = [rho_intp_rom[det][(mode[0],mode[1],indx)] for indx in np.arange(acat_rom.nbasis_per_mode[mode]) if (mode[0],mode[1],indx) in rho_intp_rom[det]]
+                wt_list_here = np.conj(coefs[indx_mode,:len(fn_list_here)])
+                rholms_intp[det][mode] = lambda t, fns=fn_list_here, wts=wt_list_here: np.sum([w*fn(t) for w, fn in zip(wts, fns)],axis=0)
+        # Reproduce  crossTerms, crossTermsV:   U[lm,l'm'] = sum conj(coef[lm,k]) coef[l'm',k'] U[lmk,l'm'k'] ;  V: no conjugate
         for det in detectors:
               crossTerms[det] ={}
               crossTermsV[det] ={}
-              for mode1 in modelist:
-                      indx_list_ok1 = [indx for indx in coefs.keys()  if indx[0]==mode1[0] and indx[1]==mode1[1]]
-                      for mode2 in modelist:
-                              crossTerms[det][(mode1,mode2)] =0.j
-                              indx_list_ok2 = [indx for indx in coefs.keys()  if indx[0]==mode2[0] and indx[1]==mode2[1]]
-                              crossTerms[det][(mode1,mode2)] = np.sum(np.array([ np.conj(coefs[indx1])*coefs[indx2]*crossTerms_rom[det][(indx1,indx2)] for indx1 in indx_list_ok1 for indx2 in indx_list_ok2]))
-                              crossTermsV[det][(mode1,mode2)] = np.sum(np.array([ coefs[indx1]*coefs[indx2]*crossTermsV_rom[det][(indx1,indx2)] for indx1 in indx_list_ok1 for indx2 in indx_list_ok2]))
+              U_basis = basis_terms['U'][det][indx_modes][:,:,indx_modes]
+              V_basis = basis_terms['V'][det][indx_modes][:,:,indx_modes]
+              U_here = np.einsum('ak,akbj,bj->ab', np.conj(coefs), U_basis, coefs)
+              V_here = np.einsum('ak,akbj,bj->ab', coefs, V_basis, coefs)
+              for indx1, mode1 in enumerate(modelist):
+                      for indx2, mode2 in enumerate(modelist):
+                              crossTerms[det][(mode1,mode2)] = U_here[indx1,indx2]
+                              crossTermsV[det][(mode1,mode2)] = V_here[indx1,indx2]
                               if verbose:
                                       print("       : U populated ", (mode1, mode2), "  = ",crossTerms[det][(mode1,mode2) ])
                                       print("       : V populated ", (mode1, mode2), "  = ",crossTermsV[det][(mode1,mode2) ])
@@ -584,18 +808,20 @@ def FactoredLogLikelihood(extr_params, rholms,rholms_intp, crossTerms, crossTerm
     Ylms = ComputeYlms(Lmax, incl, -phiref, selected_modes=rholms_intp[list(rholms_intp.keys())[0]].keys())
 
     lnL = 0.
+    # This is the GPS time at each detector
+    t_det_dict = dict([(det, ComputeArrivalTimeAtDetector(det, RA, DEC, tref)) for det in detectors])
+    if interpolate:
+        # all detectors and modes at once
+        rholms_at_t_det = EvaluateRholmsInterpolated(rholms_intp, dict([(det, float(t_det_dict[det])) for det in detectors]))
     for det in detectors:
         CT = crossTerms[det]
         CTV = crossTermsV[det]
         F = ComplexAntennaFactor(det, RA, DEC, psi, tref)
 
-        # This is the GPS time at the detector
-        t_det = ComputeArrivalTimeAtDetector(det, RA, DEC, tref)
+        t_det = t_det_dict[det]
         det_rholms = {}  # rholms evaluated at time at detector
         if (interpolate):
-                for key in rholms_intp[det]:
-                        func = rholms_intp[det][key]
-                        det_rholms[key] = func(float(t_det))
+                det_rholms = rholms_at_t_det[det]
         else:
             # do not interpolate, just use nearest neighbor.
             for key, rhoTS in rholms[det].items():
@@ -644,18 +870,20 @@ def FactoredLogLikelihoodTimeMarginalized(tvals, extr_params, rholms_intp, rholm
 
 #    lnL = 0.
     lnL = np.zeros(len(tvals),dtype=np.float128)
+    # This is the GPS time at each detector
+    t_det_dict = dict([(det, ComputeArrivalTimeAtDetector(det, RA, DEC, tref)) for det in detectors])
+    if ( interpolate ):
+        # use the interpolating functions: all (detector, mode, time) at once
+        rholms_at_t_det = EvaluateRholmsInterpolated(rholms_intp, dict([(det, float(t_det_dict[det])+tvals) for det in detectors]))
     for det in detectors:
         CT = crossTerms[det]
         CTV = crossTermsV[det]
         F = ComplexAntennaFactor(det, RA, DEC, psi, tref)
 
-        # This is the GPS time at the detector
-        t_det = ComputeArrivalTimeAtDetector(det, RA, DEC, tref)
+        t_det = t_det_dict[det]
         det_rholms = {}  # rholms evaluated at time at detector
         if ( interpolate ):
-            # use the interpolating functions. 
-            for key, func in rholms_intp[det].items():
-                det_rholms[key] = func(float(t_det)+tvals)
+            det_rholms = rholms_at_t_det[det]
         else:
             # do not interpolate, just use nearest neighbors.
             for key, rhoTS in rholms[det].items():
@@ -870,6 +1098,50 @@ def SingleDetectorLogLikelihood(rholm_vals, crossTerms,crossTermsV, Ylms, F, dis
 
     return term1 + term2
 
+class DetectorContext(object):
+    """
+    Data-side quantities for one detector, which do not change from one intrinsic point to the next in an ILE job:
+       IP             : lsu.ComplexIP (PSD weights 1/S(f), two-sided, zero outside [fmin, fMax])
+       indx_ok        : frequency indexes where the weight is nonzero
+       sqrt_weights   : sqrt(weight) at indx_ok
+       data_weighted  : 2 d(f)/S(f) at indx_ok (None if no data given), the data factor of the rholm integrand
+    Use GetDetectorContexts to reuse them across calls.
+    """
+    def __init__(self, data, psd, fmin, fMax, fNyq, deltaF, analyticPSD_Q=False, inv_spec_trunc_Q=False, T_spec=0.):
+        self.data = data    # keep references: the cache is keyed on id()
+        self.psd = psd
+        self.IP = lsu.ComplexIP(fmin, fMax, fNyq, deltaF, psd, analyticPSD_Q, inv_spec_trunc_Q, T_spec)
+        self.npts = self.IP.len2side
+        self.deltaF = self.IP.deltaF
+        self.indx_ok = np.nonzero(self.IP.weights2side)[0]
+        self.sqrt_weights = np.sqrt(self.IP.weights2side[self.indx_ok])
+        self.data_weighted = None
+        if data is not None:
+            assert data.data.length == self.npts
+            self.data_weighted = 2*data.data.data[self.indx_ok]*self.IP.weights2side[self.indx_ok]
+
+detector_context_cache = OrderedDict()
+n_detector_context_cache = 10   # contexts kept (each holds a copy of the data in band)
+
+def GetDetectorContexts(data_dict, psd_dict, detectors, fmin, fMax, fNyq, deltaF, analyticPSD_Q=False, inv_spec_trunc_Q=False, T_spec=0.):
+    """
+    GetDetectorContexts(data_dict, psd_dict, detectors, ...) : dictionary of DetectorContext keyed by detector,
+    built once and reused while the data and psd objects (by identity) and the settings are the same.
+    The data and psd are not expected to be modified in place.
+    """
+    context_dict = {}
+    for det in detectors:
+        key = (det, id(data_dict[det]), id(psd_dict[det]), fmin, fMax, fNyq, deltaF, analyticPSD_Q, inv_spec_trunc_Q, T_spec)
+        if key in detector_context_cache:
+            detector_context_cache.move_to_end(key)
+        else:
+            detector_context_cache[key] = DetectorContext(data_dict[det], psd_dict[det], fmin, fMax, fNyq, deltaF,
+                                                          analyticPSD_Q, inv_spec_trunc_Q, T_spec)
+            if len(detector_context_cache) > n_detector_context_cache:
+                detector_context_cache.popitem(last=False)
+        context_dict[det] = detector_context_cache[key]
+    return context_dict
+
 def ComputeModeIPTimeSeries(hlms, data, psd, fmin, fMax, fNyq,
         N_shift, N_window, analyticPSD_Q=False,
         inv_spec_trunc_Q=False, T_spec=0.):
@@ -906,6 +1178,54 @@ def ComputeModeIPTimeSeries(hlms, data, psd, fmin, fMax, fNyq,
 
     return rholms
 
+def ComputeModeIPTimeSeriesArrays(hlms, data_dict, psd_dict, detectors, fmin, fMax, fNyq,
+        N_shift_dict, N_window, analyticPSD_Q=False,
+        inv_spec_trunc_Q=False, T_spec=0., context_dict=None, workers=None, max_memory_mb=1024):
+    r"""
+    Batched ComputeModeIPTimeSeries, for all detectors at once.  Returns a dictionary keyed by detector of
+    what ComputeModeIPTimeSeries(hlms, data_dict[det], psd_dict[det], ..., N_shift_dict[det], N_window, ...) returns.
+
+    The integrands 2 conj(h_lm) d_det / S_det for all (detector, mode) are the rows of one 2-D array, inverse FFT'd
+    together (scipy.fft, 'workers' threads: default fft_workers_default).  Only the N_window samples starting at
+    N_shift are kept, by index arithmetic: LAL's frequency packing [-fNyq, fNyq) is a (-1)^j phase on the output,
+    and the roll by N_shift is a cyclic index offset.  Rows are batched to keep the array below max_memory_mb.
+    context_dict: optional DetectorContext per detector (weighted data), if already built
+    """
+    mode_list = list(hlms.keys())
+    npts = data_dict[detectors[0]].data.length
+    if workers is None:
+        workers = fft_workers_default
+    rows = []
+    for det in detectors:
+        assert data_dict[det].deltaF == hlms[mode_list[0]].deltaF
+        assert data_dict[det].data.length == hlms[mode_list[0]].data.length == npts
+        if context_dict is None or not(det in context_dict):
+            context = DetectorContext(data_dict[det], psd_dict[det], fmin, fMax, fNyq, data_dict[det].deltaF,
+                    analyticPSD_Q, inv_spec_trunc_Q, T_spec)
+        else:
+            context = context_dict[det]
+        for mode in mode_list:
+            rows.append((det, mode, context))
+    deltaT = 1./rows[0][2].deltaF/npts
+    indx_window = np.arange(N_window)
+    n_batch = int(np.max([1, max_memory_mb*1024**2/(2*16.*npts)]))   # integrand + transform
+    rholms = dict([(det, {}) for det in detectors])
+    for indx_start in range(0, len(rows), n_batch):
+        rows_here = rows[indx_start:indx_start+n_batch]
+        integrand = np.zeros((len(rows_here), npts), dtype=np.complex128)
+        for indx, (det, mode, context) in enumerate(rows_here):
+            integrand[indx, context.indx_ok] = np.conj(hlms[mode].data.data[context.indx_ok])*context.data_weighted
+        rho_full = sp_fft.ifft(integrand, axis=-1, norm='forward', workers=workers, overwrite_x=True)
+        for indx, (det, mode, context) in enumerate(rows_here):
+            indx_here = (N_shift_dict[det] + indx_window) % npts
+            # (-1)^j for the frequency packing, deltaF for the integral
+            rhoTS = lal.CreateCOMPLEX16TimeSeries("Complex overlap",
+                lal.LIGOTimeGPS(0.), 0., deltaT, lsu.lsu_DimensionlessUnit, N_window)
+            rhoTS.data.data = rho_full[indx, indx_here]*np.where(indx_here % 2, -context.deltaF, context.deltaF)
+            rhoTS.epoch = data_dict[det].epoch - hlms[mode].epoch + N_shift_dict[det]*deltaT
+            rholms[det][mode] = rhoTS
+    return rholms
+
 def InterpolateRholm(rholm, t,verbose=False):
     h_re = np.real(rholm.data.data)
     h_im = np.imag(rholm.data.data)
@@ -941,6 +1261,100 @@ def InterpolateRholm(rholm, t,verbose=False):
     #return lambda ti: cspline1d_eval(re_coef, ti) + 1j*cspline1d_eval(im_coef, ti)
 
 
+class RholmInterpolator(object):
+    """
+    Batched cubic-spline interpolation of the rholm time series of several detectors:
+       RholmInterpolator(rholms, t_dict) ; rholms[det][mode] a COMPLEX16TimeSeries, t_dict[det] its uniformly spaced sample times.
+    Same interpolant as InterpolateRholm (not-a-knot cubic spline through the samples, zero outside [t_0, t_N]).
+    The piecewise-polynomial coefficients of every (detector, mode) are held in one array, so
+       evaluate(t_array)   :  t_array shape (n_det, ...)  ->  values shape (n_det, n_modes, ...)
+    evaluates all modes of all detectors, each detector at its own times, in one vectorized call.
+    mode_functions(det) gives the per-mode callables used in rholms_intp[det] (modes identically zero are left out, as before).
+    """
+    def __init__(self, rholms, t_dict, detectors=None):
+        if detectors is None:
+            detectors = list(rholms.keys())
+        self.detectors = list(detectors)
+        self.modes = []
+        for det in self.detectors:
+            self.modes += [mode for mode in rholms[det] if not(mode in self.modes)]
+        self.n_samples = len(t_dict[self.detectors[0]])
+        self.t0 = np.array([float(t_dict[det][0]) for det in self.detectors])
+        self.deltaT = np.array([float(t_dict[det][1] - t_dict[det][0]) for det in self.detectors])
+        self.t_end = np.array([float(t_dict[det][-1]) for det in self.detectors])
+        # coefficients of (t - t_i)^3, ^2, ^1, ^0 on each interval: shape (n_det, n_samples-1, 4, n_modes)
+        self.coefs = np.zeros((len(self.detectors), self.n_samples-1, 4, len(self.modes)), dtype=np.complex128)
+        self.modes_nonzero = {}
+        for indx_det, det in enumerate(self.detectors):
+            assert len(t_dict[det]) == self.n_samples
+            rho_array = np.zeros((len(self.modes), self.n_samples), dtype=np.complex128)
+            self.modes_nonzero[det] = []
+            for indx_mode, mode in enumerate(self.modes):
+                if mode in rholms[det]:
+                    rho_array[indx_mode] = rholms[det][mode].data.data[:self.n_samples]
+                    # The mode is identically zero, don't bother with it
+                    if np.sum(np.abs(rho_array[indx_mode])) != 0.0:
+                        self.modes_nonzero[det].append(mode)
+            spline = interpolate.CubicSpline(t_dict[det], rho_array, axis=1)   # c shape (4, n_samples-1, n_modes)
+            self.coefs[indx_det] = np.transpose(spline.c, (1, 0, 2))
+
+    def evaluate(self, t_array, detector_indexes=None):
+        """
+        evaluate(t_array) : rholm values, shape (n_det, n_modes) + t_array.shape[1:], mode order self.modes.
+        t_array[k] are the times at detector self.detectors[k]  (or at detector_indexes[k], if given)
+        """
+        t_array = np.asarray(t_array, dtype=float)
+        if detector_indexes is None:
+            detector_indexes = np.arange(len(self.detectors))
+        detector_indexes = np.asarray(detector_indexes)
+        shape_extra = (1,)*(t_array.ndim - 1)
+        t0 = self.t0[detector_indexes].reshape((-1,) + shape_extra)
+        deltaT = self.deltaT[detector_indexes].reshape((-1,) + shape_extra)
+        t_end = self.t_end[detector_indexes].reshape((-1,) + shape_extra)
+        indx_interval = np.clip(np.floor((t_array - t0)/deltaT).astype(int), 0, self.n_samples-2)
+        dt = t_array - (t0 + indx_interval*deltaT)
+        c = self.coefs[detector_indexes.reshape((-1,) + shape_extra), indx_interval]   # shape t_array.shape + (4, n_modes)
+        dt = dt[..., np.newaxis]
+        vals = ((c[..., 0, :]*dt + c[..., 1, :])*dt + c[..., 2, :])*dt + c[..., 3, :]
+        vals[(t_array < t0) | (t_array > t_end)] = 0
+        return np.moveaxis(vals, -1, 1)
+
+    def mode_functions(self, det):
+        """
+        Dictionary keyed on mode of callables rholm_intp(t), as returned by InterpolateRholms
+        """
+        indx_det = self.detectors.index(det)
+        return dict([(mode, _RholmInterpolatorMode(self, indx_det, self.modes.index(mode))) for mode in self.modes_nonzero[det]])
+
+class _RholmInterpolatorMode(object):
+    """
+    One (detector, mode) of a RholmInterpolator, callable like the InterpolateRholm lambdas.
+    """
+    def __init__(self, interpolator, indx_det, indx_mode):
+        self.interpolator = interpolator
+        self.indx_det = indx_det
+        self.indx_mode = indx_mode
+    def __call__(self, t):
+        t = np.asarray(t, dtype=float)
+        vals = self.interpolator.evaluate(t[np.newaxis], detector_indexes=[self.indx_det])[0, self.indx_mode]
+        return vals
+
+def EvaluateRholmsInterpolated(rholms_intp, t_det_dict):
+    """
+    Values of the interpolated rholms rholms_intp[det][mode] at the times t_det_dict[det] (scalar or array):
+    dictionary keyed by detector, then mode.  For RholmInterpolator-backed functions, all detectors are evaluated in one call.
+    """
+    detectors = list(t_det_dict.keys())
+    funcs_first = [list(rholms_intp[det].values())[0] for det in detectors if len(rholms_intp[det]) > 0]
+    if len(funcs_first) == len(detectors) and all([isinstance(func, _RholmInterpolatorMode) for func in funcs_first]) and \
+            len(set([id(func.interpolator) for func in funcs_first])) == 1:
+        interpolator = funcs_first[0].interpolator
+        vals = interpolator.evaluate(np.array([np.asarray(t_det_dict[det], dtype=float) for det in detectors]),
+                                     detector_indexes=[func.indx_det for func in funcs_first])
+        return dict([(det, dict([(mode, vals[indx, func.indx_mode]) for mode, func in rholms_intp[det].items()]))
+                     for indx, det in enumerate(detectors)])
+    return dict([(det, dict([(mode, func(t_det_dict[det])) for mode, func in rholms_intp[det].items()])) for det in detectors])
+
 def InterpolateRholms(rholms, t,verbose=False):
     """
     Return a dictionary keyed on mode index tuples, (l,m)
@@ -952,16 +1366,11 @@ def InterpolateRholms(rholms, t,verbose=False):
     < h_lm(t_i) | d >
     't' is an array of the discrete times:
     [t_0, t_1, ..., t_N]
+    All modes share one RholmInterpolator.
     """
-    rholm_intp = {}
-    for mode in rholms.keys():
-        rholm = rholms[mode]
-        # The mode is identically zero, don't bother with it
-        if sum(abs(rholm.data.data)) == 0.0:
-            continue
-        rholm_intp[ mode ] = InterpolateRholm(rholm, t,verbose)
-
-    return rholm_intp
+    if verbose:
+        print("Interpolation length check ", len(t), [rholms[mode].data.length for mode in rholms])
+    return RholmInterpolator({'det': rholms}, {'det': t}).mode_functions('det')
 
 def ComputeModeCrossTermIP(hlmsA, hlmsB, psd, fmin, fMax, fNyq, deltaF, 
         analyticPSD_Q=False, inv_spec_trunc_Q=False, T_spec=0., verbose=True,prefix="U",same_waveform_Q=False):
@@ -995,6 +1404,7 @@ def ComputeModeCrossTermIP(hlmsA, hlmsB, psd, fmin, fMax, fNyq, deltaF,
           crossTerms[ (mode2,mode1) ] = crossTerms[(mode1,mode2)]
         else:
           crossTerms[ (mode2,mode1) ] = np.conj(crossTerms[(mode1,mode2)])
+      return crossTerms
 
     for mode1 in hlmsA.keys():
         for mode2 in hlmsB.keys():
@@ -1006,6 +1416,51 @@ def ComputeModeCrossTermIP(hlmsA, hlmsB, psd, fmin, fMax, fNyq, deltaF,
     return crossTerms
 
 
+def ComputeModeCrossTermArrays(hlms, hlms_conj, psd_dict, detectors, fmin, fMax, fNyq, deltaF,
+        analyticPSD_Q=False, inv_spec_trunc_Q=False, T_spec=0., verbose=True, context_dict=None):
+    """
+    Batched ComputeModeCrossTermIP, for all detectors at once.  Returns crossTerms, crossTermsV:
+    dictionaries keyed by detector, each a dictionary keyed by ((l,m),(l',m')) of
+       U:  < h_lm | h_l'm' >       (ComputeModeCrossTermIP(hlms, hlms, ...))
+       V:  < h_lm^* | h_l'm' >     (ComputeModeCrossTermIP(hlms_conj, hlms, ..., prefix="V"))
+    For each detector, the modes are stacked into one (n_modes, n_freq) array (only frequencies with nonzero PSD weight),
+    scaled by sqrt(weight), so U (Hermitian) is one rank-k update (zherk, upper triangle) and V one matrix product.
+    context_dict: optional DetectorContext per detector (PSD weights), if already built
+    """
+    mode_list = list(hlms.keys())
+    n_modes = len(mode_list)
+    crossTerms = {}
+    crossTermsV = {}
+    for det in detectors:
+        if context_dict is not None:
+            context = context_dict[det]
+        else:
+            context = DetectorContext(None, psd_dict[det], fmin, fMax, fNyq, deltaF, analyticPSD_Q,
+                inv_spec_trunc_Q, T_spec)
+        for mode in mode_list:
+            assert hlms[mode].data.length == hlms_conj[mode].data.length == context.npts
+        indx_ok = context.indx_ok
+        sqrt_weights = context.sqrt_weights
+        # shape (n_freq, n_modes), Fortran order, as BLAS wants
+        hlm_array = np.empty((len(indx_ok), n_modes), dtype=np.complex128, order='F')
+        hlm_conj_array = np.empty((len(indx_ok), n_modes), dtype=np.complex128, order='F')
+        for indx, mode in enumerate(mode_list):
+            hlm_array[:, indx] = hlms[mode].data.data[indx_ok]*sqrt_weights
+            hlm_conj_array[:, indx] = hlms_conj[mode].data.data[indx_ok]*sqrt_weights
+        U_upper = blas.zherk(2.*context.deltaF, hlm_array, trans=2)    # 2 deltaF sum_f conj(h_a) h_b w
+        U = np.triu(U_upper) + np.conj(np.triu(U_upper, 1)).T
+        V = 2.*context.deltaF*np.dot(np.conj(hlm_conj_array).T, hlm_array)
+        crossTerms[det] = {}
+        crossTermsV[det] = {}
+        for indx1, mode1 in enumerate(mode_list):
+            for indx2, mode2 in enumerate(mode_list):
+                crossTerms[det][(mode1, mode2)] = U[indx1, indx2]
+                crossTermsV[det][(mode1, mode2)] = V[indx1, indx2]
+                if verbose:
+                    print("       : ", det, " U, V populated ", (mode1, mode2), "  = ", U[indx1, indx2], V[indx1, indx2])
+    return crossTerms, crossTermsV
+
+
 def ComplexAntennaFactor(det, RA, DEC, psi, tref):
     """
     Function to compute the complex-valued antenna pattern function:
@@ -1287,6 +1742,57 @@ def IdentifyEffectiveModesForDetector(crossTermsOneDetector, fac,det):
 
     return pairsUnion - set(pairsIneffective)
 
+def ModeArrayFromModes(modes):
+    """
+    lal ModeArray (for the waveform parameter dictionary) with the (l,m) in modes activated
+    """
+    mode_array = lalsim.SimInspiralCreateModeArray()
+    for mode in modes:
+        lalsim.SimInspiralModeArrayActivateMode(mode_array, int(mode[0]), int(mode[1]))
+    return mode_array
+
+class ModePruningCache(object):
+    """
+    Mode-pruning decision (IdentifyEffectiveModesForDetector), learned from the first n_learn points of an event and then reused, so
+    PrecomputeLikelihoodTerms generates only the worthwhile modes.
+      - learning: all modes up to Lmax are generated and pruned as usual; the worthwhile modes of each point are accumulated (union)
+      - afterwards: modes_to_generate() is the accumulated set
+      - every n_revalidate points after learning, one point is again generated with all modes; newly worthwhile modes are added.
+        Modes are never removed (conservative)
+    One instance per event: the decision depends on the data and PSD through the cross terms.
+    """
+    def __init__(self, n_learn=3, n_revalidate=50, verbose=False):
+        self.n_learn = n_learn
+        self.n_revalidate = n_revalidate
+        self.verbose = verbose
+        self.modes = set()
+        self.modes_all = set()
+        self.n_full = 0       # points generated with all modes
+        self.n_since_full = 0  # points generated with the learned modes since the last full point
+
+    def modes_to_generate(self):
+        """
+        Set of modes to generate for the next point, or None for all modes (learning, revalidation)
+        """
+        if self.n_full < self.n_learn or (self.n_revalidate and self.n_since_full >= self.n_revalidate):
+            return None
+        self.n_since_full += 1
+        return self.modes
+
+    def update(self, modes_worthwhile, modes_all):
+        """
+        Record the pruning result of a point generated with all modes
+        """
+        modes_new = set(modes_worthwhile) - self.modes
+        if self.n_full >= self.n_learn and len(modes_new) > 0:
+            print(" ModePruningCache: revalidation adds modes ", sorted(modes_new))
+        self.modes = self.modes.union(modes_worthwhile)
+        self.modes_all = self.modes_all.union(modes_all)
+        self.n_full += 1
+        self.n_since_full = 0
+        if self.verbose or self.n_full == self.n_learn:
+            print(" ModePruningCache: generating ", sorted(self.modes), " of ", len(self.modes_all), " modes ")
+
 ####
 #### Reimplementation with arrays   [NOT YET GENERALIZED TO USE V]
 ####
@@ -1781,7 +2287,7 @@ def _factored_lnL_helper(kappa_sq, rho_sq):
     return kappa_sq - 0.5 * rho_sq
 
 
-def  DiscreteFactoredLogLikelihoodViaArrayVectorNoLoop(tvals, P_vec, lookupNKDict, rholmsArrayDict, ctUArrayDict,ctVArrayDict,epochDict,Lmax=2,array_output=False,xpy=np, loglikelihood=_factored_lnL_helper,return_lnLt=False,phase_marginalization=False):
+def  DiscreteFactoredLogLikelihoodViaArrayVectorNoLoop(tvals, P_vec, lookupNKDict, rholmsArrayDict, ctUArrayDict,ctVArrayDict,epochDict,Lmax=2,array_output=False,xpy=np, loglikelihood=_factored_lnL_helper,return_lnLt=False,phase_marginalization=False,Q_chunk_size=None):
     """
     DiscreteFactoredLogLikelihoodViaArray uses the array-ized data structures to compute the log likelihood,
     either as an array vs time *or* marginalized in time. 
@@ -1789,6 +2295,7 @@ def  DiscreteFactoredLogLikelihoodViaArrayVectorNoLoop(tvals, P_vec, lookupNKDic
     The timeseries quantities are computed via discrete shifts of an existing grid
     Note 'P' must have the *sampling rate* set to correctly interpret the event time.
      Note arguments passed are NOW ARRAYS, in contrast to similar function which does not have 'Vector' postfix
+    Q_chunk_size: memory bound for the CPU Q.(F Y) product (see Q_inner_product_cpu); default Q_chunk_size_default
     """
     global distMpcRef
 
@@ -1954,31 +2461,21 @@ def  DiscreteFactoredLogLikelihoodViaArrayVectorNoLoop(tvals, P_vec, lookupNKDic
             #     xpy.conj(FY_dummy_t), Qlms,
             # ).real * (distMpcRef/distMpc)[...,None]
 
+        FY_conj = xpy.conj(F_vec_dummy_lm * Ylms_vec)
+        # Shape Q = (npts_time_full, nlms)
+        # Shape A=FY_conj = (npts_extrinsic, nlms)
+        # shape result = (npts_extrinsic, npts_time_*window* = npts)
         if not (xpy is np):
-          FY_conj = xpy.conj(F_vec_dummy_lm * Ylms_vec)
-          # Shape Q = (npts_time_full, nlms)
-          # Shape A=FY_conj = (npts_extrinsic, nlms)
-          # shape result = (npts_extrinsic, npts_time_*window* = npts)
           Q_prod_result = Q_inner_product.Q_inner_product_cupy(
             Q, FY_conj,
             ifirst, npts,
             )
         else:
-          # Use old code completely unchanged ... very wasteful on memory management!
-          Qlms = xpy.empty((npts_extrinsic, npts, n_lms), dtype=np.complex128)
-          for i in range(npts_extrinsic):
-              Qlms[i] = rholmsArrayDict[det][...,ifirst[i]:(ifirst[i]+npts)].T
-          if phase_marginalization:
-              Qlms[:, :, 1] = xpy.conj(Qlms[:, :, 1])
-
-          FY_dummy_t = np.broadcast_to(
-            (F_vec_dummy_lm * Ylms_vec)[:, np.newaxis],
-            Qlms.shape,
-            )
-
-          Q_prod_result =  np.einsum(
-            "...i,...i",
-            np.conj(FY_dummy_t), Qlms,
+          # windowed product computed in place: no (npts_extrinsic, npts, n_lms) copy of Q
+          Q_prod_result = Q_inner_product_cpu(
+            Q, FY_conj,
+            ifirst, npts,
+            chunk_size=(Q_chunk_size if Q_chunk_size else Q_chunk_size_default),
             )
 
         kappa_sq += Q_prod_result * (distMpcRef/distMpc)[..., np.newaxis]
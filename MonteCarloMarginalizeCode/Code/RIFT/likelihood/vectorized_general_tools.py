@@ -3,6 +3,29 @@
 import numpy as np
 import numpy
 
+try:
+    import numba
+    numba_ok = True
+except ImportError:
+    numba_ok = False
+
+if numba_ok:
+    @numba.njit(parallel=True, cache=True)
+    def _inverse_cdf_numba(P, cdf, a, b, guide, y, indx):
+        # same guide-table walk as the xpy path below, one point at a time
+        n_rows, n_samples = P.shape
+        n_bins = cdf.shape[1] - 1
+        n_guide = guide.shape[1]
+        for k in range(n_rows):
+            for i in numba.prange(n_samples):
+                p = P[k, i]
+                cell = min(max(int(p*n_guide), 0), n_guide-1)
+                j = guide[k, cell]
+                while j < n_bins-1 and cdf[k, j+1] <= p:
+                    j += 1
+                y[k, i] = a[k, j] + b[k, j]*p
+                indx[k, i] = j
+
 def histogram(samples, n_bins, xpy=numpy,weights=None):
     """
     samples : data between [0,1]
@@ -34,6 +57,125 @@ def histogram(samples, n_bins, xpy=numpy,weights=None):
     return histogram_counts[:n_bins]  # force target length, we should never have points in top bin if it occurs : scaled to [0,1)
 
 
+def histogram_batched(samples, n_bins, xpy=numpy,weights=None,x_min=None,x_max_minus_min=None):
+    """
+    Histogram each row of a 2d array at once, using a single bincount call.
+    samples : data between [0,1], shape (n_rows, n_samples), or a list of n_rows equal-length 1d arrays (no stacking copy needed).
+              If x_min, x_max_minus_min (shape (n_rows,1)) are provided, samples are instead rescaled from
+              [x_min, x_min+x_max_minus_min] on the fly
+    n_bins:    number of bins of output (same for all rows)
+    weights:  weights in histogram, shape (n_samples,) [shared by all rows] or (n_rows, n_samples)
+    Returns array of shape (n_rows, n_bins), each row equivalent to histogram(samples[k], ...)
+    """
+    n_rows, n_samples = len(samples), len(samples[0])
+
+    # Compute the histogram bin indices.  Out of range points (floats!) are assigned to the first or last bin, as in histogram
+    if x_min is None:
+        x_min = xpy.zeros((n_rows,1))
+        x_max_minus_min = xpy.ones((n_rows,1))
+    indices = xpy.empty((n_rows, n_samples))
+    if isinstance(samples, (list, tuple)):
+        for k in range(n_rows):
+            xpy.subtract(samples[k], x_min[k], out=indices[k])
+    else:
+        xpy.subtract(samples, x_min, out=indices)
+    indices *= n_bins/x_max_minus_min
+    indices = indices.astype(np.intp)   # bincount native index type: no conversion copy
+    xpy.clip(indices, 0, n_bins-1, out=indices)
+    # offset each row into its own block of bins
+    indices += (n_bins*xpy.arange(n_rows, dtype=np.intp))[:,None]
+
+    if isinstance(weights,type(None)):
+        wts  =xpy.broadcast_to(
+            xpy.asarray([float(n_bins)/n_samples]),
+            (n_rows* n_samples,)
+            )
+    elif weights.ndim == 1:
+        wts = xpy.tile(weights, n_rows)
+    else:
+        wts = weights.ravel()
+    histogram_counts = xpy.bincount(
+        indices.ravel(), minlength=n_rows*n_bins,
+        weights=wts
+    )
+    return histogram_counts[:n_rows*n_bins].reshape((n_rows, n_bins))
+
+def inverse_cdf_batched(P, cdf, xpy=numpy, return_bins=False, n_guide=None, use_numba=True):
+    """
+    Invert several piecewise-linear CDFs at once.  Row k is equivalent to interp(P[k], cdf[k], edges), where edges are
+    n_bins+1 uniformly-spaced points on [0,1].
+    P : shape (n_rows, n_samples), values in [0,1)
+    cdf : shape (n_rows, n_bins+1), each row nondecreasing from 0 to 1
+    return_bins: also return the (local) bin index of each sample, shape (n_rows, n_samples)
+    n_guide: size of the guide table used to locate bins (default 4*n_bins)
+    use_numba: on the CPU, use the compiled guide-table walk if numba is available (otherwise numpy.interp per row)
+    Returns values in [0,1], shape (n_rows, n_samples).
+
+    Bins are located without a binary search per sample: a small guide table gives, for each of n_guide equal
+    cells in P, the bin containing the left edge of the cell; a fixed (small) number of vectorized steps
+    then walks forward to the bin containing P.  Each bin is inverted as y = a + b*P, with (a,b) tabulated per bin.
+    """
+    n_rows, n_edges = cdf.shape
+    n_bins = n_edges - 1
+    if xpy is numpy and not(use_numba and numba_ok):
+        # without numba, numpy.interp per row beats the vectorized guide-table walk below (extra passes over memory)
+        edges = numpy.linspace(0, 1, n_edges)
+        y = numpy.empty(P.shape)
+        for k in range(n_rows):
+            y[k] = numpy.interp(P[k], cdf[k], edges)
+        if return_bins:
+            indx = (y*n_bins).astype(np.intp)
+            numpy.clip(indx, 0, n_bins-1, out=indx)
+            return y, indx
+        return y
+    if n_guide is None:
+        n_guide = 4*n_bins
+
+    # per-bin linear inverse: y = a + b*P.  Empty bins (flat cdf) map to their left edge
+    delta_cdf = xpy.diff(cdf, axis=1)
+    b = xpy.zeros((n_rows, n_edges))
+    b[:, :-1] = xpy.where(delta_cdf > 0, 1./(n_bins*xpy.where(delta_cdf > 0, delta_cdf, 1)), 0)
+    a = xpy.arange(n_edges)/n_bins - cdf*b
+    a = a.ravel()
+    b = b.ravel()
+    cdf_flat = cdf.ravel()
+    row_base = n_edges*xpy.arange(n_rows)[:,None]
+
+    # guide table: global index of the bin containing m/n_guide, for each row.  Offsetting row k of the cdf by 2k
+    # makes the concatenated cdfs monotonic, so one (small) searchsorted call builds all rows
+    offsets = 2*xpy.arange(n_rows, dtype=cdf.dtype)[:,None]
+    P_guide = xpy.arange(n_guide+1)/n_guide + offsets
+    guide = xpy.searchsorted((cdf + offsets).ravel(), P_guide.ravel(), side='right').reshape((n_rows, n_guide+1)) - 1
+    xpy.clip(guide, row_base, row_base + n_bins - 1, out=guide)
+    n_steps = int(xpy.max(guide[:,1:] - guide[:,:-1]))
+    guide = xpy.ascontiguousarray(guide[:, :-1])   # drop endpoint
+    guide_flat = guide.ravel()
+
+    if xpy is numpy:
+        P = numpy.ascontiguousarray(P, dtype=numpy.float64)
+        y = numpy.empty(P.shape)
+        indx = numpy.empty(P.shape, dtype=np.intp)
+        guide = (guide - row_base).astype(np.intp)
+        _inverse_cdf_numba(P, numpy.ascontiguousarray(cdf, dtype=numpy.float64), a.reshape((n_rows, n_edges)), b.reshape((n_rows, n_edges)), guide, y, indx)
+        if return_bins:
+            return y, indx
+        return y
+
+    # locate bins: start from guide table, walk forward while the right edge of the bin is <= P
+    indx_cell = (P*n_guide).astype(np.intp)
+    xpy.clip(indx_cell, 0, n_guide-1, out=indx_cell)
+    indx_cell += n_guide*xpy.arange(n_rows)[:,None]
+    indx = guide_flat[indx_cell]
+    for step in range(n_steps):
+        indx += (cdf_flat[indx+1] <= P)
+    xpy.clip(indx, row_base, row_base + n_bins - 1, out=indx)
+
+    y = a[indx] + b[indx]*P
+    if return_bins:
+        indx -= row_base
+        return y, indx
+    return y
+
 
 def interp(x, xp, fp, left=None, right=None, period=None, xpy=numpy):
     """
@@ -92,11 +92,38 @@ def _mu1mu2etaToMc(mu1, mu2, eta):
     return mcmid
 
 
+def _mu1mu2etaToMc_vector(mu1, mu2, eta):
+    """Array version of _mu1mu2etaToMc: the same bisection search, carried out
+    for all elements at once (each element stops at the same tolerance)"""
+    psi3 = mu1 - (U[0, 2] / U[1, 2]) * mu2
+    mcmin = (128. * mu1 / 3.)**(-3. / 5.) / (np.pi * fref * MsunToTime)
+    mcmax = mcmin.copy()
+    indx = _cancel_psi3(mcmax, eta) >= psi3
+    while np.any(indx):
+        mcmax[indx] *= 2.
+        indx = _cancel_psi3(mcmax, eta) >= psi3
+    indx = _cancel_psi3(mcmin, eta) < psi3
+    while np.any(indx):
+        mcmin[indx] *= 0.5
+        indx = _cancel_psi3(mcmin, eta) < psi3
+    mcmid = (mcmin + mcmax) / 2.
+    indx = ((mcmax - mcmin) / mcmin) > 10.**(-6.)
+    while np.any(indx):
+        indx_up = indx & (_cancel_psi3(mcmid, eta) > psi3)
+        indx_down = indx & np.logical_not(indx_up)
+        mcmin[indx_up] = mcmid[indx_up]
+        mcmax[indx_down] = mcmid[indx_down]
+        mcmid[indx] = (mcmin[indx] + mcmax[indx]) / 2.
+        indx = ((mcmax - mcmin) / mcmin) > 10.**(-6.)
+    return mcmid
+
+
 def mu1mu2etaToMc(mu1, mu2, eta):
     """Convert mu1, mu2, eta=m1*m2/(m1+m2)**2 into chirpmass using bisection
     search."""
     if type(mu1) is np.ndarray:
-        return np.array([_mu1mu2etaToMc(_mu1, _mu2, _eta) for _mu1, _mu2, _eta in zip(mu1, mu2, eta)])
+        mu1, mu2, eta = np.broadcast_arrays(mu1, mu2, eta)
+        return _mu1mu2etaToMc_vector(np.array(mu1, dtype=float), mu2, eta)
     else:
         return  _mu1mu2etaToMc(mu1, mu2, eta)
 
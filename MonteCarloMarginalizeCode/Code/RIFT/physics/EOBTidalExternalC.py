@@ -32,14 +32,25 @@ from .. import lalsimutils
 rosUseArchivedWaveforms = True
 
 rosDebug = False
+# In-process generation: TEOBResumS python bindings.  The external executable (EOB_C_BASE/TEOBResumS.x) is the fallback
+try:
+    import EOBRun_module
+    EOBRun_ok = True
+except ImportError:
+    EOBRun_ok = False
+
 #dirBaseFiles =os.environ["HOME"] + "/unixhome/Projects/LIGO-ILE-Applications/ILE-Tides/MatlabCodePolished"
-dirBaseFiles =os.environ["EOB_C_BASE"]
-dirBaseFilesArchive =os.environ["EOB_C_ARCHIVE"]
-n_max_dirs = 1+ int(os.environ["EOB_C_ARCHIVE_NMAX"])
+dirBaseFiles =os.environ.get("EOB_C_BASE", "")
+dirBaseFilesArchive =os.environ.get("EOB_C_ARCHIVE", "")
+n_max_dirs = 1+ int(os.environ.get("EOB_C_ARCHIVE_NMAX", "100"))
+if not(EOBRun_ok) and not(dirBaseFiles and dirBaseFilesArchive):
+    raise Exception(" EOBTidalExternalC: need EOBRun_module, or the external code (EOB_C_BASE, EOB_C_ARCHIVE) ")
 
 # PRINT GIT REPO IN LOG
+if EOBRun_ok:
+    print(" EOB resumS: in-process EOBRun_module ")
 print(" EOB resumS git hash ")
-if os.path.exists(dirBaseFiles):
+if dirBaseFiles and os.path.exists(dirBaseFiles):
     os.system("(cd " + dirBaseFiles +"; git rev-parse HEAD)")
 else:
     print(" No EOBResumS C external!")
@@ -126,6 +137,140 @@ def write_par_file(basedir, mtot_msun, q,chi1, chi2,lambda1,lambda2, fmin,dt):
 #        f.write("LambdaBl4 "+str(lambda2_4) + "\n")
         f.write("geometric_units 0\n")
 
+def generate_hlm_data_raw_external(mtot_msun, q, chi1, chi2, lambda1, lambda2, fmin, dt_over_M):
+    """
+    Runs TEOBResumS.x on a par file in a scratch directory; returns the contents of hlm_insp.dat
+    """
+    fname_base = "working.dir"+str(np.random.randint(0,n_max_dirs))
+    print("  Saving to file (beware collisions!) ", fname_base)
+    cwd = os.getcwd(); 
+    while os.path.exists(dirBaseFilesArchive+"/"+fname_base):
+        print(" Waiting to delete file... "+fname_base)
+        time.sleep(10)
+    retrieve_directory = dirBaseFilesArchive+"/"+fname_base + "/"
+    # Create directory 
+    if not os.path.exists(retrieve_directory):
+        print(" Making directory to archive this run ... ", retrieve_directory)
+        os.makedirs(retrieve_directory)  
+        if not os.path.exists(retrieve_directory):
+            print(" FAILED TO CREATE ", retrieve_directory)
+            sys.exit(0)
+    write_par_file(retrieve_directory, mtot_msun, q, chi1, chi2, lambda1, lambda2, fmin, dt_over_M)
+    cmd = dirBaseFiles+"/TEOBResumS.x -p my.par"
+    print(" Generating tidal EOB with ", cmd)
+    os.chdir(retrieve_directory); os.system(cmd); 
+    # time/M    Amp_21   phi_21   Amp_22 phi_22  Amp_33 phi_33
+    hlm_data_raw = np.loadtxt(retrieve_directory + "/hlm_insp.dat")
+    # DELETE RESULTS
+    print(" Deleting intermediate files...", retrieve_directory)
+    shutil.rmtree(retrieve_directory)
+    if rosDebug:
+        print(" Restoring current working directory... ",cwd)
+    os.chdir(cwd);
+    return hlm_data_raw
+
+def generate_hlm_data_raw_in_process(mtot_msun, q, chi1, chi2, lambda1, lambda2, fmin, deltaT):
+    """
+    Calls EOBRun_module.EOBRunPy in this process, with the physics settings of write_par_file.
+    Returns an array in the hlm_insp.dat layout (see internal_ModeLookup), so WaveformModeCatalog treats both paths alike:
+       - time in units of M
+       - phases shifted by m pi/2, to the convention of the file output (as in lalsimutils.hlmoft)
+       - the bindings return A_lm/nu; odd-m amplitudes are divided by delta here, since WaveformModeCatalog multiplies
+         them by nu*delta (historical file convention)
+    """
+    modes_used = [mode for mode in internal_ModesAvailable if mode[1]>0]
+    M_sec = mtot_msun*MsunInSec
+    pars = {
+        'M'                  : mtot_msun,
+        'q'                  : q,
+        'LambdaAl2'          : lambda1,
+        'LambdaBl2'          : lambda2,
+        'chi1x'              : 0.,
+        'chi1y'              : 0.,
+        'chi1z'              : chi1,
+        'chi2x'              : 0.,
+        'chi2y'              : 0.,
+        'chi2z'              : chi2,
+        'domain'             : 0,
+        'arg_out'            : "yes",
+        'use_mode_lm'        : lalsimutils.modes_to_k(modes_used),
+        'srate_interp'       : 1./deltaT,
+        'use_geometric_units': "no",
+        'initial_frequency'  : fmin,
+        'interp_uniform_grid': "yes",
+        'distance'           : 1.,
+        'inclination'        : 0.,
+        'output_hpc'         : "no"
+    }
+    out = EOBRun_module.EOBRunPy(pars)
+    t, hlm_out = out[0], out[3]    # t, hp, hc, hlm [, dyn]
+    delta = (q-1.)/(q+1.)
+    hlm_data_raw = np.zeros((len(t), 1+2*int(len(internal_ModeLookup)/2)))
+    hlm_data_raw[:,0] = np.array(t)/M_sec
+    for mode, k in zip(modes_used, lalsimutils.modes_to_k(modes_used)):
+        if not(str(k) in hlm_out):
+            continue
+        col_A, col_P = internal_ModeLookup[mode]
+        amp = np.array(hlm_out[str(k)][0])
+        if mode[1] % 2 == 1:
+            amp = amp/delta if delta > 0 else 0*amp
+        hlm_data_raw[:,col_A] = amp
+        hlm_data_raw[:,col_P] = np.array(hlm_out[str(k)][1]) + mode[1]*np.pi/2
+    return hlm_data_raw
+
+def generate_hlm_data_raw(P, use_external=None):
+    """
+    Raw TEOBResumS mode data (hlm_insp.dat layout) for P.  Forces m1 > m2.
+    use_external : None (default; in-process with EOBRun_module if available, else or on failure the external executable TEOBResumS.x),
+                   True (always the external executable), False (always in-process)
+    """
+    m1InMsun, m2InMsun = reversed(sorted([P.m1/lal.MSUN_SI, P.m2/lal.MSUN_SI]))
+    args = (m1InMsun+m2InMsun, m1InMsun/m2InMsun, P.s1z, P.s2z, P.lambda1, P.lambda2, P.fmin)
+    external_ok = bool(dirBaseFiles and dirBaseFilesArchive)
+    if use_external is None:
+        use_external = not(EOBRun_ok)
+    if not(use_external):
+        if not(EOBRun_ok):
+            raise Exception(" EOBTidalExternalC: in-process generation requires EOBRun_module ")
+        try:
+            return generate_hlm_data_raw_in_process(*args, deltaT=P.deltaT)
+        except Exception as e:
+            if use_external is False or not(external_ok):
+                raise
+            print(" EOBRun_module failed, falling back to the external executable: ", e)
+    if not(external_ok):
+        raise Exception(" EOBTidalExternalC: external code not configured (EOB_C_BASE, EOB_C_ARCHIVE) ")
+    M_sec = (P.m1+P.m2)/lal.MSUN_SI * MsunInSec
+    return generate_hlm_data_raw_external(*args, dt_over_M=P.deltaT/M_sec)
+
+def _generate_task(args):
+    P, use_external = args
+    try:
+        return generate_hlm_data_raw(P, use_external=use_external)
+    except Exception as e:
+        print(" EOBTidalExternalC: generation failed for one point in the pool; it will be retried alone: ", e)
+        return None
+
+def generate_hlm_data_raw_list(P_list, n_procs=1, use_external=None):
+    """
+    generate_hlm_data_raw_list(P_list, n_procs) : [generate_hlm_data_raw(P) for P in P_list], generated by a pool of n_procs
+    worker processes (the EOB code is not thread safe).  A point whose generation fails gives None
+    """
+    tasks = [(P, use_external) for P in P_list]
+    if n_procs > 1 and len(tasks) > 1:
+        import multiprocessing
+        with multiprocessing.get_context('fork').Pool(int(np.min([n_procs, len(tasks)]))) as pool:
+            return pool.map(_generate_task, tasks)
+    return list(map(_generate_task, tasks))
+
+def generate_catalogs(P_list, n_procs=1, use_external=None, **kwargs):
+    """
+    generate_catalogs(P_list, n_procs) : [WaveformModeCatalog(P, **kwargs) for P in P_list], the raw mode data generated by
+    a pool of n_procs worker processes (generate_hlm_data_raw_list).  Catalogs are assembled in this process
+    """
+    hlm_data_list = generate_hlm_data_raw_list(P_list, n_procs=n_procs, use_external=use_external)
+    return [WaveformModeCatalog(P, hlm_data_raw=hlm_data_raw, use_external=use_external, **kwargs) for P, hlm_data_raw in zip(P_list, hlm_data_list)]
+
 class WaveformModeCatalog:
     """
     Class containing EOB tidal harmonics,  both in dimensionless and dimensional form
@@ -133,7 +278,7 @@ class WaveformModeCatalog:
 
 
     def __init__(self, P,  lmax=2,
-                 align_at_peak_l2_m2_emission=True, mode_list_to_load=[],build_fourier_time_window=1000,clean_with_taper=True,use_internal_interpolation_deltaT=None,build_strain_and_conserve_memory=False,reference_phase_at_peak=None,fix_phase_zero_at_coordinate=False):
+                 align_at_peak_l2_m2_emission=True, mode_list_to_load=[],build_fourier_time_window=1000,clean_with_taper=True,use_internal_interpolation_deltaT=None,build_strain_and_conserve_memory=False,reference_phase_at_peak=None,fix_phase_zero_at_coordinate=False,use_external=None,hlm_data_raw=None):
         self.P  = P
         self.quantity = "h"
         self.fOrbitLower =0.    #  Used to clean results.  Based on the phase of the 22 mode
@@ -159,9 +304,6 @@ class WaveformModeCatalog:
         if any([P.s1x,P.s1y,P.s2x,P.s2y]):
             print(" FAILURE: Tidal code assumes a nonprecessing approximant for now")
 
-        # Run the external script with the necessary parameters
-        # Assume environment set correctly
-        # Delete files from previous case"
         m1InMsun = P.m1/lal.MSUN_SI
         m2InMsun = P.m2/lal.MSUN_SI
         m1InMsun, m2InMsun = reversed(sorted([m1InMsun, m2InMsun]))   # FORCE m1 > m2
@@ -171,44 +313,17 @@ class WaveformModeCatalog:
         #  - Generate lambdatilde
         #  - generate lambda2
 
-        fname_base = "working.dir"+str(np.random.randint(0,n_max_dirs))
-        print("  Saving to file (beware collisions!) ", fname_base)
-
-        retrieve_directory = ''
-        cwd = os.getcwd(); 
-        while os.path.exists(dirBaseFilesArchive+"/"+fname_base):
-            print(" Waiting to delete file... "+fname_base)
-            time.sleep(10)
-        if False: #rosUseArchivedWaveforms and os.path.exists(dirBaseFilesArchive+"/"+fname_base) and os.path.exists(dirBaseFilesArchive+"/"+fname_base+"/test_h22.dat"):
-            retrieve_directory = dirBaseFilesArchive+"/"+fname_base
-            print(" Attempting to use archived waveform data  in ", retrieve_directory)
-        else:
-            retrieve_directory = dirBaseFilesArchive+"/"+fname_base + "/"
-            # Create directory 
-            if not os.path.exists(retrieve_directory):
-                print(" Making directory to archive this run ... ", retrieve_directory)
-                os.makedirs(retrieve_directory)  
-                if not os.path.exists(retrieve_directory):
-                    print(" FAILED TO CREATE ", retrieve_directory)
-                    sys.exit(0)
-            M_sec = (P.m1+P.m2)/lal.MSUN_SI * MsunInSec
-            dt_over_M = P.deltaT/M_sec # needed for solver sanity at end
-            write_par_file(retrieve_directory, (m1InMsun+m2InMsun),m1InMsun/m2InMsun, P.s1z, P.s2z, P.lambda1,P.lambda2,P.fmin,dt_over_M)
-            cmd = dirBaseFiles+"/TEOBResumS.x -p my.par"
-            print(" Generating tidal EOB with ", cmd)
-            os.chdir(retrieve_directory); os.system(cmd); 
-                           
+        # Generate the modes: in-process (EOBRun_module) if available, else with the external executable.
+        #   hlm_data_raw columns:  time/M    Amp_21   phi_21   Amp_22 phi_22 ... (see internal_ModeLookup); h_lm = A exp (- i phi)
+        # A precomputed hlm_data_raw (e.g., from generate_hlm_data_raw_list) can be passed in
+        if hlm_data_raw is None:
+            hlm_data_raw = generate_hlm_data_raw(P, use_external=use_external)
+
         # First loop: Create all the basic mode data
         # This should ALREADY BE IN PHYSICAL TIME UNITS but have UNPHYSICAL distance scales
         nu = lalsimutils.symRatio(P.m1,P.m2)
         delta = (m1InMsun- m2InMsun)/(m1InMsun+m2InMsun)
 
-        # h_lm = A exp (- i phi)
-        # time/M    Amp_21   phi_21   Amp_22 phi_22  Amp_33 phi_33
-        hlm_data_raw = np.loadtxt(retrieve_directory + "/hlm_insp.dat")
-        # DELETE RESULTS
-        print(" Deleting intermediate files...", retrieve_directory)
-        shutil.rmtree(retrieve_directory)
 
                
         tmin = np.min(hlm_data_raw[:,0])
@@ -305,9 +420,6 @@ class WaveformModeCatalog:
                 self.waveform_modes_nonuniform_smallest_timestep[mode] = self.waveform_modes[mode][1,0]-self.waveform_modes[mode][0,0]  # NOT uniform in time
                 self.waveform_modes_nonuniform_largest_timestep[mode] = self.waveform_modes[mode][1,0]-self.waveform_modes[mode][0,0]  # uniform in time
 
-        if rosDebug:
-            print(" Restoring current working directory... ",cwd)
-        os.chdir(cwd);
 
 
     def complex_hoft(self,  force_T=False, deltaT=1./16384, time_over_M_zero=0.,sgn=-1):
@@ -627,35 +627,53 @@ class WaveformModeCatalog:
         """
         Returns the values of the ROM coefficients for the parameter P.  
         Usees the key-value pairing convention described in basis_oft.
-        Note that the coefficients are created on a mode by mode basis, so the conversion call is VERY redundant.
+        See coefficients_array for the dense form, used for many points
         """
-
+        coef_array = self.coefficients_array([P],**kwargs)[0]
         coefs = {}
-        for mode in self.sur_dict:
-            params = self.parameter_convert[mode](P,**kwargs)  # very redundant, almost certainly the same for all modes in the surrogate.
-            params_surrogate = self.sur_dict[mode].get_surr_params(params)
-            if rosDebug:
-                print(" passing params to mode : ", mode, params)
-                print(" surrogate natural parameter is ", params_surrogate)
-
-            # New version: gw-surrogate-0.5
-            h_EIM = self.sur_dict[mode].eim_coeffs(params_surrogate, 'waveform_basis')
-            # OLD VERSION: gw-surrogate-0.4.2 and earlier
-            # x0= self.sur_dict[mode]._affine_mapper(params_surrogate)
-            # amp_eval = self.sur_dict[mode]._amp_eval(x0)
-            # phase_eval = self.sur_dict[mode]._phase_eval(x0)
-            # norm_eval = self.sur_dict[mode]._norm_eval(x0)
-            # h_EIM = np.zeros(len(amp_eval))
-            # if self.sur_dict[mode].surrogate_mode_type  == 'waveform_basis':
-            #     h_EIM = norm_eval*amp_eval*np.exp(1j*phase_eval)
-
-
+        for indx_mode, mode in enumerate(self.coefficient_modes()):
             for indx in np.arange(self.nbasis_per_mode[mode]):  
                 how_to_store = (mode[0], mode[1], indx)
-                coefs[how_to_store]  = self.post_dict_complex_coef[mode](h_EIM[indx])   # conjugation as needed
-
+                coefs[how_to_store]  = coef_array[indx_mode,indx]
         return coefs
 
+    def coefficient_modes(self):
+        """
+        Mode order of the second axis of coefficients_array
+        """
+        return list(self.sur_dict.keys())
+
+    def coefficients_array(self,P_list,**kwargs):
+        """
+        Returns the ROM coefficients for a list of parameters P, as a complex array of shape (n_points, n_modes, n_basis):
+        modes in the order of coefficient_modes(), basis index up to the largest nbasis_per_mode (zero padded).
+        For each point, the parameter conversion is done once, and the EIM coefficients once per distinct surrogate
+        (modes generated by reflection symmetry share their surrogate; post_dict_complex_coef does the conjugation).
+        """
+        modes = self.coefficient_modes()
+        n_basis = int(np.max([self.nbasis_per_mode[mode] for mode in modes]))
+        coef_array = np.zeros((len(P_list), len(modes), n_basis), dtype=complex)
+        for indx_P, P in enumerate(P_list):
+            params_by_converter = {}
+            h_EIM_by_sur = {}
+            for indx_mode, mode in enumerate(modes):
+                convert = self.parameter_convert[mode]
+                if not(convert in params_by_converter):
+                    params_by_converter[convert] = convert(P,**kwargs)
+                params = params_by_converter[convert]
+                sur = self.sur_dict[mode]
+                key = (id(sur), id(convert))
+                if not(key in h_EIM_by_sur):
+                    params_surrogate = sur.get_surr_params(params)
+                    if rosDebug:
+                        print(" passing params to mode : ", mode, params)
+                        print(" surrogate natural parameter is ", params_surrogate)
+                    # New version: gw-surrogate-0.5
+                    h_EIM_by_sur[key] = np.asarray(sur.eim_coeffs(params_surrogate, 'waveform_basis'))
+                n_here = self.nbasis_per_mode[mode]
+                coef_array[indx_P,indx_mode,:n_here] = self.post_dict_complex_coef[mode](h_EIM_by_sur[key][:n_here])   # conjugation as needed
+        return coef_array
+
     # See NR code 
     def hlmoft(self,  P, force_T=False, deltaT=1./16384, time_over_M_zero=0.,use_basis=False,Lmax=np.inf,hybrid_time=None,hybrid_use=False,hybrid_method='taper_add',hybrid_frequency=None,verbose=False,rom_taper_start=False,rom_taper_end=True,use_reference_spins=True,**kwargs):
         """
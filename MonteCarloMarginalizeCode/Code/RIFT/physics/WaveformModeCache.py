@@ -0,0 +1,164 @@
+"""
+WaveformModeCache.py
+
+On-disk, content-addressed cache of waveform modes (dictionaries of COMPLEX16FrequencySeries), shared by all
+processes on a node, e.g. ILE jobs re-evaluating the same intrinsic points (repeated util_CleanILE keys,
+--last-iteration-extrinsic reruns, calibration reweighting).
+
+  - key : sha256 of the waveform-relevant ChooseWaveformParams fields (floats rounded to n_digits significant digits;
+          sky location, polarization and detector are left out) and of any generator settings (Lmax, approximant options, ...)
+  - entry : one directory <key>/ holding modes.json (mode list, epoch, f0, deltaF, units) and hlms.npy
+          (shape (n_dicts, n_modes, npts), loaded memory-mapped)
+  - writes go to a temporary directory, renamed into place (atomic on one filesystem), so readers never see partial entries
+    and concurrent writers of the same key are harmless (the first rename wins)
+  - size-bounded LRU eviction: hits refresh the entry mtime; when the cache exceeds max_bytes after a write, the oldest
+    entries are renamed away, then deleted.  A reader losing an entry to eviction sees a miss.
+
+Usage:
+   cache = WaveformModeCache(path, max_bytes=...)
+   hlms, hlms_conj = cache.cached_call(P, lambda: generator(P, ...), generator='name', Lmax=Lmax, ...)
+"""
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import lal
+
+# ChooseWaveformParams fields that do not change the modes
+fields_ignored = ['detector', 'phi', 'theta', 'psi', 'radec', 'snr']
+
+
+def _round_value(x, n_digits):
+    if isinstance(x, (float, np.floating)):
+        return float('{:.{}g}'.format(float(x), n_digits))
+    if isinstance(x, (int, np.integer, bool, str)) or x is None:
+        return x
+    return repr(x)
+
+
+class WaveformModeCache(object):
+    def __init__(self, path, max_bytes=10*1024**3, n_digits=12, verbose=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.n_digits = n_digits
+        self.verbose = verbose
+        self.n_hits = 0
+        self.n_misses = 0
+        if not os.path.isdir(path):
+            os.makedirs(path, exist_ok=True)
+
+    def key(self, P, **settings):
+        """
+        Content key for the modes of P generated with the given settings (any repr-able values)
+        """
+        fields = dict([(name, _round_value(val, self.n_digits)) for name, val in vars(P).items() if not (name in fields_ignored)])
+        settings = dict([(name, _round_value(val, self.n_digits)) for name, val in settings.items()])
+        text = json.dumps({'P': fields, 'settings': repr(sorted(settings.items()))}, sort_keys=True)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def load(self, key):
+        """
+        List of mode dictionaries stored under key, or None
+        """
+        dir_entry = os.path.join(self.path, key)
+        try:
+            with open(os.path.join(dir_entry, 'modes.json'), 'r') as f:
+                meta = json.load(f)
+            hlm_array = np.load(os.path.join(dir_entry, 'hlms.npy'), mmap_mode='r')
+            os.utime(dir_entry, None)
+        except (IOError, OSError, ValueError):
+            return None   # missing, or evicted while reading
+        modes = [tuple(mode) for mode in meta['modes']]
+        out = []
+        for indx_dict in range(hlm_array.shape[0]):
+            hlms = {}
+            for indx_mode, mode in enumerate(modes):
+                info = meta['series'][indx_dict][indx_mode]
+                hlm = lal.CreateCOMPLEX16FrequencySeries(info['name'], lal.LIGOTimeGPS(info['epoch_s'], info['epoch_ns']), info['f0'],
+                                                         info['deltaF'], lal.Unit(info['units']), hlm_array.shape[2])
+                hlm.data.data[:] = hlm_array[indx_dict, indx_mode]
+                hlms[mode] = hlm
+            out.append(hlms)
+        return out
+
+    def save(self, key, hlm_dicts):
+        """
+        Store a list of mode dictionaries (same modes and lengths) under key
+        """
+        modes = list(hlm_dicts[0].keys())
+        dir_tmp = tempfile.mkdtemp(prefix='.tmp_', dir=self.path)
+        try:
+            hlm_array = np.lib.format.open_memmap(os.path.join(dir_tmp, 'hlms.npy'), mode='w+', dtype=np.complex128,
+                                                  shape=(len(hlm_dicts), len(modes), hlm_dicts[0][modes[0]].data.length))
+            meta = {'modes': [[int(x) for x in mode] for mode in modes], 'series': []}
+            for indx_dict, hlms in enumerate(hlm_dicts):
+                meta['series'].append([])
+                for indx_mode, mode in enumerate(modes):
+                    hlm = hlms[mode]
+                    hlm_array[indx_dict, indx_mode] = hlm.data.data
+                    meta['series'][-1].append({'name': hlm.name, 'epoch_s': int(hlm.epoch.gpsSeconds), 'epoch_ns': int(hlm.epoch.gpsNanoSeconds),
+                                               'f0': float(hlm.f0), 'deltaF': float(hlm.deltaF), 'units': str(hlm.sampleUnits)})
+            hlm_array.flush()
+            del hlm_array
+            with open(os.path.join(dir_tmp, 'modes.json'), 'w') as f:
+                json.dump(meta, f)
+            os.rename(dir_tmp, os.path.join(self.path, key))
+        except OSError:
+            pass   # another process stored the same key first
+        finally:
+            if os.path.isdir(dir_tmp):
+                shutil.rmtree(dir_tmp, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache is below max_bytes
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.path):
+            dir_entry = os.path.join(self.path, name)
+            if name.startswith('.') or not os.path.isdir(dir_entry):
+                continue
+            try:
+                size = np.sum([os.path.getsize(os.path.join(dir_entry, fname)) for fname in os.listdir(dir_entry)])
+                entries.append((os.path.getmtime(dir_entry), size, dir_entry))
+            except OSError:
+                continue
+            total += size
+        entries.sort()
+        while total > self.max_bytes and len(entries) > 0:
+            mtime, size, dir_entry = entries.pop(0)
+            dir_trash = os.path.join(self.path, '.evict_' + os.path.basename(dir_entry) + '_' + str(os.getpid()))
+            try:
+                os.rename(dir_entry, dir_trash)
+                shutil.rmtree(dir_trash, ignore_errors=True)
+            except OSError:
+                pass   # already evicted by another process
+            total -= size
+            if self.verbose:
+                print(" WaveformModeCache: evicted ", dir_entry)
+
+    def cached_call(self, P, generate, **settings):
+        """
+        Modes of P: loaded if cached, else generate() (returning one mode dictionary, or a tuple of them), then stored.
+        Returns what generate() returns
+        """
+        key = self.key(P, **settings)
+        hlm_dicts = self.load(key)
+        if hlm_dicts is not None:
+            self.n_hits += 1
+            if self.verbose:
+                print(" WaveformModeCache: hit ", key)
+            return hlm_dicts[0] if len(hlm_dicts) == 1 else tuple(hlm_dicts)
+        self.n_misses += 1
+        out = generate()
+        hlm_dicts = [out] if isinstance(out, dict) else list(out)
+        if len(hlm_dicts[0]) > 0 and all([list(hlms.keys()) == list(hlm_dicts[0].keys()) for hlms in hlm_dicts]):
+            self.save(key, hlm_dicts)
+        return out
@@ -16,6 +16,9 @@
 
 
 import RIFT.interpolators.BayesianLeastSquares as BayesianLeastSquares
+import RIFT.interpolators.fit_artifact as fit_artifact
+import RIFT.interpolators.forest_predictor as forest_predictor
+from RIFT.interpolators.forest_predictor import ForestPredictor
 
 import argparse
 import sys
@@ -72,6 +75,7 @@ from ligo.lw import lsctables, utils, ligolw
 lsctables.use_in(ligolw.LIGOLWContentHandler)
 
 import RIFT.integrators.mcsampler as mcsampler
+import RIFT.integrators.statutils as statutils
 try:
     import RIFT.integrators.mcsamplerEnsemble as mcsamplerEnsemble
     mcsampler_gmm_ok = True
@@ -317,13 +321,32 @@ parser.add_argument("--n-chunk",default=1e5,type=int)
 parser.add_argument("--contingency-unevolved-neff",default=None,help="Contingency planning for when n_eff produced by CIP is small, and user doesn't want to have hard failures.  Note --fail-unless-n-eff will prevent this from happening. Options: quadpuff, ...")
 parser.add_argument("--not-worker",action='store_true',help="Nonworker jobs, IF we have workers present, don't have the 'fail unless' statement active")
 parser.add_argument("--fail-unless-n-eff",default=None,type=float,help="If nonzero, places a minimum requirement on n_eff. Code will exit if not achieved, with no sample generation")
-parser.add_argument("--fit-method",default="rf",help="rf (default) : rf|gp|quadratic|polynomial|gp_hyper|gp_lazy|cov|kde.  Note 'polynomial' with --fit-order 0  will fit a constant")
+parser.add_argument("--fit-method",default="rf",help="rf (default) : rf|gp|gp-local|quadratic|polynomial|gp_hyper|gp_lazy|cov|kde.  Note 'polynomial' with --fit-order 0  will fit a constant")
 parser.add_argument("--fit-load-quadratic",default=None,help="Filename of hdf5 file to load quadratic fit from. ")
 parser.add_argument("--fit-load-quadratic-path",default="GW190814/annealing_mc_source_eta_chieff",help="Path in hdf5 file to specific covariance matrix to be used")
 parser.add_argument("--pool-size",default=3,type=int,help="Integer. Number of GPs to use (result is averaged)")
+parser.add_argument("--fit-gp-restarts",default=8,type=int,help="Integer. Number of (random) restarts of the GP hyperparameter optimizer, for gp and gp-local")
+parser.add_argument("--fit-gp-n-procs",default=1,type=int,help="Integer. If >1, run the GP hyperparameter restarts in a process pool of this size (gp and gp-local)")
+parser.add_argument("--fit-gp-expert-size",default=2000,type=int,help="Integer. For gp-local, maximum number of training points per local GP expert. Training sets no larger than this use a single GP, as with gp")
 parser.add_argument("--fit-load-gp",default=None,type=str,help="Filename of GP fit to load. Overrides fitting process, but user MUST correctly specify coordinate system to interpret the fit with.  Does not override loading and converting the data.")
 parser.add_argument("--fit-save-gp",default=None,type=str,help="Filename of GP fit to save. ")
+parser.add_argument("--fit-rf-compiled",action='store_true',help="For rf fits, evaluate the trained forest with the compiled flat-array predictor (RIFT.interpolators.forest_predictor). Same results as sklearn; about 2x faster per 10^5 points. Needs numba: without it, sklearn predict is used")
+parser.add_argument("--fit-save-artifact",default=None,type=str,help="Directory name. Save the fit as a portable fit artifact (json manifest + npy arrays; no pickle). Supported for gp, gp-local, rf, nn, quadratic, polynomial")
+parser.add_argument("--fit-load-artifact",default=None,type=str,help="Directory name of a fit artifact (see --fit-save-artifact) to use instead of fitting. Arrays are memory-mapped. Coordinates (--parameter, --parameter-implied) must match the saved fit")
+parser.add_argument("--fit-warm-start",default=None,type=str,help="Directory name of the fit artifact (see --fit-save-artifact) from the previous iteration, to warm-start this fit: gp/gp-local start the hyperparameter optimizer from its kernel (no random restarts); nn starts from its network weights; rf keeps its trees, adds trees trained on the points that are new since, and refits all leaf values to the current points. Falls back to a full fit if the artifact does not match the fit method or coordinates")
+parser.add_argument("--fit-warm-start-rf-max-trees",default=300,type=int,help="rf --fit-warm-start: if the warm-started forest would have more trees than this, fit from scratch instead")
+parser.add_argument("--fit-nn-patience",default=None,type=int,help="Integer. nn fits: stop training once the validation chi2 has not improved for this many epochs, and keep the best network (default: no early stopping)")
+parser.add_argument("--fit-nn-n-threads",default=None,type=int,help="Integer. Number of CPU threads torch may use to train/evaluate nn fits (default: torch default, usually all cores). Set to the number of cores requested on shared CPU nodes")
+parser.add_argument("--output-acquisition",action='store_true',help="Active learning: also write points for ILE where the fit is least certain, to --fname-output-acquisition. Candidates are the posterior draws; --output-acquisition-fraction x --n-output-samples of them are chosen with probability proportional to the fit's predictive variance (gp: GP std; gp-local: blended expert std; rf: spread of the trees; gp-pool: disagreement of the pool), i.e. with density ~ posterior x variance. These are NOT posterior samples: the posterior output (--fname-output-samples) is unchanged. Fits without an uncertainty estimate write no acquisition file")
+parser.add_argument("--output-acquisition-fraction",default=0.5,type=float,help="Number of --output-acquisition points, as a fraction of --n-output-samples")
+parser.add_argument("--fname-output-acquisition",default=None,type=str,help="Output file for --output-acquisition points (default: <fname-output-samples>-acquisition)")
+parser.add_argument("--fit-benchmark-method",action='append',default=None,help="Benchmark mode (no sampling): k-fold cross-validate each named fit method (repeat the option: rf, gp, gp-local, gp-pool, quadratic, polynomial, nn) on the retained data, write a table of held-out residuals, fit time, prediction throughput and artifact size to --fit-benchmark-output, and exit")
+parser.add_argument("--fit-benchmark-folds",default=5,type=int,help="Number of cross-validation folds for --fit-benchmark-method")
+parser.add_argument("--fit-benchmark-n-procs",default=1,type=int,help="Number of processes running the (method, fold) benchmark fits. Timings are only comparable if this is no larger than the number of cores")
+parser.add_argument("--fit-benchmark-lnL-window",default=10,type=float,help="Held-out residuals are also reported for points within this of the maximum lnL")
+parser.add_argument("--fit-benchmark-output",default="fit_benchmark.dat",type=str,help="Filename of the --fit-benchmark-method table")
 parser.add_argument("--fit-order",type=int,default=2,help="Fit order (polynomial case: degree)")
+parser.add_argument("--fit-evaluate-float32",action='store_true',help="Evaluate the fit with float32 inputs.  Only used for tree/NN fits (rf, nn, nn_rfwrapper), which work in float32 internally anyways")
 parser.add_argument("--fit-uncertainty-added",default=False, action='store_true', help="Reported likelihood is lnL+(fit error). Use for placement and use of systematic errors.")
 parser.add_argument("--no-plots",action='store_true')
 parser.add_argument("--tabular-eos-file",type=str,default=None,help="Tabular file of EOS to use.  The default prior will be UNIFORM in this table!")
@@ -341,8 +364,11 @@ parser.add_argument("--eos-param-values", default=None, help="Specific parameter
 parser.add_argument("--sampler-method",default="adaptive_cartesian",help="adaptive_cartesian|GMM|adaptive_cartesian_gpu|portfolio")
 parser.add_argument("--sampler-portfolio",default=None,action='append',type=str,help="comma-separated strings, matching sampler methods other than portfolio")
 parser.add_argument("--sampler-portfolio-args",default=None, action='append', type=str, help='eval-able dictionary to be passed to that sampler_')
+parser.add_argument("--sampler-portfolio-cost-aware",action='store_true',help="Portfolio member weights track effective samples per second of wallclock (draw, lnL share, and update cost), not just effective samples")
+parser.add_argument("--sampler-checkpoint-file",default=None,type=str,help="If provided, the integrator (adaptive_cartesian_gpu or AV, with --internal-use-lnL) periodically saves its state here, and resumes from it if present. Use for preemptible jobs.")
 parser.add_argument("--sampler-oracle",default=None, action='append', type=str, help='names of oracles to be used')
 parser.add_argument("--sampler-oracle-args",default=None, action='append', type=str, help='eval-able dictionary to be passed to that oracle')
+parser.add_argument("--sampler-n-chains",default=1,type=int,help="If >1, fit once, then run this many independent sampler chains in a (fork) process pool sharing the fit, and merge their samples and evidence estimates. Replaces several --cip-explode-jobs workers on one many-core node")
 parser.add_argument("--oracle-reference-sample-file",default=None,  type=str, help='filename of reference sample file to be used as oracle for seeding sampler')
 parser.add_argument("--oracle-reference-sample-params",default=None,  type=str,  help='parameters to be pulled from sample file (format comma-separated string)')
 parser.add_argument("--internal-use-lnL",action='store_true',help="integrator internally manipulates lnL. ONLY VIABLE FOR GMM AT PRESENT")
@@ -1127,10 +1153,38 @@ def fit_quadratic_stored(fname_h5,loc,L_offset=200):
     return my_func
 
 
+fit_artifact_pending = None   # if a list, fit artifacts are queued here instead of written (--fit-benchmark-method: write after the fit is timed)
+def fit_artifact_write(export_function, *args, **kwargs):
+    if fit_artifact_pending is None:
+        export_function(*args, **kwargs)
+    else:
+        fit_artifact_pending.append(functools.partial(export_function, *args, **kwargs))
+
+def fit_artifact_meta():
+    return {'coord_names': list(coord_names), 'lnL_shift': float(lnL_shift), 'fit_method': opts.fit_method}
+
+def fit_warm_start_artifact(kinds):
+    """
+    fit_warm_start_artifact(kinds) : (arrays, meta) of the --fit-warm-start artifact, or None if there is none, or it is not one of kinds or uses other coordinates.
+    meta['lnL_shift_change'] is the offset to add to the previous fit's values to use this lnL_shift
+    """
+    if not opts.fit_warm_start:
+        return None
+    kind, arrays, meta = fit_artifact.read_artifact(opts.fit_warm_start)
+    if not(kind in kinds):
+        print(" WARNING: warm start artifact ", opts.fit_warm_start, " has kind ", kind, "; need one of ", kinds, ": fitting from scratch")
+        return None
+    if 'coord_names' in meta and list(meta['coord_names']) != list(coord_names):
+        print(" WARNING: warm start artifact coordinates ", meta['coord_names'], " do not match ", coord_names, ": fitting from scratch")
+        return None
+    meta['lnL_shift_change'] = float(meta['lnL_shift']) - lnL_shift if 'lnL_shift' in meta else 0.
+    print(" Warm start from fit artifact ", opts.fit_warm_start, kind)
+    return arrays, meta
+
 def fit_quadratic_alt(x,y,y_err=None,x0=None,symmetry_list=None,verbose=False,hard_regularize_negative=True):
     gamma_x = None
     if not (y_err is None):
-        gamma_x =np.diag(1./np.power(y_err,2))
+        gamma_x =1./np.power(y_err,2)   # weights (diagonal)
     the_quadratic_results = BayesianLeastSquares.fit_quadratic( x, y,gamma_x=gamma_x,verbose=verbose,hard_regularize_negative=hard_regularize_negative)#x0=None)#x0_val_here)
     peak_val_est, best_val_est, my_fisher_est, linear_term_est,fn_estimate = the_quadratic_results
 
@@ -1146,6 +1200,9 @@ def fit_quadratic_alt(x,y,y_err=None,x0=None,symmetry_list=None,verbose=False,ha
     print("  Fit: std :" , np.std( y-fn_estimate(x)))
     print("  Fit: BIC :" , bic)
 
+    if opts.fit_save_artifact:
+        fit_artifact_write(fit_artifact.export_quadratic, opts.fit_save_artifact, fn_estimate.c, fn_estimate.x0, fn_estimate.lin, fn_estimate.quad, meta=fit_artifact_meta())
+
     return fn_estimate
 
 
@@ -1155,61 +1212,85 @@ def fit_polynomial(x,y,x0=None,symmetry_list=None,y_errors=None):
     x = array so x[0] , x[1], x[2] are points.
     """
 
-    clf_list = []
+    fit_list = []
     bic_list = []
+    weights = None
+    if not(y_errors is None or opts.ignore_errors_in_data):
+        assert len(y_errors) == len(y)
+        weights = 1./y_errors**2   # fit with usual weights
     for indx in np.arange(opts.fit_order+1):
         poly = msf.PolynomialFeatures(degree=indx,symmetry_list=symmetry_list)
-        X_  = poly.fit_transform(x)
+        poly.fit(x)
 
         if opts.verbose:
             print(" Fit : poly: RAW :", poly.get_feature_names())
             print(" Fit : ", poly.powers_)
 
-        # Strip things with inappropriate symmetry: IMPOSSIBLE
-        # powers_new = []
-        # if not(symmetry_list is None):
-        #  for line in poly.powers_:
-        #     signature = np.prod(np.power( np.array(symmetry_list), line))
-        #     if signature >0:
-        #         powers_new.append(line)
-        #  poly.powers_ = powers_new
-
-        #  X_  = poly.fit_transform(x) # refit, with symmetry-constrained structure
-
-        #  print " Fit : poly: After symmetry constraint :", poly.get_feature_names()
-        #  print " Fit : ", poly.powers_
-
-
-        clf = linear_model.LinearRegression()
-        if y_errors is None or opts.ignore_errors_in_data:
-            clf.fit(X_,y)
-        else:
-            assert len(y_errors) == len(y)
-            clf.fit(X_,y,sample_weight=1./y_errors**2)  # fit with usual weights
-
-        clf_list.append(clf)
+        # Weighted least squares on the monomials, solved in scaled coordinates; the fit evaluates the monomials directly
+        fit_here = BayesianLeastSquares.fit_polynomial_least_squares(x, y, poly.powers_, weights=weights, symmetry_list=symmetry_list)
+        fit_list.append(fit_here)
+        y_fit = fit_here(x)
 
         print(" Fit: Testing order ", indx)
-        print(" Fit: std: ", np.std(y - clf.predict(X_)),  "using number of features ", len(y))  # should NOT be perfect
+        print(" Fit: std: ", np.std(y - y_fit),  "using number of features ", len(y))  # should NOT be perfect
         if not (y_errors is None):
-            print(" Fit: weighted error ", np.std( (y - clf.predict(X_))/y_errors))
-        bic = -2*( -0.5*np.sum(np.power((y - clf.predict(X_))/y_errors,2))  - 0.5*len(y)*np.log(len(x[0])))
+            print(" Fit: weighted error ", np.std( (y - y_fit)/y_errors))
+        bic = -2*( -0.5*np.sum(np.power((y - y_fit)/y_errors,2))  - 0.5*len(y)*np.log(len(x[0])))
         print(" Fit: BIC:", bic)
         bic_list.append(bic)
 
-    clf = clf_list[np.argmin(np.array(bic_list) )]
+    fit_best = fit_list[np.argmin(np.array(bic_list) )]
 
-    return lambda x: clf.predict(poly.fit_transform(x))
+    if opts.fit_save_artifact:
+        fit_artifact_write(fit_artifact.export_polynomial, opts.fit_save_artifact, fit_best.powers, fit_best.coef, fit_best.intercept, meta=fit_artifact_meta(), x_center=fit_best.x_center, x_scale=fit_best.x_scale)
+
+    return fit_best
 
 
 from sklearn.gaussian_process import GaussianProcessRegressor
 from sklearn.gaussian_process.kernels import PairwiseKernel,RBF, WhiteKernel, ConstantKernel as C
+from RIFT.interpolators import local_GP
 
 
 def adderr(y):
     val,err = y
     return val+error_factor*err
 
+def fit_with_std(fn, fn_std):
+    """
+    fit_with_std(fn, fn_std) : attaches fn_std (x -> predictive std of the fit at x, fit coordinates) to the fit fn, as fn.predict_std.  Used by --output-acquisition
+    """
+    fn.predict_std = fn_std
+    return fn
+
+def gp_length_scale_estimate(x):
+    """
+    gp_length_scale_estimate(x) : initial RBF length scales and bounds for a GP fit to lnL, from the spread of the retained points
+    """
+    length_scale_est = []
+    length_scale_bounds_est = []
+    for indx in np.arange(len(x[0])):
+        # These length scales have been tuned by expereience
+        length_scale_est.append( 2*np.nanstd(x[:,indx])  )  # auto-select range based on sampling retained
+        length_scale_min_here= np.max([1e-3,0.2*np.nanstd(x[:,indx]/np.sqrt(len(x)))])
+        if indx == mc_index:
+            length_scale_min_here= 0.2*np.nanstd(x[:,indx]/np.sqrt(len(x)))
+            print(" Setting mc range: retained point range is ", np.nanstd(x[:,indx]), " and target min is ", length_scale_min_here)
+        length_scale_bounds_est.append( (length_scale_min_here , 5*np.nanstd(x[:,indx])   ) )  # auto-select range based on sampling *RETAINED* (i.e., passing cut).  Note that for the coordinates I usually use, it would be nonsensical to make the range in coordinate too small, as can occasionally happens
+    return length_scale_est, length_scale_bounds_est
+
+def gp_warm_start(kernel):
+    """
+    gp_warm_start(kernel) : (kernel, number of optimizer restarts).  With a gp/gp-local --fit-warm-start artifact, the kernel hyperparameters
+    start from the previous fit and the (random) restarts are skipped
+    """
+    warm = fit_warm_start_artifact(['gp','gp-local'])
+    if warm is None:
+        return kernel, opts.fit_gp_restarts
+    kernel = local_GP.warm_start_kernel(kernel, fit_artifact.kernel_from_spec(warm[1]['kernel']))
+    print(" GP: warm start kernel ", kernel)
+    return kernel, 0
+
 def fit_gp(x,y,x0=None,symmetry_list=None,y_errors=None,hypercube_rescale=False,fname_export="gp_fit"):
     """
     x = array so x[0] , x[1], x[2] are points.
@@ -1231,16 +1312,7 @@ def fit_gp(x,y,x0=None,symmetry_list=None,y_errors=None,hypercube_rescale=False,
     #   - they are rarely very long, but at high mass can be long
     #   - I need to allow for a RANGE
 
-    length_scale_est = []
-    length_scale_bounds_est = []
-    for indx in np.arange(len(x[0])):
-        # These length scales have been tuned by expereience
-        length_scale_est.append( 2*np.nanstd(x[:,indx])  )  # auto-select range based on sampling retained
-        length_scale_min_here= np.max([1e-3,0.2*np.nanstd(x[:,indx]/np.sqrt(len(x)))])
-        if indx == mc_index:
-            length_scale_min_here= 0.2*np.nanstd(x[:,indx]/np.sqrt(len(x)))
-            print(" Setting mc range: retained point range is ", np.nanstd(x[:,indx]), " and target min is ", length_scale_min_here)
-        length_scale_bounds_est.append( (length_scale_min_here , 5*np.nanstd(x[:,indx])   ) )  # auto-select range based on sampling *RETAINED* (i.e., passing cut).  Note that for the coordinates I usually use, it would be nonsensical to make the range in coordinate too small, as can occasionally happens
+    length_scale_est, length_scale_bounds_est = gp_length_scale_estimate(x)
 
     print(" GP: Input sample size ", len(x), len(y))
     print(" GP: Estimated length scales ")
@@ -1253,22 +1325,28 @@ def fit_gp(x,y,x0=None,symmetry_list=None,y_errors=None,hypercube_rescale=False,
     if not (hypercube_rescale):
         # These parameters have been hand-tuned by experience to try to set to levels comparable to typical lnL Monte Carlo error
         kernel = WhiteKernel(noise_level=0.1,noise_level_bounds=(1e-2,1))+C(0.5, (1e-3,1e1))*RBF(length_scale=length_scale_est, length_scale_bounds=length_scale_bounds_est)
-        gp = GaussianProcessRegressor(kernel=kernel, alpha=alpha,  n_restarts_optimizer=8)
-
-        gp.fit(x,y)
+        kernel, n_restarts = gp_warm_start(kernel)
+        if opts.fit_gp_n_procs > 1 and n_restarts > 0:
+            gp = local_GP.fit_gp_restarts(x,y,kernel,alpha=alpha,n_restarts=n_restarts,n_procs=opts.fit_gp_n_procs)
+        else:
+            gp = GaussianProcessRegressor(kernel=kernel, alpha=alpha,  n_restarts_optimizer=n_restarts)
+            gp.fit(x,y)
 
         print(" Fit: std: ", np.std(y - gp.predict(x)),  "using number of features ", len(y))
 
         if opts.fit_save_gp:
             print(" Attempting to save fit ", opts.fit_save_gp+".pkl")
             joblib.dump(gp,opts.fit_save_gp+".pkl")
+        if opts.fit_save_artifact:
+            fit_artifact_write(fit_artifact.export_gp, opts.fit_save_artifact, gp, meta=fit_artifact_meta())
         
+        gp_std = lambda x: gp.predict(x,return_std=True)[1]
         if not (opts.fit_uncertainty_added):
             if opts.protect_coordinate_conversions:
-                return lalsimutils.RangeProtectReduce( (lambda x: gp.predict(x) ), -np.inf)
-            return lambda x: gp.predict(x)
+                return fit_with_std(lalsimutils.RangeProtectReduce( (lambda x: gp.predict(x) ), -np.inf), gp_std)
+            return fit_with_std(lambda x: gp.predict(x), gp_std)
         else:
-            return lambda x: adderr(gp.predict(x,return_std=True))
+            return fit_with_std(lambda x: adderr(gp.predict(x,return_std=True)), gp_std)
     else:
         x_scaled = np.zeros(x.shape)
         x_center = np.zeros(len(length_scale_est))
@@ -1302,7 +1380,41 @@ def fit_gp_pool(x,y,n_pool=10,**kwargs):
         gp_fit_list.append(fit_gp(x[part],y[part],**kwargs))
     fn_out =  lambda x: np.mean( map_funcs( gp_fit_list,x), axis=0)
     print(" Testing ", fn_out([x[0]]))
-    return fn_out
+    return fit_with_std(fn_out, lambda x: np.std( map_funcs( gp_fit_list,x), axis=0))  # uncertainty: disagreement between the pool members
+
+def fit_gp_local(x,y,y_errors=None):
+    """
+    fit_gp_local : local-expert GP (RIFT.interpolators.local_GP), same kernel as fit_gp.
+    Hyperparameters are fit once, restarts in a process pool; each expert conditions on at most --fit-gp-expert-size points
+    """
+    if opts.fit_load_gp:
+        return fit_gp(x,y,y_errors=y_errors)
+
+    length_scale_est, length_scale_bounds_est = gp_length_scale_estimate(x)
+    print(" GP local: Input sample size ", len(x), len(y), " expert size ", opts.fit_gp_expert_size)
+    print(" GP: Estimated length scales ")
+    print(length_scale_est)
+    print(length_scale_bounds_est)
+
+    alpha = 1e-10 # default from sklearn docs
+    if not(y_errors is None):
+        alpha = y_errors**2
+    kernel = WhiteKernel(noise_level=0.1,noise_level_bounds=(1e-2,1))+C(0.5, (1e-3,1e1))*RBF(length_scale=length_scale_est, length_scale_bounds=length_scale_bounds_est)
+    kernel, n_restarts = gp_warm_start(kernel)
+    gp = local_GP.LocalExpertGP(x,y,kernel,alpha=alpha,n_expert=opts.fit_gp_expert_size,n_restarts=n_restarts,n_procs=opts.fit_gp_n_procs)
+
+    print(" Fit: std: ", np.std(y - gp.predict(x)),  "using number of features ", len(y))
+
+    if opts.fit_save_gp:
+        print(" Attempting to save fit ", opts.fit_save_gp+".pkl")
+        joblib.dump(gp,opts.fit_save_gp+".pkl")
+    if opts.fit_save_artifact:
+        fit_artifact_write(fit_artifact.export_local_gp, opts.fit_save_artifact, gp, meta=fit_artifact_meta())
+
+    gp_std = lambda x: gp.predict(x,return_std=True)[1]
+    if opts.protect_coordinate_conversions:
+        return fit_with_std(lalsimutils.RangeProtectReduce( (lambda x: gp.predict(x) ), -np.inf), gp_std)
+    return fit_with_std(lambda x: gp.predict(x), gp_std)
 
 def fit_gp_lazy(x,y,y_errors=None,dy_cov=5):
     """
@@ -1374,14 +1486,24 @@ def fit_nn(x,y,y_errors=None,fname_export='nn_fit',adaptive=True):
     working_dir = os.getcwd()
 #    for indx in np.arange(len(x[0])):
 #        print np.min(x[:,indx]), np.max(x[:,indx]), (np.max(x[:,indx])-np.mean(x[:,indx]))/np.std(x[:,indx])
-    if adaptive:
-        nn_interpolator = senni.AdaptiveInterpolator(x,y_packed,errors_packed,epochs=60, frac=0.2, hlayer_size=2**(1+len(x[0])), test_frac=0,working_dir=working_dir,loss_func='chi2',p_drop=0.02)  # May want to adjust size of network based on data size?
+    warm = fit_warm_start_artifact(['mlp'])
+    if warm:
+        # Previous network as the starting point: its layer size, no layer-size search, smaller initial learning rate
+        arrays, meta = warm
+        weights = [arrays['W{}'.format(i)] for i in np.arange(meta['n_layers'])]
+        biases = [arrays['b{}'.format(i)] for i in np.arange(meta['n_layers'])]
+        nn_interpolator = senni.Interpolator(x,y_packed,errors_packed,epochs=60, frac=0.2, hlayer_size=len(weights[0]), test_frac=0,working_dir=working_dir,loss_func='chi2',p_drop=0.02,learning_rate=1e-3,n_threads=opts.fit_nn_n_threads,patience=opts.fit_nn_patience)
+        nn_interpolator.set_weights(weights, biases, mu_x=arrays['mu_x'], sigma_x=arrays['sigma_x'], target_mu=meta['target_mu']+meta['lnL_shift_change'], target_sigma=meta['target_sigma'])
+    elif adaptive:
+        nn_interpolator = senni.AdaptiveInterpolator(x,y_packed,errors_packed,epochs=60, frac=0.2, hlayer_size=2**(1+len(x[0])), test_frac=0,working_dir=working_dir,loss_func='chi2',p_drop=0.02,n_threads=opts.fit_nn_n_threads,patience=opts.fit_nn_patience)  # May want to adjust size of network based on data size?
     else:
-        nn_interpolator = senni.Interpolator(x,y_packed,errors_packed,epochs=100, frac=0.2, test_frac=0,working_dir=working_dir,loss_func='chi2',p_drop=0.03,regularize=False,weight_decay=1e-2)  # May want to adjust size of network based on data size?
+        nn_interpolator = senni.Interpolator(x,y_packed,errors_packed,epochs=100, frac=0.2, test_frac=0,working_dir=working_dir,loss_func='chi2',p_drop=0.03,regularize=False,weight_decay=1e-2,n_threads=opts.fit_nn_n_threads,patience=opts.fit_nn_patience)  # May want to adjust size of network based on data size?
     nn_interpolator.train()
     if opts.fit_save_gp:
         print( " Attempting to save NN fit ", opts.fit_save_gp+".network")
         nn_interpolator.save(opts.fit_save_gp+".network")
+    if opts.fit_save_artifact:
+        fit_artifact_write(fit_artifact.export_senni, opts.fit_save_artifact, nn_interpolator, meta=fit_artifact_meta())
 
     def fn_return(x):
         x_in = np.copy(x)  # need to make a copy to avoid altering input/changing response
@@ -1396,17 +1518,7 @@ def fit_nn(x,y,y_errors=None,fname_export='nn_fit',adaptive=True):
 
 
 
-def fit_rf(x,y,y_errors=None,fname_export='nn_fit'):
-#    from sklearn.ensemble import RandomForestRegressor
-    from sklearn.ensemble import ExtraTreesRegressor
-    # Instantiate model. Usually not that many structures to find, don't overcomplicate
-    #   - should scale like number of samples
-    rf = ExtraTreesRegressor(n_estimators=100, verbose=True,n_jobs=-1) # no more than 5% of samples in a leaf
-    if y_errors is None:
-        rf.fit(x,y)
-    else:
-        rf.fit(x,y,sample_weight=1./y_errors**2)
-
+def rf_protected_predict(rf):
     ### reject points with infinities : problems for inputs
     def fn_return(x_in,rf=rf):
         f_out = -lnL_default_large_negative*np.ones(len(x_in))
@@ -1418,6 +1530,37 @@ def fit_rf(x,y,y_errors=None,fname_export='nn_fit'):
         indx_ok = np.logical_and(indx_ok, indx_ok_size)
         f_out[indx_ok] = rf.predict(x_in[indx_ok])
         return f_out
+    return fn_return
+
+def fit_rf(x,y,y_errors=None,fname_export='nn_fit'):
+#    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.ensemble import ExtraTreesRegressor
+    # Instantiate model. Usually not that many structures to find, don't overcomplicate
+    #   - should scale like number of samples
+    warm = fit_warm_start_artifact(['forest'])
+    if warm:
+        fn_return = fit_rf_warm(x,y,y_errors,warm)
+        if fn_return:
+            return fn_return
+    rf = ExtraTreesRegressor(n_estimators=100, verbose=True,n_jobs=-1) # no more than 5% of samples in a leaf
+    if y_errors is None:
+        rf.fit(x,y)
+    else:
+        rf.fit(x,y,sample_weight=1./y_errors**2)
+
+    if opts.fit_save_artifact:
+        fit_artifact_write(fit_artifact.export_forest, opts.fit_save_artifact, rf, meta=fit_artifact_meta(), x_train=x)
+
+    use_compiled = opts.fit_rf_compiled and forest_predictor.numba_ok
+    rf_flat = None
+    if use_compiled or opts.output_acquisition:
+        rf_flat = ForestPredictor.from_sklearn(rf)
+    if use_compiled:
+        fn_return = rf_protected_predict(rf_flat)
+    else:
+        fn_return = rf_protected_predict(rf)
+    if opts.output_acquisition:
+        fn_return.predict_std = rf_flat.predict_std   # uncertainty: spread of the trees
 #    fn_return = lambda x_in: rf.predict(x_in) 
 
     print( " Demonstrating RF")   # debugging
@@ -1425,6 +1568,35 @@ def fit_rf(x,y,y_errors=None,fname_export='nn_fit'):
     print( "    std ", np.std(residuals), np.max(y), np.max(fn_return(x)))
     return fn_return
 
+def fit_rf_warm(x,y,y_errors,warm):
+    """
+    fit_rf_warm : keep the trees of the previous (artifact) forest, add trees for the points not in its training set, and refit the
+    leaf values of every tree to all the points (see forest_predictor.warm_start_forest).  Returns None if the forest would grow
+    past --fit-warm-start-rf-max-trees: the caller then fits from scratch
+    """
+    arrays, meta = warm
+    forest_prev = {name: np.array(arrays[name]) for name in ['roots', 'feature', 'threshold', 'children_left', 'children_right', 'value']}
+    forest_prev['value'] += meta['lnL_shift_change']   # leaves no current point reaches keep their (shifted) value
+    x_prev = None
+    if 'X_train' in arrays:
+        x_prev = arrays['X_train']
+    else:
+        print(" WARNING: warm start forest has no training points; new trees use all points ")
+    forest = forest_predictor.warm_start_forest(forest_prev, x_prev, x, y, sample_weight=None if y_errors is None else 1./y_errors**2, max_trees=opts.fit_warm_start_rf_max_trees)
+    if forest is None:
+        print(" RF warm start: forest would exceed ", opts.fit_warm_start_rf_max_trees, " trees; fitting from scratch ")
+        return None
+    if opts.fit_save_artifact:
+        fit_artifact_write(fit_artifact.export_forest, opts.fit_save_artifact, forest, meta=fit_artifact_meta(), x_train=x)
+    rf_flat = ForestPredictor.from_arrays(forest)
+    fn_return = rf_protected_predict(rf_flat)
+    fn_return.predict_std = rf_flat.predict_std
+
+    print( " Demonstrating RF")   # debugging
+    residuals = fn_return(x)-y
+    print( "    std ", np.std(residuals), np.max(y), np.max(fn_return(x)))
+    return fn_return
+
 def fit_nn_rfwrapper(x,y,y_errors=None,fname_export='nn_fit'):
     from sklearn.ensemble import RandomForestRegressor
     # Instantiate model. Usually not that many structures to find, don't overcomplicate
@@ -1445,7 +1617,7 @@ def fit_nn_rfwrapper(x,y,y_errors=None,fname_export='nn_fit'):
 #    for indx in np.arange(len(x[0])):
 #        print np.min(x[:,indx]), np.max(x[:,indx]), (np.max(x[:,indx])-np.mean(x[:,indx]))/np.std(x[:,indx])
     # train first with one loss, then the next?
-    nn_interpolator = senni.Interpolator(x,y_packed,errors_packed,epochs=10, frac=0.2, test_frac=0,working_dir=working_dir,loss_func='mape')  # May want to adjust size of network based on data size?
+    nn_interpolator = senni.Interpolator(x,y_packed,errors_packed,epochs=10, frac=0.2, test_frac=0,working_dir=working_dir,loss_func='mape',n_threads=opts.fit_nn_n_threads,patience=opts.fit_nn_patience)  # May want to adjust size of network based on data size?
     nn_interpolator.train()
     nn_interpolator.loss_func='chi2'; nn_interpolator.epochs = 50
     nn_interpolator.train()
@@ -1661,7 +1833,7 @@ for item in extra_plot_coord_names:
 
 symmetry_list=None
 if not(opts.tabular_eos_file):
-    if opts.fit_method == 'quadratic' or opts.fit_method == 'polynomial':
+    if opts.fit_method == 'quadratic' or opts.fit_method == 'polynomial' or (opts.fit_benchmark_method and set(['quadratic','polynomial']) & set(opts.fit_benchmark_method)):
         symmetry_list =lalsimutils.symmetry_sign_exchange(coord_names)  # identify symmetry due to exchange
 mc_min = 1e10
 mc_max = -1
@@ -1898,8 +2070,83 @@ elif sum(indx_ok) < 5*len(X[0])**2: # and max_lnL > 30:
     indx_ok = np.ones(len(Y), dtype=bool)
 X_raw = X.copy()
 
+if opts.fit_benchmark_method:
+    from RIFT.interpolators import fit_benchmark
+    def fit_benchmark_call(method):
+        def fit_here(x,y,y_err):
+            if method == 'quadratic':
+                return fit_quadratic_alt(x,y,y_err=y_err,symmetry_list=symmetry_list,verbose=opts.verbose)
+            elif method == 'polynomial':
+                return fit_polynomial(x,y,symmetry_list=symmetry_list,y_errors=y_err)
+            elif method == 'gp':
+                return fit_gp(x,y,y_errors=y_err)
+            elif method == 'gp-local':
+                return fit_gp_local(x,y,y_errors=y_err)
+            elif method == 'gp-pool':
+                return fit_gp_pool(x,y,y_errors=y_err,n_pool=opts.pool_size)
+            elif method == 'rf':
+                return fit_rf(x,y,y_errors=y_err)
+            elif method == 'nn':
+                return fit_nn(x,y,y_errors=y_err)
+            raise ValueError(" Fit benchmark: unknown fit method " + method)
+        def fn(x,y,y_err,artifact_dir):
+            # the fit functions read these options; the artifact is queued, and written by write_artifact after the fit is timed
+            global fit_artifact_pending
+            opts_saved = (opts.fit_save_artifact, opts.fit_method)
+            opts.fit_save_artifact, opts.fit_method = artifact_dir, method
+            fit_artifact_pending = pending = []
+            try:
+                fit = fit_here(x,y,y_err)
+            finally:
+                opts.fit_save_artifact, opts.fit_method = opts_saved
+                fit_artifact_pending = None
+            def write_artifact():
+                for export_function in pending:
+                    export_function()
+            return fit, write_artifact
+        return fn
+    print(" FIT BENCHMARK: methods ", opts.fit_benchmark_method, " folds ", opts.fit_benchmark_folds)
+    X=X[indx_ok]
+    Y=Y[indx_ok] - lnL_shift
+    Y_err = Y_err[indx_ok]
+    if opts.cap_points< len(Y) and opts.cap_points> 100:
+        indx = np.random.choice(np.arange(len(Y)),size=opts.cap_points,replace=False)
+        Y=Y[indx]
+        X=X[indx]
+        Y_err=Y_err[indx]
+    fit_functions = dict([(method, fit_benchmark_call(method)) for method in opts.fit_benchmark_method])
+    fit_summary = fit_benchmark.run_benchmark(fit_functions, opts.fit_benchmark_method, X, Y, y_err=Y_err, n_folds=opts.fit_benchmark_folds,
+                                             n_procs=opts.fit_benchmark_n_procs, lnL_window=opts.fit_benchmark_lnL_window)
+    for line in fit_summary:
+        print(" Fit benchmark: ", " ".join(["{}={}".format(name, line[name]) for name in fit_benchmark.benchmark_columns]))
+    fit_benchmark.write_table(opts.fit_benchmark_output, fit_summary)
+    sys.exit(0)
+
 my_fit= None
-if not(opts.fit_load_quadratic is None):
+if opts.fit_load_artifact:
+    print(" FIT METHOD: loading fit artifact ", opts.fit_load_artifact, "; no fit performed")
+    X=X[indx_ok]
+    Y=Y[indx_ok] - lnL_shift
+    Y_err = Y_err[indx_ok]
+    dat_out_low_level_coord_names =     dat_out_low_level_coord_names[indx_ok]
+    my_fit_artifact, my_fit_artifact_meta = fit_artifact.load_fit(opts.fit_load_artifact)
+    if 'coord_names' in my_fit_artifact_meta and list(my_fit_artifact_meta['coord_names']) != list(coord_names):
+        print(" FAILED: fit artifact coordinates ", my_fit_artifact_meta['coord_names'], " do not match ", coord_names)
+        sys.exit(1)
+    # artifact values are lnL - (its lnL_shift): convert to this run's lnL_shift, as for warm starts
+    lnL_shift_change = float(my_fit_artifact_meta['lnL_shift']) - lnL_shift if 'lnL_shift' in my_fit_artifact_meta else 0.
+    if lnL_shift_change != 0:
+        print(" Fit artifact made with lnL_shift ", my_fit_artifact_meta['lnL_shift'], " not ", lnL_shift, "; offsetting fit by ", lnL_shift_change)
+    my_fit_artifact_predict = (lambda x: my_fit_artifact.predict(x) + lnL_shift_change) if lnL_shift_change != 0 else my_fit_artifact.predict
+    if isinstance(my_fit_artifact, ForestPredictor):
+        my_fit_artifact.value = my_fit_artifact.value + lnL_shift_change   # prediction is the mean of leaf values
+        my_fit = fit_with_std(rf_protected_predict(my_fit_artifact), my_fit_artifact.predict_std)
+    elif opts.protect_coordinate_conversions:
+        my_fit = lalsimutils.RangeProtectReduce( (lambda x: my_fit_artifact_predict(x) ), -np.inf)
+    else:
+        my_fit = my_fit_artifact_predict
+    print(" Fit artifact: std ", np.std(Y - my_fit(X)))
+elif not(opts.fit_load_quadratic is None):
     print("FIT METHOD IS STORED QUADRATIC; no data used! ")
     my_fit = fit_quadratic_stored(opts.fit_load_quadratic, opts.fit_load_quadratic_path)
 elif opts.fit_method == "quadratic":
@@ -2001,6 +2248,21 @@ elif opts.fit_method == 'gp-pool':
     if opts.pool_size == None:
         opts.pool_size = np.max([2,np.round(4000/len(X))])  # pick a pool size that has no more than 4000 members per pool
     my_fit = fit_gp_pool(X,Y,y_errors=Y_err,n_pool=opts.pool_size)
+elif opts.fit_method == 'gp-local':
+    print(" FIT METHOD ", opts.fit_method, " IS GP (local experts) ")
+    X=X[indx_ok]
+    Y=Y[indx_ok] - lnL_shift
+    Y_err = Y_err[indx_ok]
+    dat_out_low_level_coord_names =     dat_out_low_level_coord_names[indx_ok]
+    # Cap the total number of points retained, AFTER the threshold cut
+    if opts.cap_points< len(Y) and opts.cap_points> 100:
+        n_keep = opts.cap_points
+        indx = np.random.choice(np.arange(len(Y)),size=n_keep,replace=False)
+        Y=Y[indx]
+        X=X[indx]
+        Y_err=Y_err[indx]
+        dat_out_low_level_coord_names = dat_out_low_level_coord_names[indx]
+    my_fit = fit_gp_local(X,Y,y_errors=Y_err)
 elif opts.fit_method == 'gp-torch':
     print( " FIT METHOD ", opts.fit_method, " IS gpytorch ")
     # NO data truncation for NN needed?  To be *consistent*, have the code function the same way as the others
@@ -2174,10 +2436,10 @@ if not no_plots:
 ### Coordinate conversion tool
 ###
 if not opts.using_eos:
- def convert_coords(x_in):
-    return lalsimutils.convert_waveform_coordinates(x_in, coord_names=coord_names,low_level_coord_names=low_level_coord_names,source_redshift=source_redshift,enforce_kerr=opts.downselect_enforce_kerr)
+ def convert_coords(x_in,x_out=None):
+    return lalsimutils.convert_waveform_coordinates(x_in, coord_names=coord_names,low_level_coord_names=low_level_coord_names,source_redshift=source_redshift,enforce_kerr=opts.downselect_enforce_kerr,x_out=x_out)
 else:
- def convert_coords(x_in):
+ def convert_coords(x_in,x_out=None):
     x_out = lalsimutils.convert_waveform_coordinates_with_eos(x_in, coord_names=coord_names,low_level_coord_names=low_level_coord_names,eos_class=my_eos,no_matter1=opts.no_matter1, no_matter2=opts.no_matter2,source_redshift=source_redshift,enforce_kerr=opts.downselect_enforce_kerr)
     return x_out
 
@@ -2384,124 +2646,70 @@ def my_log_prior_scale(X):
 def my_prior_scale(X):
     return np.ones(len(X))
 
-if len(low_level_coord_names) ==1:
-    def likelihood_function(x):  
-        if isinstance(x,float):
-            return np.exp(my_fit([x]))*my_prior_scale([x])
-        else:
-#            return np.exp(my_fit(convert_coords(np.array([x],dtype=internal_dtype).T) ))
-            return np.exp(my_fit(convert_coords(np.c_[x])))*my_prior_scale(np.c_[x])
-    def log_likelihood_function(x):  
-        if isinstance(x,float):
-            return my_fit([x])+ my_log_prior_scale([x])
-        else:
-#            return np.exp(my_fit(convert_coords(np.array([x],dtype=internal_dtype).T) ))
-            return my_fit(convert_coords(np.c_[x])) + my_log_prior_scale(np.c_[x])
-if len(low_level_coord_names) ==2:
-    def likelihood_function(x,y):  
-        if isinstance(x,float):
-            return np.exp(my_fit([x,y]))*my_prior_scale([x,y])
-        else:
-            return np.exp(my_fit(convert_coords(np.c_[x,y])))*my_prior_scale(np.c_[x,y])
-    def log_likelihood_function(x,y):  
-        if isinstance(x,float):
-            return my_fit([x,y])+ my_log_prior_scale(np.c_[x,y])
-        else:
-            return my_fit(convert_coords(np.c_[x,y]))+ my_log_prior_scale(np.c_[x,y])
-if len(low_level_coord_names) ==3:
-    def likelihood_function(x,y,z):  
-        if isinstance(x,float):
-            return np.exp(my_fit([x,y,z]))*my_prior_scale([x,y,z])
-        else:
-#            return np.exp(my_fit(convert_coords(np.array([x,y,z],dtype=internal_dtype).T)))
-            return np.exp(my_fit(convert_coords(np.c_[x,y,z])))* my_prior_scale(np.c_[x,y,z])
-    def log_likelihood_function(x,y,z):  
-        if isinstance(x,float):
-            return my_fit([x,y,z]) + my_log_prior_scale(np.c_[x,y,z])
-        else:
-#            return np.exp(my_fit(convert_coords(np.array([x,y,z],dtype=internal_dtype).T)))
-            return my_fit(convert_coords(np.c_[x,y,z]))+my_log_prior_scale(np.c_[x,y,z])
-if len(low_level_coord_names) ==4:
-    def likelihood_function(x,y,z,a):  
-        if isinstance(x,float):
-            return np.exp(my_fit([x,y,z,a]))*my_prior_scale([x,y,z,a])
-        else:
-            return np.exp(my_fit(convert_coords(np.c_[x,y,z,a])))*my_prior_scale(np.c_[x,y,z,a])
-    def log_likelihood_function(x,y,z,a):  
-        if isinstance(x,float):
-            return my_fit([x,y,z,a])+ +my_log_prior_scale([x,y,z,a])
-        else:
-            return my_fit(convert_coords(np.c_[x,y,z,a]))+ my_log_prior_scale(np.c_[x,y,z,a])
-if len(low_level_coord_names) ==5:
-    def likelihood_function(x,y,z,a,b):  
-        if isinstance(x,float):
-            return np.exp(my_fit([x,y,z,a,b]))*my_prior_scale([x,y,z,a,b])
-        else:
-#            return np.exp(my_fit(convert_coords(np.array([x,y,z,a,b],dtype=internal_dtype).T)))
-            return np.exp(my_fit(convert_coords(np.c_[x,y,z,a,b])))*my_prior_scale(np.c_[x,y,z,a,b])
-    def log_likelihood_function(x,y,z,a,b):  
-        if isinstance(x,float):
-            return my_fit([x,y,z,a,b])+ my_log_prior_scale([x,y,z,a,b])
-        else:
-#            return np.exp(my_fit(convert_coords(np.array([x,y,z,a,b],dtype=internal_dtype).T)))
-            return my_fit(convert_coords(np.c_[x,y,z,a,b]))+ my_log_prior_scale(np.c_[x,y,z,a,b])
-if len(low_level_coord_names) ==6:
-    def likelihood_function(x,y,z,a,b,c):  
-        if isinstance(x,float):
-            return np.exp(my_fit([x,y,z,a,b,c]))*my_prior_scale([x,y,z,a,b,c])
-        else:
-#            return np.exp(my_fit(convert_coords(np.array([x,y,z,a,b,c],dtype=internal_dtype).T)))
-            return np.exp(my_fit(convert_coords(np.c_[x,y,z,a,b,c])))*my_prior_scale(np.c_[x,y,z,a,b,c])
-    def log_likelihood_function(x,y,z,a,b,c):  
-        if isinstance(x,float):
-            return my_fit([x,y,z,a,b,c])+ my_log_prior_scale([x,y,z,a,b,c])
-        else:
-#            return np.exp(my_fit(convert_coords(np.array([x,y,z,a,b,c],dtype=internal_dtype).T)))
-            return my_fit(convert_coords(np.c_[x,y,z,a,b,c]))+ my_log_prior_scale(np.c_[x,y,z,a,b,c])
-if len(low_level_coord_names) ==7:
-    def likelihood_function(x,y,z,a,b,c,d):  
-        if isinstance(x,float):
-            return np.exp(my_fit([x,y,z,a,b,c,d]))*my_prior_scale([x,y,z,a,b,c,d])
-        else:
-            return np.exp(my_fit(convert_coords(np.c_[x,y,z,a,b,c,d])))*my_prior_scale(np.c_[x,y,z,a,b,c,d])
-    def log_likelihood_function(x,y,z,a,b,c,d):  
-        if isinstance(x,float):
-            return my_fit([x,y,z,a,b,c,d])+ my_log_prior_scale([x,y,z,a,b,c,d])
-        else:
-            return my_fit(convert_coords(np.c_[x,y,z,a,b,c,d]))+ my_log_prior_scale(np.c_[x,y,z,a,b,c,d])
-if len(low_level_coord_names) ==8:
-    def likelihood_function(x,y,z,a,b,c,d,e):  
-        if isinstance(x,float):
-            return np.exp(my_fit([x,y,z,a,b,c,d,e]))*my_prior_scale([x,y,z,a,b,c,d,e])
-        else:
-            return np.exp(my_fit(convert_coords(np.c_[x,y,z,a,b,c,d,e])))*my_prior_scale(np.c_[x,y,z,a,b,c,d,e])
-    def log_likelihood_function(x,y,z,a,b,c,d,e):  
-        if isinstance(x,float):
-            return my_fit([x,y,z,a,b,c,d,e])+ my_log_prior_scale([x,y,z,a,b,c,d,e])
-        else:
-            return my_fit(convert_coords(np.c_[x,y,z,a,b,c,d,e]))+ my_log_prior_scale(np.c_[x,y,z,a,b,c,d,e])
-if len(low_level_coord_names) ==9:
-    def likelihood_function(x,y,z,a,b,c,d,e,f):  
-        if isinstance(x,float):
-            return np.exp(my_fit([x,y,z,a,b,c,d,e,f]))*my_prior_scale([x,y,z,a,b,c,d,e,f])
-        else:
-            return np.exp(my_fit(convert_coords(np.c_[x,y,z,a,b,c,d,e,f]))) *my_prior_scale(np.c_[x,y,z,a,b,c,d,e,f])
-    def log_likelihood_function(x,y,z,a,b,c,d,e,f):
-        if isinstance(x,float):
-            return my_fit([x,y,z,a,b,c,d,e,f]) + my_log_prior_scale([x,y,z,a,b,c,d,e,f])
-        else:
-            return my_fit(convert_coords(np.c_[x,y,z,a,b,c,d,e,f]))+ my_log_prior_scale(np.c_[x,y,z,a,b,c,d,e,f])
-if len(low_level_coord_names) ==10:
-    def likelihood_function(x,y,z,a,b,c,d,e,f,g):  
-        if isinstance(x,float):
-            return np.exp(my_fit([x,y,z,a,b,c,d,e,f,g]))*my_prior_scale([x,y,z,a,b,c,d,e,f,g])
-        else:
-            return np.exp(my_fit(convert_coords(np.c_[x,y,z,a,b,c,d,e,f,g])))*my_prior_scale(np.c_[x,y,z,a,b,c,d,e,f,g])
-    def log_likelihood_function(x,y,z,a,b,c,d,e,f,g):
-        if isinstance(x,float):
-            return my_fit([x,y,z,a,b,c,d,e,f,g])+ my_log_prior_scale([x,y,z,a,b,c,d,e,f,g])
-        else:
-            return my_fit(convert_coords(np.c_[x,y,z,a,b,c,d,e,f,g]))+ my_log_prior_scale(np.c_[x,y,z,a,b,c,d,e,f,g])
+class fit_likelihood_evaluator(object):
+    """
+    Evaluates the fit (times the prior rescaling) at arrays of the integration variables, for any number of them.
+    Samples are packed into a preallocated (n, d) buffer and converted to fit coordinates in a second one, both reused
+    for every chunk of the same size, rather than allocating np.c_[...] and coordinate arrays for every call.
+    If use_float32, the fit is evaluated on a float32 copy (tree/NN fits convert to float32 internally anyways)
+    """
+    def __init__(self, fit, convert=None, use_float32=False, n_cache=2):
+        self.fit = fit
+        self.convert = convert
+        self.use_float32 = use_float32
+        self.n_cache = n_cache
+        self.buffers = {}
+
+    def get_buffers(self, n, n_params):
+        if not (n in self.buffers):
+            if len(self.buffers) >= self.n_cache:
+                self.buffers.pop(next(iter(self.buffers)))  # oldest
+            x_in = np.empty((n, n_params))
+            x_fit = x_in
+            if self.convert:
+                x_fit = np.empty((n, len(coord_names)))
+            x_fit32 = None
+            if self.use_float32:
+                x_fit32 = np.empty(x_fit.shape, dtype=np.float32)
+            self.buffers[n] = (x_in, x_fit, x_fit32)
+        return self.buffers[n]
+
+    def fit_lnL(self, *args):
+        x_in, x_fit, x_fit32 = self.get_buffers(len(args[0]), len(args))
+        for indx, x in enumerate(args):
+            x_in[:,indx] = x
+        if self.convert:
+            self.convert(x_in, x_out=x_fit)
+        if x_fit32 is not None:
+            x_fit32[:] = x_fit
+            x_fit = x_fit32
+        return np.asarray(self.fit(x_fit), dtype=np.float64), x_in
+
+    def likelihood(self, *args):
+        if isinstance(args[0],float):
+            return np.exp(self.fit(list(args)))*my_prior_scale(list(args))
+        lnL, x_in = self.fit_lnL(*args)
+        L = np.exp(lnL, out=lnL)
+        L *= my_prior_scale(x_in)
+        return L
+
+    def log_likelihood(self, *args):
+        if isinstance(args[0],float):
+            return self.fit(list(args))+ my_log_prior_scale(list(args))
+        lnL, x_in = self.fit_lnL(*args)
+        lnL += my_log_prior_scale(x_in)
+        return lnL
+
+# Coordinate conversion can be skipped if we fit in the integration coordinates
+convert_coords_fit = convert_coords
+if coord_names == low_level_coord_names and not(opts.using_eos) and not(source_redshift):
+    convert_coords_fit = None
+fit_float32 = opts.fit_evaluate_float32 and opts.fit_method in ['rf', 'nn', 'nn_rfwrapper']
+if opts.fit_evaluate_float32 and not(fit_float32):
+    print(" --fit-evaluate-float32 ignored for fit method ", opts.fit_method)
+my_fit_evaluator = fit_likelihood_evaluator(my_fit, convert=convert_coords_fit, use_float32=fit_float32)
+likelihood_function = my_fit_evaluator.likelihood
+log_likelihood_function = my_fit_evaluator.log_likelihood
 
 ###
 ### Prior reweight functions
@@ -2609,6 +2817,12 @@ extra_args.update({
 })
 if opts.sampler_method == 'NFlow':
     extra_args['n_adapt'] = 10  # reduce this?
+if use_portfolio and opts.sampler_portfolio_cost_aware:
+    extra_args['portfolio_cost_aware'] = True
+if opts.sampler_checkpoint_file:
+    extra_args['checkpoint_file'] = opts.sampler_checkpoint_file
+    if use_portfolio or not( opts.sampler_method == 'AV' or (opts.sampler_method == "adaptive_cartesian_gpu" and opts.internal_use_lnL)):
+        print(" WARNING: --sampler-checkpoint-file is ignored by sampler ", "portfolio" if use_portfolio else opts.sampler_method, " (only AV, or adaptive_cartesian_gpu with --internal-use-lnL, checkpoint) ")
 tempering_adapt=True
 if opts.force_no_adapt:   
     tempering_adapt=False
@@ -2655,7 +2869,47 @@ if sampler_oracle:  # NON-PORTFOLIO SCENARIO TARGET
 
     
 
-res, var, neff, dict_return = sampler.integrate(fn_passed, *low_level_coord_names,  verbose=True,nmax=int(opts.n_max),n=n_step,neff=opts.n_eff, save_intg=True,tempering_adapt=tempering_adapt, floor_level=1e-3,igrand_threshold_p=1e-3,convergence_tests=test_converged,tempering_exp=my_exp,no_protect_names=True, **extra_args)  # weight ecponent needs better choice. We are using arbitrary-name functions
+if opts.sampler_n_chains < 2:
+  res, var, neff, dict_return = sampler.integrate(fn_passed, *low_level_coord_names,  verbose=True,nmax=int(opts.n_max),n=n_step,neff=opts.n_eff, save_intg=True,tempering_adapt=tempering_adapt, floor_level=1e-3,igrand_threshold_p=1e-3,convergence_tests=test_converged,tempering_exp=my_exp,no_protect_names=True, **extra_args)  # weight ecponent needs better choice. We are using arbitrary-name functions
+else:
+  # Independent chains, forked after the fit and sampler setup: each child shares the fit read-only (copy on write)
+  # Each chain has its own seed (and checkpoint file); results are merged as if one run had drawn all the samples
+  chain_seeds = np.random.randint(0, 2**31-1, size=opts.sampler_n_chains)
+  def integrate_chain(indx_chain):
+    np.random.seed(chain_seeds[indx_chain])
+    extra_args_chain = dict(extra_args)
+    if 'checkpoint_file' in extra_args_chain:
+        extra_args_chain['checkpoint_file'] = statutils.chain_checkpoint_file(extra_args_chain['checkpoint_file'], indx_chain)
+    res_c, var_c, neff_c, dict_return_c = sampler.integrate(fn_passed, *low_level_coord_names,  verbose=(indx_chain==0),nmax=int(opts.n_max),n=n_step,neff=opts.n_eff, save_intg=True,tempering_adapt=tempering_adapt, floor_level=1e-3,igrand_threshold_p=1e-3,convergence_tests=test_converged,tempering_exp=my_exp,no_protect_names=True, **extra_args_chain)
+    if dict_return_c:
+        dict_return_c = {k:(dict(v) if isinstance(v,dict) else v) for k,v in dict_return_c.items() if not callable(v)}  # must be picklable, to return from the pool (no defaultdict factories)
+    return res_c, var_c, neff_c, dict_return_c, {k: sampler.identity_convert(v) if hasattr(sampler,'identity_convert') else v for k,v in sampler._rvs.items()}, sampler.ntotal
+  print(" Sampler: running ", opts.sampler_n_chains, " chains ")
+  import multiprocessing
+  with multiprocessing.get_context('fork').Pool(opts.sampler_n_chains) as chain_pool:
+      chain_results = chain_pool.map(integrate_chain, range(opts.sampler_n_chains))
+  # Merge: pooled samples all carry importance weights L p/ps, so the pooled evidence is the mean weighted by the number of
+  # samples each chain *drew* (not the number it kept: the retained _rvs are thresholded, e.g. igrand_threshold_p)
+  n_chain_draws = np.array([r[5] for r in chain_results],dtype=float)
+  res_chains = np.array([r[0] for r in chain_results])
+  var_chains = np.array([r[1] for r in chain_results])
+  res, var = statutils.merge_chain_estimates(res_chains, var_chains, n_chain_draws, use_lnL=opts.internal_use_lnL)
+  if opts.internal_use_lnL:
+      # integrator returned ln I and ln var(I)
+      lnZ_chains, rel_err_chains = res_chains, np.exp(0.5*var_chains - res_chains)
+      lnZ_merged, rel_err_merged = res, np.exp(0.5*var - res)
+  else:
+      lnZ_chains, rel_err_chains = np.log(res_chains), np.sqrt(var_chains)/res_chains
+      lnZ_merged, rel_err_merged = np.log(res), np.sqrt(var)/res
+  neff = np.sum([r[2] for r in chain_results])
+  dict_return = chain_results[0][3]
+  n_chain_samples = np.array([len(r[4][low_level_coord_names[0]]) for r in chain_results])
+  for indx_chain, r in enumerate(chain_results):
+      print(" Chain ", indx_chain, " lnZ ", lnZ_chains[indx_chain], " sigma/Z ", rel_err_chains[indx_chain], " neff ", r[2], " ndraw ", int(n_chain_draws[indx_chain]), " npts ", n_chain_samples[indx_chain])
+  print(" Chains merged: lnZ ", lnZ_merged, " sigma/Z ", rel_err_merged, " neff ", neff)
+  sampler._rvs = statutils.merge_chain_samples([r[4] for r in chain_results], n_chain_samples)
+if dict_return and 'portfolio_timing' in dict_return:
+    print(" PORTFOLIO timing (per member) ", dict_return['portfolio_timing'])
 
 
 # Test n_eff threshold
@@ -2859,7 +3113,13 @@ if opts.pseudo_gaussian_mass_prior:
     # Extract m1 and m2, i solar mass units
     m1 = np.zeros(len(weights))
     m2 = np.zeros(len(weights))
-    for indx in np.arange(len(weights)):
+    if lalsimutils.vector_coordinates_supported(['m1','m2'], low_level_coord_names):
+        # Do not bother to scale by solar masses, only to undo it later
+        samples_state = lalsimutils.vector_assign_params(np.array([samples[p] for p in low_level_coord_names]).T, low_level_coord_names)
+        m1[:] = samples_state['m1']
+        m2[:] = samples_state['m2']
+    else:
+     for indx in np.arange(len(weights)):
         P=lalsimutils.ChooseWaveformParams()
         for indx_name in np.arange(len(low_level_coord_names)):
             p = low_level_coord_names[indx_name]
@@ -3108,14 +3368,30 @@ if opts.internal_bound_factor_if_n_eff_small and neff <opts.n_output_samples  an
     indx_list = np.random.choice(indx_list, my_size_out, replace=False)
 if opts.verbose:
     print(" output size: truncating based on n_eff to N=", len(indx_list))
+indx_list_acq = np.array([], dtype=int)
+if opts.output_acquisition:
+    if not(hasattr(my_fit, 'predict_std')):
+        print(" WARNING: --output-acquisition: fit method ", opts.fit_method, " has no uncertainty estimate; no acquisition output ")
+    else:
+        # Acquisition: among the posterior draws (already ~ posterior), prefer points where the fit is uncertain.  Written to their own file
+        x_cand = np.array([samples[p][indx_list] for p in low_level_coord_names]).T
+        if convert_coords_fit:
+            x_cand = convert_coords_fit(x_cand)
+        var_cand = np.nan_to_num(np.asarray(my_fit.predict_std(x_cand), dtype=float)**2)
+        n_acq = int(np.min([opts.output_acquisition_fraction*opts.n_output_samples, np.sum(var_cand > 0)]))
+        if n_acq > 0:
+            indx_acq = np.random.choice(len(indx_list), n_acq, p=var_cand/np.sum(var_cand), replace=False)
+            print(" Acquisition: ", n_acq, " points by fit variance; mean fit std (selected, all candidates) ", np.mean(np.sqrt(var_cand[indx_acq])), np.mean(np.sqrt(var_cand)))
+            indx_list_acq = indx_list[indx_acq]
 lnL_list = []
 P_list =[]
+is_acq_list = []   # --output-acquisition points are converted in the same loop, then split off
 P = lalsimutils.ChooseWaveformParams()
 P.approx = lalsim.GetApproximantFromString(opts.approx_output)
 #P.approx = lalsim.SEOBNRv2  # DEFAULT
 P.fmin = opts.fmin # DEFAULT
 P.fref = opts.fref
-for indx_here in indx_list:
+for indx_here, is_acq in zip(np.concatenate([indx_list, indx_list_acq]), np.arange(len(indx_list)+len(indx_list_acq)) >= len(indx_list)):
         line = [samples[p][indx_here] for p in low_level_coord_names]
         Pgrid = P.manual_copy()
         Pgrid.fref = opts.fref  # Just to make SURE
@@ -3181,6 +3457,7 @@ for indx_here in indx_list:
         #         print " Skipping " , line
         #         include_item =False
         if include_item:
+         is_acq_list.append(is_acq)
          if Pgrid.m2 <= Pgrid.m1:  # do not add grid elements with m2> m1, to avoid possible code pathologies !
             P_list.append(Pgrid)
             if not(opts.internal_use_lnL):
@@ -3198,6 +3475,14 @@ for indx_here in indx_list:
             True
 
 
+P_list_acq = [Pgrid for Pgrid, is_acq in zip(P_list, is_acq_list) if is_acq]
+lnL_list = [lnL for lnL, is_acq in zip(lnL_list, is_acq_list) if not(is_acq)]
+P_list = [Pgrid for Pgrid, is_acq in zip(P_list, is_acq_list) if not(is_acq)]
+if opts.output_acquisition and P_list_acq:
+    fname_acq = opts.fname_output_acquisition if opts.fname_output_acquisition else opts.fname_output_samples+"-acquisition"
+    print(" Acquisition: writing ", len(P_list_acq), " points to ", fname_acq)
+    lalsimutils.ChooseWaveformParams_array_to_xml(P_list_acq,fname=fname_acq,fref=P.fref)
+
 # FAILURE MODE: no exportable data
 if len(P_list) <1:
     raise Exception(" Run failure: no export data! ")
@@ -0,0 +1,130 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   EOBTidalExternalC, in-process generation (EOBRun_module, the default when it imports):
+#     - the WaveformModeCatalog modes for a fixed BNS agree with h_lm = nu A_lm (M/d) exp(-i (m pi/2 + phi_lm)) built directly from
+#       EOBRunPy's amplitudes and phases (the convention of lalsimutils.hlmoft): checks the m pi/2 phase shift and the odd-m amplitude
+#       rescaling of the hlm_insp.dat layout, without maximizing over phase; (l,-m) modes are (-1)^l h_lm^*
+#     - generate_hlm_data_raw_list with a worker pool gives the same mode data as serial generation, and PrecomputeLikelihoodTerms
+#       with mode data generated ahead by the pool (GenerateExternalEOBModeData; ILE --use-external-EOB-n-procs) gives the same terms
+#   If the external code (TEOBResumS.x; EOB_C_BASE, EOB_C_ARCHIVE) is also available, the modes from both paths agree.
+#   Skipped unless EOBRun_module is available.
+#
+# EXAMPLE
+#    python test_EOBTidalExternalC_in_process.py --as-test
+
+import sys
+import numpy as np
+import lal
+import lalsimulation as lalsim
+import RIFT.lalsimutils as lsu
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--lmax",default=3,type=int)
+parser.add_option("--fmin",default=40,type=float)
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+try:
+    import RIFT.physics.EOBTidalExternalC as eobwf
+except Exception as e:
+    print(" EOBTidalExternalC not available, skipping: ", e)
+    sys.exit(0)
+if not(eobwf.EOBRun_ok):
+    print(" EOBRun_module not available, skipping ")
+    sys.exit(0)
+import EOBRun_module
+from RIFT.likelihood import factored_likelihood
+
+T_window = 32.
+P = lsu.ChooseWaveformParams(m1=1.5*lal.MSUN_SI, m2=1.3*lal.MSUN_SI, s1z=0.05, s2z=-0.02, lambda1=400, lambda2=500,
+                             fmin=opts.fmin, deltaT=1./16384, deltaF=1./T_window, dist=100e6*lal.PC_SI)
+npts = int(T_window/P.deltaT)
+
+def overlap(h_a, h_b, deltaT):
+    """
+    Complex overlap, maximized over a relative time shift only (not over phase; to a small fraction of a sample), and the amplitude ratio |h_b|/|h_a|
+    """
+    h_a_f, h_b_f = np.fft.fft(h_a), np.fft.fft(h_b)
+    freqs = np.fft.fftfreq(len(h_a), d=deltaT)
+    z = np.fft.ifft(h_a_f*np.conj(h_b_f))
+    tau_vals = (np.fft.fftfreq(len(h_a))*len(h_a))[np.argmax(np.abs(z))]*deltaT + np.linspace(-1, 1, 201)*deltaT
+    z_vals = [np.sum(h_a_f*np.conj(h_b_f)*np.exp(2j*np.pi*freqs*tau))/len(h_a) for tau in tau_vals]
+    norm = np.sqrt(np.vdot(h_a, h_a).real*np.vdot(h_b, h_b).real)
+    return z_vals[np.argmax(np.abs(z_vals))]/norm, np.sqrt(np.vdot(h_b, h_b).real/np.vdot(h_a, h_a).real)
+
+checks = {}
+
+# In-process catalog vs h_lm built directly from EOBRunPy
+wfP = eobwf.WaveformModeCatalog(P, lmax=opts.lmax)
+hlmT = wfP.hlmoft(force_T=T_window, deltaT=P.deltaT, taper_start_time=False)
+modes_used = [mode for mode in eobwf.internal_ModesAvailable if mode[1]>0 and mode[0]<=opts.lmax]
+pars = {'M': (P.m1+P.m2)/lal.MSUN_SI, 'q': P.m1/P.m2, 'LambdaAl2': P.lambda1, 'LambdaBl2': P.lambda2,
+        'chi1x': 0., 'chi1y': 0., 'chi1z': P.s1z, 'chi2x': 0., 'chi2y': 0., 'chi2z': P.s2z,
+        'domain': 0, 'arg_out': "yes", 'use_mode_lm': lsu.modes_to_k(modes_used), 'srate_interp': 1./P.deltaT,
+        'use_geometric_units': "no", 'initial_frequency': P.fmin, 'interp_uniform_grid': "yes", 'distance': 1., 'inclination': 0., 'output_hpc': "no"}
+hlm_out = EOBRun_module.EOBRunPy(pars)[3]
+nu = lsu.symRatio(P.m1, P.m2)
+m_total_s = lsu.MsunInSec*(P.m1+P.m2)/lal.MSUN_SI
+for mode, k in zip(modes_used, lsu.modes_to_k(modes_used)):
+    amp, phase = np.array(hlm_out[str(k)][0]), np.array(hlm_out[str(k)][1])
+    h_ref = np.zeros(npts, dtype=complex)
+    n_here = np.min([npts, len(amp)])
+    h_ref[:n_here] = (nu*amp*m_total_s/(P.dist/lal.C_SI)*np.exp(-1j*(mode[1]*np.pi/2 + phase)))[-n_here:]
+    z, amp_ratio = overlap(h_ref, hlmT[mode].data.data, P.deltaT)
+    print(" Mode ", mode, " match ", np.abs(z), " phase offset ", np.angle(z), " amplitude ratio ", amp_ratio)
+    checks['EOBRunPy convention, mode {}'.format(mode)] = np.abs(z) > 0.99 and np.abs(np.angle(z)) < 0.3 and np.abs(amp_ratio-1) < 0.01
+    mode_conj = (mode[0], -mode[1])
+    checks['reflection symmetry, mode {}'.format(mode_conj)] = np.max(np.abs(hlmT[mode_conj].data.data - (-1)**mode[0]*np.conj(hlmT[mode].data.data))) <= 1e-10*np.max(np.abs(hlmT[mode].data.data))
+
+# Worker pool vs serial
+P_list = []
+for indx in range(3):
+    P_here = P.manual_copy()
+    P_here.m1 *= 1 + 0.01*indx
+    P_list.append(P_here)
+hlm_data_serial = eobwf.generate_hlm_data_raw_list(P_list, n_procs=1)
+hlm_data_pool = eobwf.generate_hlm_data_raw_list(P_list, n_procs=3)
+checks['pool agrees with serial'] = all([np.array_equal(a, b) for a, b in zip(hlm_data_serial, hlm_data_pool)])
+rng = np.random.RandomState(0)
+data_dict = {}
+psd_dict = {}
+for det in ['H1', 'L1']:
+    data_dict[det] = lal.CreateCOMPLEX16FrequencySeries("h(f)", lal.LIGOTimeGPS(1000000000.), 0., 1./T_window, lsu.lsu_HertzUnit, npts)
+    data_dict[det].data.data = 1e-23*(rng.randn(npts) + 1j*rng.randn(npts))
+    psd_dict[det] = lalsim.SimNoisePSDaLIGOZeroDetHighPower
+terms = {}
+EOB_hlm_data_raw_list = factored_likelihood.GenerateExternalEOBModeData(P_list[:2], n_procs=2)
+for label, EOB_hlm_data_raw in [('generated in the precompute', None), ('generated ahead by the pool', EOB_hlm_data_raw_list[0])]:
+    rholms_intp, crossTerms, crossTermsV, rholms, guess_snr, rest = factored_likelihood.PrecomputeLikelihoodTerms(
+        1000000000., 0.05, P_list[0].manual_copy(), data_dict, psd_dict, opts.lmax, 2048., analyticPSD_Q=True, verbose=False, quiet=True,
+        use_external_EOB=True, EOB_hlm_data_raw=EOB_hlm_data_raw)
+    terms[label] = (crossTerms, rholms)
+same = True
+for det in data_dict:
+    same = same and all([terms['generated ahead by the pool'][0][det][key] == terms['generated in the precompute'][0][det][key] for key in terms['generated in the precompute'][0][det]])
+    same = same and all([np.array_equal(terms['generated ahead by the pool'][1][det][mode].data.data, terms['generated in the precompute'][1][det][mode].data.data) for mode in terms['generated in the precompute'][1][det]])
+checks['precompute with pool-generated mode data'] = same
+
+# External executable vs in-process, if available
+if eobwf.dirBaseFiles and eobwf.dirBaseFilesArchive:
+    hlms = {}
+    for use_external in [True, False]:
+        hlms[use_external] = eobwf.WaveformModeCatalog(P, lmax=opts.lmax, use_external=use_external).hlmoff(force_T=T_window, deltaT=P.deltaT)
+    for mode in sorted(hlms[True].keys()):
+        if not(mode in hlms[False]):
+            checks['external vs in-process, mode {}'.format(mode)] = False
+            continue
+        z, amp_ratio = overlap(hlms[True][mode].data.data, hlms[False][mode].data.data, P.deltaT)
+        print(" Mode ", mode, " external vs in-process: match ", np.abs(z), " amplitude ratio ", amp_ratio)
+        checks['external vs in-process, mode {}'.format(mode)] = np.abs(z) > 0.99 and np.abs(amp_ratio-1) < 0.01
+else:
+    print(" External code (EOB_C_BASE, EOB_C_ARCHIVE) not configured, skipping the comparison with TEOBResumS.x ")
+
+for name in checks:
+    print(" ", name, checks[name])
+
+if opts.as_test:
+    for name in checks:
+        assert checks[name], name
@@ -0,0 +1,89 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   ModePruningCache (ILE --mode-pruning-cache):
+#     - schedule: all modes while learning and at each revalidation, the learned modes otherwise; modes are only ever added
+#     - PrecomputeLikelihoodTerms with the cache generates only the learned modes after learning: never fewer than pruning each
+#       point separately would keep, and the same likelihood wherever both keep the same modes
+#   Reports precompute timings.
+#
+# EXAMPLE
+#    python test_ModePruningCache.py --as-test
+
+import time
+import numpy as np
+import lal
+import lalsimulation as lalsim
+import RIFT.lalsimutils as lsu
+from RIFT.likelihood import factored_likelihood
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--Lmax",default=4,type=int)
+parser.add_option("--approx",default="IMRPhenomXHM")
+parser.add_option("--ignore-threshold",default=0.05,type=float)
+parser.add_option("--n-points",default=8,type=int)
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+checks = {}
+
+# schedule
+cache = factored_likelihood.ModePruningCache(n_learn=2, n_revalidate=2)
+modes_all = [(2,2), (2,1), (3,3), (4,4)]
+schedule = []
+for worthwhile in [[(2,2)], [(2,2), (3,3)], None, None, [(2,2), (4,4)], None, None, [(2,2)]]:
+    modes_here = cache.modes_to_generate()
+    schedule.append(None if modes_here is None else sorted(modes_here))
+    if modes_here is None:
+        cache.update(worthwhile, modes_all)
+print(" Schedule ", schedule)
+checks['schedule'] = schedule == [None, None, [(2,2), (3,3)], [(2,2), (3,3)], None, [(2,2), (3,3), (4,4)], [(2,2), (3,3), (4,4)], None]
+checks['modes never removed'] = cache.modes == set([(2,2), (3,3), (4,4)])
+
+# PrecomputeLikelihoodTerms, with and without the cache
+P = lsu.ChooseWaveformParams(m1=60*lal.MSUN_SI, m2=30*lal.MSUN_SI, approx=lalsim.GetApproximantFromString(opts.approx), fmin=10., deltaT=1./1024, deltaF=1./16,
+                             dist=2000e6*lal.PC_SI, tref=1000000000., phi=1., theta=0.3, incl=0.5, radec=True)
+rng = np.random.RandomState(0)
+data_dict = {}
+psd_dict = {}
+for det in ['H1', 'L1', 'V1']:
+    P.detector = det
+    data_dict[det] = lsu.non_herm_hoff(P)
+    data_dict[det].data.data += 1e-24*(rng.randn(data_dict[det].data.length) + 1j*rng.randn(data_dict[det].data.length))
+    psd_dict[det] = lalsim.SimNoisePSDaLIGOZeroDetHighPower
+Q = lsu.ChooseWaveformParams(dist=500e6*lal.PC_SI, tref=P.tref+0.0013, phi=1.1, theta=0.25, incl=0.6, psi=0.3, phiref=0.4)
+
+lnL = {}
+n_modes = {}
+t_total = {}
+cache = factored_likelihood.ModePruningCache(n_learn=2, n_revalidate=3)
+for label, mode_pruning_cache in [('no cache', None), ('cache', cache)]:
+    lnL[label] = []
+    n_modes[label] = []
+    t_total[label] = 0
+    for indx in range(opts.n_points):
+        P_here = P.manual_copy()
+        P_here.m1 = (55 + 2*indx)*lal.MSUN_SI
+        P_here.deltaF = data_dict['H1'].deltaF
+        t_start = time.perf_counter()
+        rholms_intp, crossTerms, crossTermsV, rholms, guess_snr, rest = factored_likelihood.PrecomputeLikelihoodTerms(
+            P.tref, 0.05, P_here, data_dict, psd_dict, opts.Lmax, 512., analyticPSD_Q=True, verbose=False, quiet=True,
+            ignore_threshold=opts.ignore_threshold, mode_pruning_cache=mode_pruning_cache)
+        t_total[label] += time.perf_counter() - t_start
+        lnL[label].append(factored_likelihood.FactoredLogLikelihood(Q, rholms, rholms_intp, crossTerms, crossTermsV, opts.Lmax))
+        n_modes[label].append(len(rholms['H1']))
+    print(" {}: precompute time {}s, modes kept {}, lnL {} ".format(label, t_total[label], n_modes[label], lnL[label]))
+print(" Learned modes ", sorted(cache.modes), " of ", len(cache.modes_all))
+
+indx_same = np.array(n_modes['cache']) == np.array(n_modes['no cache'])
+err_lnL = np.max(np.abs(np.array(lnL['cache']) - np.array(lnL['no cache']))[indx_same])/np.max(np.abs(lnL['no cache']))
+print(" lnL, with vs without cache (points with the same modes kept: {}): max relative diff {} ".format(np.sum(indx_same), err_lnL))
+checks['some modes pruned'] = len(cache.modes) < len(cache.modes_all)
+checks['never fewer modes than pruning per point'] = np.all(np.array(n_modes['cache']) >= np.array(n_modes['no cache']))
+
+if opts.as_test:
+    for name in checks:
+        print(" ", name, checks[name])
+        assert checks[name], name
+    assert err_lnL < 1e-8
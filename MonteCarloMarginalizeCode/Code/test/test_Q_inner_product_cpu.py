@@ -0,0 +1,57 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   Q_inner_product_cpu (vectorized likelihood on numpy) agrees with the original einsum over the windowed copy of Q,
+#   on the numba and numpy paths and for small chunks; windows outside Q raise ValueError.  Reports timings.
+#
+# EXAMPLE
+#    python test_Q_inner_product_cpu.py --as-test
+
+import time
+import numpy as np
+from RIFT.likelihood import Q_inner_product_cpu as qcpu
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--n-time",default=20000,type=int)
+parser.add_option("--n-lms",default=10,type=int)
+parser.add_option("--n-extrinsic",default=5000,type=int)
+parser.add_option("--window-size",default=200,type=int)
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+rng = np.random.default_rng(0)
+Q = rng.normal(size=(opts.n_time, opts.n_lms)) + 1j*rng.normal(size=(opts.n_time, opts.n_lms))
+A = rng.normal(size=(opts.n_extrinsic, opts.n_lms)) + 1j*rng.normal(size=(opts.n_extrinsic, opts.n_lms))
+start_indices = rng.integers(0, opts.n_time - opts.window_size + 1, size=opts.n_extrinsic)
+start_indices[:2] = [0, opts.n_time - opts.window_size]    # windows at both ends
+
+t_start = time.perf_counter()
+Q_windowed = Q[start_indices[:, np.newaxis] + np.arange(opts.window_size)]   # (n_extrinsic, window_size, n_lms): the original copy
+out_ref = np.einsum('il,itl->it', A, Q_windowed)
+print(" einsum over windowed copy: time ", time.perf_counter() - t_start)
+
+qcpu.Q_inner_product_cpu(Q, A[:4], start_indices[:4], opts.window_size)   # compile, if numba
+errors = {}
+for label, kwargs in [('numba', {'use_numba': True}), ('numpy', {'use_numba': False}), ('numpy chunk_size=7', {'use_numba': False, 'chunk_size': 7})]:
+    t_start = time.perf_counter()
+    out = qcpu.Q_inner_product_cpu(Q, A, start_indices, opts.window_size, **kwargs)
+    print(" {} (numba available {}): time {} ".format(label, qcpu.numba_ok, time.perf_counter() - t_start))
+    errors[label] = np.max(np.abs(out - out_ref))/np.max(np.abs(out_ref))
+
+raises = []
+for indx_bad in [-1, opts.n_time - opts.window_size + 1]:
+    try:
+        qcpu.Q_inner_product_cpu(Q, A[:1], [indx_bad], opts.window_size)
+        raises.append(False)
+    except ValueError:
+        raises.append(True)
+
+for label in errors:
+    print(" ", label, " max relative diff ", errors[label])
+print(" Out-of-range windows raise ", raises)
+
+if opts.as_test:
+    for label in errors:
+        assert errors[label] < 1e-13, label
+    assert all(raises)
@@ -0,0 +1,142 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   ROM basis likelihood (ILE --rom-use-basis):
+#     - WaveformModeCatalog.coefficients_array (many points, one EIM evaluation per surrogate) agrees with per-mode EIM coefficients,
+#       with reflection-symmetric modes conjugated by post_dict_complex_coef, and with coefficients() (dictionary form)
+#     - ReconstructPrecomputedLikelihoodTermsROM (tensor contraction) agrees with the explicit sums over basis functions
+#   Uses a stand-in surrogate (EIM coefficients random polynomials in the mass ratio), so gwsurrogate is not needed.  With --rom-group/--rom-param
+#   (requires gwsurrogate and GW_SURROGATE), also checks coefficients_array for that surrogate.
+#
+# EXAMPLE
+#    python test_ROM_coefficients.py --as-test
+#    python test_ROM_coefficients.py --as-test --rom-group my_surrogates/nr_surrogates/ --rom-param NRHybSur3dq8.h5
+
+import numpy as np
+import lal
+import RIFT.lalsimutils as lsu
+import RIFT.physics.ROMWaveformManager as romwf
+from RIFT.likelihood import factored_likelihood
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--rom-group",default=None)
+parser.add_option("--rom-param",default=None)
+parser.add_option("--n-points",default=20,type=int)
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+rng = np.random.RandomState(0)
+
+class StandInSurrogate(object):
+    """
+    EIM coefficients cubic in the (first) surrogate parameter, with random complex weights; counts its evaluations
+    """
+    def __init__(self, n_basis):
+        self.W = rng.randn(n_basis, 4) + 1j*rng.randn(n_basis, 4)
+        self.n_calls = 0
+    def get_surr_params(self, params):
+        return params
+    def eim_coeffs(self, params, kind):
+        self.n_calls += 1
+        x = np.ravel(params)[0]
+        return np.dot(self.W, [1., x, x**2, x**3])
+
+# catalog: (l,m>0) surrogates, (l,-m) from reflection symmetry (same surrogate, conjugated)
+modes_positive = [(2,2), (2,1), (3,3)]
+nbasis = {(2,2): 5, (2,1): 3, (3,3): 4}
+acat = romwf.WaveformModeCatalog.__new__(romwf.WaveformModeCatalog)
+acat.sur_dict = {}; acat.nbasis_per_mode = {}; acat.post_dict_complex_coef = {}; acat.parameter_convert = {}
+for mode in modes_positive:
+    sur = StandInSurrogate(nbasis[mode])
+    for mode_here, post in [(mode, lambda x: x), ((mode[0], -mode[1]), lambda x, l=mode[0]: (-1)**l*np.conj(x))]:
+        acat.sur_dict[mode_here] = sur
+        acat.nbasis_per_mode[mode_here] = nbasis[mode]
+        acat.post_dict_complex_coef[mode_here] = post
+        acat.parameter_convert[mode_here] = romwf.ConvertWPtoSurrogateParams
+acat.modes_available = list(acat.sur_dict.keys())
+nbasis = acat.nbasis_per_mode
+
+P_list = []
+for indx in range(opts.n_points):
+    P_list.append(lsu.ChooseWaveformParams(m1=rng.uniform(20, 40)*lal.MSUN_SI, m2=rng.uniform(10, 20)*lal.MSUN_SI, s1z=rng.uniform(-0.5, 0.5), s2z=rng.uniform(-0.5, 0.5)))
+
+errors = {}
+
+# coefficients_array vs per-mode EIM coefficients
+coef_array = acat.coefficients_array(P_list)
+modes = acat.coefficient_modes()
+n_calls = np.sum([acat.sur_dict[mode].n_calls for mode in modes_positive])
+coef_ref = np.zeros_like(coef_array)
+for indx_P, P in enumerate(P_list):
+    for indx_mode, mode in enumerate(modes):
+        sur = acat.sur_dict[mode]
+        h_EIM = sur.eim_coeffs(sur.get_surr_params(acat.parameter_convert[mode](P)), 'waveform_basis')
+        coef_ref[indx_P, indx_mode, :nbasis[mode]] = acat.post_dict_complex_coef[mode](h_EIM)
+errors['coefficients_array'] = np.max(np.abs(coef_array - coef_ref))
+coefs_dict = acat.coefficients(P_list[0])
+errors['coefficients (dict)'] = np.max([np.abs(coefs_dict[(mode[0], mode[1], k)] - coef_ref[0, indx_mode, k]) for indx_mode, mode in enumerate(modes) for k in range(nbasis[mode])])
+print(" coefficients_array: {} EIM evaluations for {} points, {} modes ".format(n_calls, opts.n_points, len(modes)))
+
+# Reconstruction from basis terms, vs explicit sums.  Random basis terms: U Hermitian, V symmetric, as for real basis functions
+detectors = ['H1', 'L1']
+npts = 64
+basis_keys = [(mode[0], mode[1], k) for mode in modes for k in range(nbasis[mode])]
+rho_rom = {}; rho_intp_rom = {}; U_rom = {}; V_rom = {}
+for det in detectors:
+    rho_rom[det] = {}; rho_intp_rom[det] = {}; U_rom[det] = {}; V_rom[det] = {}
+    A = rng.randn(len(basis_keys), len(basis_keys)) + 1j*rng.randn(len(basis_keys), len(basis_keys))
+    U_mat = np.dot(np.conj(A).T, A)
+    V_mat = A + A.T
+    for a, key1 in enumerate(basis_keys):
+        rhoTS = lal.CreateCOMPLEX16TimeSeries("rho", lal.LIGOTimeGPS(0.), 0., 1./2048, lal.DimensionlessUnit, npts)
+        rhoTS.data.data = rng.randn(npts) + 1j*rng.randn(npts)
+        rho_rom[det][key1] = rhoTS
+        rho_intp_rom[det][key1] = lambda t, a=rng.randn(), b=rng.randn(): (a + 1j*b)*np.asarray(t)
+        for b, key2 in enumerate(basis_keys):
+            U_rom[det][(key1, key2)] = U_mat[a, b]
+            V_rom[det][(key1, key2)] = V_mat[a, b]
+
+for indx_P in [0, 1]:
+    P = P_list[indx_P]
+    for label, coefs in [('computed', None), ('from coefficients_array', coef_array[indx_P])]:
+        rholms_intp, crossTerms, crossTermsV, rholms, snr = factored_likelihood.ReconstructPrecomputedLikelihoodTermsROM(
+            P, acat, rho_intp_rom, U_rom, V_rom, rho_rom, verbose=False, coefs=coefs)
+        c = acat.coefficients(P)
+        err = 0
+        t_test = np.linspace(-0.01, 0.01, 7)
+        for det in detectors:
+            for mode in modes:
+                keys1 = [(mode[0], mode[1], k) for k in range(nbasis[mode])]
+                rho_ref = np.sum([np.conj(c[key])*rho_rom[det][key].data.data for key in keys1], axis=0)
+                rho_intp_ref = np.sum([np.conj(c[key])*rho_intp_rom[det][key](t_test) for key in keys1], axis=0)
+                err = np.max([err, np.max(np.abs(rholms[det][mode].data.data - rho_ref))/np.max(np.abs(rho_ref)),
+                              np.max(np.abs(rholms_intp[det][mode](t_test) - rho_intp_ref))/np.max(np.abs(rho_intp_ref))])
+                for mode2 in modes:
+                    keys2 = [(mode2[0], mode2[1], k) for k in range(nbasis[mode2])]
+                    U_ref = np.sum([np.conj(c[k1])*c[k2]*U_rom[det][(k1, k2)] for k1 in keys1 for k2 in keys2])
+                    V_ref = np.sum([c[k1]*c[k2]*V_rom[det][(k1, k2)] for k1 in keys1 for k2 in keys2])
+                    err = np.max([err, np.abs(crossTerms[det][(mode, mode2)] - U_ref)/np.abs(U_ref), np.abs(crossTermsV[det][(mode, mode2)] - V_ref)/np.abs(V_ref)])
+        errors['reconstruction, point {}, coefficients {}'.format(indx_P, label)] = err
+
+# A real surrogate, if requested
+if opts.rom_group and opts.rom_param:
+    acat_real = romwf.WaveformModeCatalog(opts.rom_group, opts.rom_param, lmax=3)
+    coef_array = acat_real.coefficients_array(P_list[:5])
+    err = 0
+    for indx_P, P in enumerate(P_list[:5]):
+        for indx_mode, mode in enumerate(acat_real.coefficient_modes()):
+            sur = acat_real.sur_dict[mode]
+            h_EIM = sur.eim_coeffs(sur.get_surr_params(acat_real.parameter_convert[mode](P)), 'waveform_basis')
+            n_here = acat_real.nbasis_per_mode[mode]
+            ref = acat_real.post_dict_complex_coef[mode](np.asarray(h_EIM)[:n_here])
+            err = np.max([err, np.max(np.abs(coef_array[indx_P, indx_mode, :n_here] - ref))/np.max(np.abs(ref))])
+    errors['coefficients_array, ' + opts.rom_param] = err
+
+for name in errors:
+    print(" ", name, " max diff ", errors[name])
+
+if opts.as_test:
+    for name in errors:
+        assert errors[name] < 1e-12, name
+    assert n_calls == opts.n_points*len(modes_positive)   # one EIM evaluation per surrogate and point
@@ -0,0 +1,135 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   WaveformModeCache (ILE --hlm-cache-dir):
+#     - a cached call returns the generated modes exactly (data, epoch, f0, deltaF, units), on a hit and in another process
+#     - keys ignore the sky location/polarization/detector, and change with the masses and the generator settings
+#     - LRU eviction keeps the cache below max_bytes, dropping the least recently used entry
+#     - PrecomputeLikelihoodTerms(..., hlm_cache=cache) gives the same terms as without the cache, and hits on the second call
+#
+# EXAMPLE
+#    python test_WaveformModeCache.py --as-test
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import lal
+import lalsimulation as lalsim
+import RIFT.lalsimutils as lsu
+from RIFT.physics.WaveformModeCache import WaveformModeCache
+from RIFT.likelihood import factored_likelihood
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--Lmax",default=3,type=int)
+parser.add_option("--approx",default="IMRPhenomXHM")
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+P = lsu.ChooseWaveformParams(m1=30*lal.MSUN_SI, m2=25*lal.MSUN_SI, s1z=0.3, approx=lalsim.GetApproximantFromString(opts.approx),
+                             fmin=20., deltaT=1./2048, deltaF=1./8, dist=factored_likelihood.distMpcRef*1e6*lal.PC_SI, tref=1000000000., phi=1., theta=0.3, incl=0.5)
+
+def generate(P):
+    return lsu.std_and_conj_hlmoff(P, opts.Lmax)
+
+def same_modes(hlms_a, hlms_b):
+    if list(hlms_a.keys()) != list(hlms_b.keys()):
+        return False
+    for mode in hlms_a:
+        a, b = hlms_a[mode], hlms_b[mode]
+        if not(np.array_equal(a.data.data, b.data.data)) or a.epoch != b.epoch or a.f0 != b.f0 or a.deltaF != b.deltaF or str(a.sampleUnits) != str(b.sampleUnits):
+            return False
+    return True
+
+def cached_call_in_child(path, queue):
+    cache = WaveformModeCache(path)
+    hlms, hlms_conj = cache.cached_call(P, lambda: generate(P), generator='test', Lmax=opts.Lmax)
+    queue.put((cache.n_hits, np.array(hlms[(2,2)].data.data)))
+
+checks = {}
+base_dir = tempfile.mkdtemp(prefix='test_WaveformModeCache_')
+try:
+    cache = WaveformModeCache(os.path.join(base_dir, 'cache'))
+    t_start = time.perf_counter()
+    hlms_gen, hlms_conj_gen = cache.cached_call(P, lambda: generate(P), generator='test', Lmax=opts.Lmax)
+    t_miss = time.perf_counter() - t_start
+    t_start = time.perf_counter()
+    hlms_hit, hlms_conj_hit = cache.cached_call(P, lambda: generate(P), generator='test', Lmax=opts.Lmax)
+    t_hit = time.perf_counter() - t_start
+    print(" Generate and store {}s, load {}s ".format(t_miss, t_hit))
+    checks['hit and miss counts'] = (cache.n_hits, cache.n_misses) == (1, 1)
+    checks['hit reproduces hlms'] = same_modes(hlms_hit, hlms_gen)
+    checks['hit reproduces hlms_conj'] = same_modes(hlms_conj_hit, hlms_conj_gen)
+
+    # another process sees the entry
+    queue = multiprocessing.get_context('fork').Queue()
+    proc = multiprocessing.get_context('fork').Process(target=cached_call_in_child, args=(cache.path, queue))
+    proc.start()
+    n_hits_child, hlm22_child = queue.get()
+    proc.join()
+    checks['hit in another process'] = n_hits_child == 1 and np.array_equal(hlm22_child, hlms_gen[(2,2)].data.data)
+
+    # keys
+    key = cache.key(P, generator='test', Lmax=opts.Lmax)
+    P_sky = P.manual_copy()
+    P_sky.phi += 1; P_sky.theta += 0.2; P_sky.psi = 0.7; P_sky.detector = 'L1'
+    P_mass = P.manual_copy()
+    P_mass.m1 *= 1.001
+    checks['key ignores sky and detector'] = cache.key(P_sky, generator='test', Lmax=opts.Lmax) == key
+    checks['key changes with mass'] = cache.key(P_mass, generator='test', Lmax=opts.Lmax) != key
+    checks['key changes with settings'] = cache.key(P, generator='test', Lmax=opts.Lmax+1) != key
+
+    # eviction: room for two entries; the least recently used one goes
+    entry_bytes = np.sum([os.path.getsize(os.path.join(cache.path, key, name)) for name in os.listdir(os.path.join(cache.path, key))])
+    cache_small = WaveformModeCache(os.path.join(base_dir, 'cache_small'), max_bytes=2.5*entry_bytes)
+    P_list = []
+    for indx in range(3):
+        P_here = P.manual_copy()
+        P_here.m1 *= 1 + 0.01*indx
+        P_list.append(P_here)
+    for P_here in P_list[:2]:
+        cache_small.cached_call(P_here, lambda: generate(P_here), generator='test', Lmax=opts.Lmax)
+        time.sleep(0.05)
+    cache_small.cached_call(P_list[0], lambda: generate(P_list[0]), generator='test', Lmax=opts.Lmax)   # refresh the first entry
+    time.sleep(0.05)
+    cache_small.cached_call(P_list[2], lambda: generate(P_list[2]), generator='test', Lmax=opts.Lmax)
+    present = [os.path.isdir(os.path.join(cache_small.path, cache_small.key(P_here, generator='test', Lmax=opts.Lmax))) for P_here in P_list]
+    print(" Entries present after eviction ", present)
+    checks['LRU eviction'] = present == [True, False, True]
+
+    # PrecomputeLikelihoodTerms, with and without the cache
+    data_dict = {}
+    psd_dict = {}
+    P_inj = P.manual_copy()
+    P_inj.dist = 400e6*lal.PC_SI
+    P_inj.radec = True
+    for det in ['H1', 'L1']:
+        P_inj.detector = det
+        data_dict[det] = lsu.non_herm_hoff(P_inj)
+        psd_dict[det] = lalsim.SimNoisePSDaLIGOZeroDetHighPower
+    terms = {}
+    cache_precompute = WaveformModeCache(os.path.join(base_dir, 'cache_precompute'))
+    for label, hlm_cache in [('no cache', None), ('miss', cache_precompute), ('hit', cache_precompute)]:
+        rholms_intp, crossTerms, crossTermsV, rholms, guess_snr, rest = factored_likelihood.PrecomputeLikelihoodTerms(
+            P.tref, 0.05, P.manual_copy(), data_dict, psd_dict, opts.Lmax, 1024., analyticPSD_Q=True, verbose=False, quiet=True, hlm_cache=hlm_cache)
+        terms[label] = (crossTerms, crossTermsV, rholms)
+    checks['precompute hit and miss counts'] = (cache_precompute.n_hits, cache_precompute.n_misses) == (1, 1)
+    for label in ['miss', 'hit']:
+        same = True
+        for det in data_dict:
+            for indx in range(2):
+                same = same and all([terms[label][indx][det][key] == terms['no cache'][indx][det][key] for key in terms['no cache'][indx][det]])
+            same = same and all([np.array_equal(terms[label][2][det][mode].data.data, terms['no cache'][2][det][mode].data.data) for mode in terms['no cache'][2][det]])
+        checks['precompute same terms, cache ' + label] = same
+finally:
+    shutil.rmtree(base_dir)
+
+for name in checks:
+    print(" ", name, checks[name])
+
+if opts.as_test:
+    for name in checks:
+        assert checks[name], name
@@ -0,0 +1,156 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   Fit artifacts (RIFT.interpolators.fit_artifact; CIP --fit-save-artifact/--fit-load-artifact): save and load each kind of fit,
+#   and check the loaded predictor reproduces the original fit:
+#     - kernel specs (kernel_to_spec/kernel_from_spec) reproduce the kernel matrix; gp and gp-local artifacts load as GPPredictor(s)
+#       and agree with the in-memory sklearn/LocalExpertGP fits
+#     - mlp: MLPPredictor agrees with a double-precision evaluation of the same network (random weights, offset narrow inputs); with torch,
+#       the artifact of a trained senni.Interpolator also agrees with its evaluate
+#
+# EXAMPLE
+#    python test_fit_artifact.py --as-test
+
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from sklearn.ensemble import ExtraTreesRegressor
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, RBF, Matern, WhiteKernel
+from RIFT.interpolators import fit_artifact, local_GP
+from RIFT.interpolators.BayesianLeastSquares import fit_polynomial_least_squares
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--n-dim",default=2,type=int)
+parser.add_option("--n-pts",default=600,type=int)
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+np.random.seed(0)
+def lnL(x):
+    return 30 - 0.5*np.sum((x/0.3)**2, axis=-1) + 0.2*x[:,0]
+x = np.random.uniform(-1, 1, size=(opts.n_pts, opts.n_dim))
+y = lnL(x)
+x_test = np.random.uniform(-1, 1, size=(2000, opts.n_dim))
+kernel = ConstantKernel(1., (1e-2, 1e6))*RBF(np.ones(opts.n_dim), (1e-2, 1e1)) + WhiteKernel(1e-4, (1e-8, 1e-1))
+
+base_dir = tempfile.mkdtemp(prefix='test_fit_artifact_')
+errors = {}
+checks = {}
+try:
+    # kernel specs
+    for kernel_here in [kernel, ConstantKernel(2.)*Matern(0.3*np.ones(opts.n_dim), nu=2.5) + WhiteKernel(1e-3)]:
+        kernel_loaded = fit_artifact.kernel_from_spec(json.loads(json.dumps(fit_artifact.kernel_to_spec(kernel_here))))
+        errors['kernel spec ' + str(kernel_here)] = np.max(np.abs(kernel_loaded(x_test[:200], x) - kernel_here(x_test[:200], x)))
+
+    # gp
+    for label, kernel_here in [('gp', kernel), ('gp Matern', ConstantKernel(1., (1e-2, 1e6))*Matern(np.ones(opts.n_dim), (1e-2, 1e1), nu=1.5) + WhiteKernel(1e-4, (1e-8, 1e-1)))]:
+        gp = GaussianProcessRegressor(kernel=kernel_here, normalize_y=True).fit(x, y)
+        fit_artifact.export_gp(os.path.join(base_dir, label), gp)
+        fit, meta = fit_artifact.load_fit(os.path.join(base_dir, label))
+        checks[label + ' loads as GPPredictor'] = isinstance(fit, fit_artifact.GPPredictor)
+        errors[label] = np.max(np.abs(fit(x_test) - gp.predict(x_test)))
+
+    # gp-local: several experts, and the single-expert case
+    for n_expert in [200, 2*opts.n_pts]:
+        lgp = local_GP.LocalExpertGP(x, y, kernel, n_expert=n_expert, n_restarts=0, random_state=0)
+        fname = os.path.join(base_dir, 'gp-local-{}'.format(n_expert))
+        fit_artifact.export_local_gp(fname, lgp)
+        fit, meta = fit_artifact.load_fit(fname)
+        checks['gp-local n_expert={} experts load as GPPredictor'.format(n_expert)] = len(fit.experts) == len(lgp.experts) and all([isinstance(expert, fit_artifact.GPPredictor) for expert in fit.experts])
+        errors['gp-local n_expert={}'.format(n_expert)] = np.max(np.abs(fit(x_test) - lgp.predict(x_test)))
+
+    # forest, with its training points
+    rf = ExtraTreesRegressor(n_estimators=50).fit(x, y)
+    fit_artifact.export_forest(os.path.join(base_dir, 'forest'), rf, x_train=x)
+    fit, meta = fit_artifact.load_fit(os.path.join(base_dir, 'forest'))
+    kind, arrays, meta = fit_artifact.read_artifact(os.path.join(base_dir, 'forest'))
+    errors['forest'] = np.max(np.abs(fit(x_test) - rf.predict(x_test)))
+    errors['forest X_train'] = np.max(np.abs(arrays['X_train'] - x))
+
+    # quadratic
+    x0 = np.random.normal(size=opts.n_dim)
+    lin = np.random.normal(size=opts.n_dim)
+    quad = np.random.normal(size=(opts.n_dim, opts.n_dim))
+    quad = -(quad + quad.T)
+    fit_artifact.export_quadratic(os.path.join(base_dir, 'quadratic'), 5., x0, lin, quad, meta={'lnL_shift': 1.})
+    fit, meta = fit_artifact.load_fit(os.path.join(base_dir, 'quadratic'))
+    dx = x_test - x0
+    errors['quadratic'] = np.max(np.abs(fit(x_test) - (5. + np.dot(dx, lin) + np.einsum('ij,jk,ik->i', dx, quad, dx))))
+    errors['quadratic meta'] = np.abs(meta['lnL_shift'] - 1.)
+
+    # polynomial (scaled coordinates)
+    powers = [[i, j] + [0]*(opts.n_dim-2) for i in range(3) for j in range(3) if 0 < i+j <= 2]
+    poly = fit_polynomial_least_squares(x, y, powers)
+    fit_artifact.export_polynomial(os.path.join(base_dir, 'polynomial'), poly.powers, poly.coef, poly.intercept, x_center=poly.x_center, x_scale=poly.x_scale)
+    fit, meta = fit_artifact.load_fit(os.path.join(base_dir, 'polynomial'))
+    errors['polynomial'] = np.max(np.abs(fit(x_test) - poly.predict(x_test)))
+
+    # mlp: MLPPredictor vs a double-precision evaluation, random weights (senni layout: 3 SELU hidden layers, linear output).
+    # Narrow, offset inputs (like chirp mass) check the folded input scaling
+    mu_x = np.concatenate([[1.2], np.zeros(opts.n_dim-1)])
+    sigma_x = np.concatenate([[1e-3], np.ones(opts.n_dim-1)])
+    layer_sizes = [opts.n_dim, 32, 32, 32, 1]
+    weights = [np.random.normal(size=(layer_sizes[i+1], layer_sizes[i]))/np.sqrt(layer_sizes[i]) for i in range(len(layer_sizes)-1)]
+    biases = [0.1*np.random.normal(size=layer_sizes[i+1]) for i in range(len(layer_sizes)-1)]
+    arrays = {'mu_x': mu_x, 'sigma_x': sigma_x}
+    for indx in range(len(weights)):
+        arrays['W{}'.format(indx)] = weights[indx].astype(np.float32)
+        arrays['b{}'.format(indx)] = biases[indx].astype(np.float32)
+    fit_artifact.save_artifact(os.path.join(base_dir, 'mlp-random'), 'mlp', arrays, {'target_mu': 20., 'target_sigma': 5., 'n_layers': len(weights)})
+    fit, meta = fit_artifact.load_fit(os.path.join(base_dir, 'mlp-random'))
+    checks['mlp loads as MLPPredictor'] = isinstance(fit, fit_artifact.MLPPredictor)
+    x_raw = mu_x + sigma_x*x_test
+    h = (x_raw - mu_x)/sigma_x
+    for indx in range(len(weights)):
+        h = np.dot(h, arrays['W{}'.format(indx)].astype(float).T) + arrays['b{}'.format(indx)]
+        if indx < len(weights)-1:
+            h = fit_artifact._selu(h)
+    y_ref = 20. + 5.*h[:,0]
+    errors['mlp'] = np.max(np.abs(fit(x_raw) - y_ref))/np.std(y_ref)
+
+    # mlp (senni), if torch is available
+    try:
+        import torch
+        from RIFT.interpolators import senni
+        torch_ok = True
+    except ImportError:
+        torch_ok = False
+        print(" torch not available, skipping the senni mlp round trip ")
+    if torch_ok:
+        torch.manual_seed(0)
+        nn_interpolator = senni.Interpolator(x, y[:,np.newaxis], None, epochs=20, frac=0.2, test_frac=0, no_pad=True)
+        nn_interpolator.train(debug=False)
+        fit_artifact.export_senni(os.path.join(base_dir, 'mlp'), nn_interpolator)
+        fit, meta = fit_artifact.load_fit(os.path.join(base_dir, 'mlp'))
+        # float32 network: compare relative to the lnL scale
+        checks['senni mlp loads as MLPPredictor'] = isinstance(fit, fit_artifact.MLPPredictor)
+        errors['mlp senni'] = np.max(np.abs(fit(x_test) - np.ravel(nn_interpolator.evaluate(x_test))))/np.std(y)
+
+    # not an artifact
+    os.makedirs(os.path.join(base_dir, 'bad'))
+    with open(os.path.join(base_dir, 'bad', 'manifest.json'), 'w') as f:
+        f.write('{"format": "other"}')
+    try:
+        fit_artifact.load_fit(os.path.join(base_dir, 'bad'))
+        bad_raises = False
+    except ValueError:
+        bad_raises = True
+finally:
+    shutil.rmtree(base_dir)
+
+for name in errors:
+    print(" Round trip ", name, " max diff ", errors[name])
+for name in checks:
+    print(" ", name, checks[name])
+print(" Bad manifest raises ", bad_raises)
+
+if opts.as_test:
+    for name in errors:
+        assert errors[name] < (1e-4 if name.startswith('mlp') else 1e-8), name   # mlp: float32 network, relative to the lnL scale
+    for name in checks:
+        assert checks[name], name
+    assert bad_raises
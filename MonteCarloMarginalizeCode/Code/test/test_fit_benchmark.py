@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   fit_benchmark (CIP --fit-benchmark-method): k-fold cross-validation of fit methods.
+#     - kfold_indices: test sets partition the points, train sets are the complement
+#     - an exact fit (quadratic, on quadratic data) has ~zero held-out residual
+#     - the artifact is written after the fit is timed (a slow writer does not change fit_time_s), and its size is reported;
+#       methods without an artifact report nan
+#     - a process pool gives the same residuals as a serial run
+#     - write_table output can be read back
+#
+# EXAMPLE
+#    python test_fit_benchmark.py --as-test
+
+import os
+import tempfile
+import time
+import numpy as np
+from sklearn.ensemble import ExtraTreesRegressor
+from RIFT.interpolators import fit_benchmark, fit_artifact
+from RIFT.interpolators.BayesianLeastSquares import fit_polynomial_least_squares
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--n-dim",default=2,type=int)
+parser.add_option("--n-pts",default=1000,type=int)
+parser.add_option("--n-folds",default=4,type=int)
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+np.random.seed(0)
+x = np.random.uniform(-1, 1, size=(opts.n_pts, opts.n_dim))
+y = 30 - 0.5*np.sum((x/0.3)**2, axis=-1) + 0.3*x[:,0]*x[:,1]
+powers = [[i, j] + [0]*(opts.n_dim-2) for i in range(3) for j in range(3) if i+j <= 2]
+t_write = 0.5
+
+def fit_quadratic(x_train, y_train, y_err_train, artifact_dir):
+    poly = fit_polynomial_least_squares(x_train, y_train, powers)
+    def write_artifact():
+        time.sleep(t_write)    # a slow filesystem: must not count as fit time
+        fit_artifact.export_polynomial(artifact_dir, poly.powers, poly.coef, poly.intercept, x_center=poly.x_center, x_scale=poly.x_scale)
+    return poly, write_artifact
+
+def fit_rf(x_train, y_train, y_err_train, artifact_dir):
+    rf = ExtraTreesRegressor(n_estimators=20, random_state=0).fit(x_train, y_train)
+    return rf.predict, None
+
+fit_functions = {'quadratic': fit_quadratic, 'rf': fit_rf}
+methods = ['quadratic', 'rf']
+
+folds = fit_benchmark.kfold_indices(opts.n_pts, opts.n_folds)
+folds_ok = np.array_equal(np.sort(np.concatenate([test for train, test in folds])), np.arange(opts.n_pts))
+folds_ok = folds_ok and all([np.array_equal(np.sort(np.concatenate([train, test])), np.arange(opts.n_pts)) for train, test in folds])
+print(" kfold_indices partition ok ", folds_ok)
+
+summary = fit_benchmark.run_benchmark(fit_functions, methods, x, y, n_folds=opts.n_folds, n_throughput=10000)
+summary_pool = fit_benchmark.run_benchmark(fit_functions, methods, x, y, n_folds=opts.n_folds, n_throughput=10000, n_procs=2)
+for line in summary:
+    print(" ", line)
+err_pool = np.max([np.abs(a['rms_heldout'] - b['rms_heldout']) for a, b in zip(summary, summary_pool)])
+print(" Serial vs pool: max rms difference ", err_pool)
+
+fname = os.path.join(tempfile.mkdtemp(prefix='test_fit_benchmark_'), 'fit_benchmark.dat')
+fit_benchmark.write_table(fname, summary)
+dat = np.genfromtxt(fname, dtype=None, names=fit_benchmark.benchmark_columns, encoding='utf-8')
+os.remove(fname); os.rmdir(os.path.dirname(fname))
+table_ok = list(dat['method']) == methods and np.allclose(dat['rms_heldout'], [line['rms_heldout'] for line in summary], rtol=1e-5)
+print(" Table read back ok ", table_ok)
+
+if opts.as_test:
+    line_quad, line_rf = summary
+    assert folds_ok
+    assert line_quad['n_folds'] == opts.n_folds and line_quad['n_points'] == opts.n_pts
+    assert line_quad['rms_heldout'] < 1e-8
+    assert line_quad['fit_time_s'] < t_write
+    assert line_quad['artifact_bytes'] > 0
+    assert np.isnan(line_rf['artifact_bytes'])
+    assert line_rf['rms_heldout'] > line_quad['rms_heldout']
+    assert err_pool < 1e-12
+    assert table_ok
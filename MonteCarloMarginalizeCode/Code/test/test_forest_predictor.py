@@ -0,0 +1,81 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   ForestPredictor (CIP --fit-rf-compiled, forest fit artifacts) reproduces rf.predict exactly, on the numba and numpy paths,
+#   for ExtraTrees and RandomForest fits, including points on the thresholds and a number of points not divisible by 4.
+#   Also checks merge_forests (mean over all trees) and predict_std (spread of the tree predictions).
+#   Reports timings.
+#
+# EXAMPLE
+#    python test_forest_predictor.py --as-test
+
+import time
+import numpy as np
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from RIFT.interpolators import forest_predictor
+from RIFT.interpolators.forest_predictor import ForestPredictor
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--n-dim",default=3,type=int)
+parser.add_option("--n-train",default=3000,type=int)
+parser.add_option("--n-test",default=100001,type=int)
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+np.random.seed(0)
+def lnL(x):
+    return 50 - 0.5*np.sum((x/0.3)**2, axis=-1)
+x = np.random.uniform(-1, 1, size=(opts.n_train, opts.n_dim))
+y = lnL(x)
+x_test = np.random.uniform(-1.2, 1.2, size=(opts.n_test, opts.n_dim))
+
+errors = {}
+for rf in [ExtraTreesRegressor(n_estimators=50).fit(x, y), RandomForestRegressor(n_estimators=50).fit(x, y)]:
+    name = type(rf).__name__
+    arrays = forest_predictor.flatten_forest(rf)
+    # points exactly on (and just above) the split thresholds of the first tree
+    is_split = arrays['children_left'][:rf.estimators_[0].tree_.node_count] >= 0
+    x_edge = np.array(x_test[:int(np.sum(is_split))])
+    x_edge[np.arange(len(x_edge)), arrays['feature'][:len(is_split)][is_split]] = arrays['threshold'][:len(is_split)][is_split]
+    x_edge_up = np.array(x_edge)
+    x_edge_up[np.arange(len(x_edge)), arrays['feature'][:len(is_split)][is_split]] = np.nextafter(arrays['threshold'][:len(is_split)][is_split].astype(np.float32), np.float32(np.inf))
+    x_here = np.concatenate([x_test, x_edge, x_edge_up])
+
+    t_start = time.perf_counter()
+    y_rf = rf.predict(x_here)
+    print(" {} rf.predict time {} ".format(name, time.perf_counter() - t_start))
+    for use_numba in [True, False]:
+        fp = ForestPredictor.from_sklearn(rf, use_numba=use_numba)
+        fp.predict(x_here[:10])   # compile, if numba
+        t_start = time.perf_counter()
+        y_fp = fp.predict(x_here)
+        print(" {} ForestPredictor use_numba={} (numba available {}) time {} ".format(name, use_numba, forest_predictor.numba_ok, time.perf_counter() - t_start))
+        errors['{} use_numba={}'.format(name, use_numba)] = np.max(np.abs(y_fp - y_rf))
+
+    fp = ForestPredictor.from_sklearn(rf)
+    y_trees = np.array([est.predict(x_test[:2000]) for est in rf.estimators_])
+    errors['{} predict_std'.format(name)] = np.max(np.abs(fp.predict_std(x_test[:2000]) - np.std(y_trees, axis=0)))
+
+# merged forest: the mean over the trees of both
+rf1 = ExtraTreesRegressor(n_estimators=30).fit(x, y)
+rf2 = ExtraTreesRegressor(n_estimators=20).fit(x[:1000], y[:1000])
+fp_merged = ForestPredictor.from_arrays(forest_predictor.merge_forests([forest_predictor.flatten_forest(rf1), forest_predictor.flatten_forest(rf2)]))
+y_expected = (30*rf1.predict(x_test[:2000]) + 20*rf2.predict(x_test[:2000]))/50.
+errors['merge_forests'] = np.max(np.abs(fp_merged.predict(x_test[:2000]) - y_expected))
+
+# locality_order is a permutation
+order = forest_predictor.locality_order(x_test)
+is_permutation = np.array_equal(np.sort(order), np.arange(len(x_test)))
+
+for name in errors:
+    print(" ", name, " max diff ", errors[name])
+print(" locality_order is a permutation ", is_permutation)
+
+if opts.as_test:
+    for name in errors:
+        if name.startswith('merge') or name.endswith('std'):
+            assert errors[name] < 1e-8, name     # summation order differs
+        else:
+            assert errors[name] == 0, name
+    assert is_permutation
@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   rf warm start (forest_predictor.warm_start_forest, used by CIP --fit-warm-start): fit a forest to a broad first set of points,
+#   then warm-start it with a second set concentrated near the peak (as the next iteration would).
+#   The held-out residual of the warm-started forest should be comparable to a forest fit from scratch to all the points.
+#
+# EXAMPLE
+#    python test_forest_warm_start.py --as-test
+
+import numpy as np
+from sklearn.ensemble import ExtraTreesRegressor
+from RIFT.interpolators import forest_predictor
+from RIFT.interpolators.forest_predictor import ForestPredictor
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--n-dim",default=3,type=int)
+parser.add_option("--n-first",default=2000,type=int)
+parser.add_option("--n-second",default=1000,type=int)
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+np.random.seed(0)
+def lnL(x):
+    return 50 - 0.5*np.sum((x/0.2)**2, axis=-1)
+
+x1 = np.random.uniform(-1, 1, size=(opts.n_first, opts.n_dim))
+x2 = np.random.normal(scale=0.2, size=(opts.n_second, opts.n_dim))
+x_all = np.concatenate([x1, x2])
+y1 = lnL(x1)
+y_all = lnL(x_all)
+x_test = np.random.normal(scale=0.2, size=(2000, opts.n_dim))   # held out, where the second set of points matters
+y_test = lnL(x_test)
+
+# refit_leaf_values with the training points reproduces the fit
+rf1 = ExtraTreesRegressor(n_estimators=100).fit(x1, y1)
+arrays1 = forest_predictor.flatten_forest(rf1)
+arrays1_refit = dict(arrays1)
+arrays1_refit['value'] = forest_predictor.refit_leaf_values(arrays1, x1, y1)
+err_refit = np.max(np.abs(ForestPredictor.from_arrays(arrays1_refit).predict(x_test) - rf1.predict(x_test)))
+print(" Refit leaf values, same points: max change ", err_refit)
+
+# matching is insensitive to roundoff
+n_new_roundoff = np.sum(forest_predictor.new_points(x1, x1*(1+1e-13)))
+n_new = np.sum(forest_predictor.new_points(x1, x_all))
+print(" New points: roundoff ", n_new_roundoff, " second set ", n_new, " of ", opts.n_second)
+
+arrays_warm = forest_predictor.warm_start_forest(arrays1, x1, x_all, y_all)
+rf_scratch = ExtraTreesRegressor(n_estimators=100).fit(x_all, y_all)
+res_warm = np.std(ForestPredictor.from_arrays(arrays_warm).predict(x_test) - y_test)
+res_scratch = np.std(rf_scratch.predict(x_test) - y_test)
+res_first = np.std(rf1.predict(x_test) - y_test)
+print(" Held-out residual: first set only ", res_first, " warm start ", res_warm, " scratch ", res_scratch, " trees ", len(arrays_warm['roots']))
+
+# forest cap
+arrays_capped = forest_predictor.warm_start_forest(arrays1, x1, x_all, y_all, max_trees=120)
+print(" Capped warm start returns ", arrays_capped)
+
+if opts.as_test:
+    assert err_refit < 1e-8
+    assert n_new_roundoff == 0
+    assert n_new == opts.n_second
+    assert res_warm < 1.5*res_scratch
+    assert arrays_capped is None
@@ -0,0 +1,69 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   internal_GP (CIP --fit-method gp_sparse):
+#     - compact_kernel (KD-tree neighbor pairs) agrees with the dense construction of R&W p. 88 on a small random set: training
+#       kernel (with white noise, diagonal included), training/test kernel, and with prebuilt trees
+#     - GP_fit_function predictions, evaluated in chunks smaller than the test set, agree with the dense solve K alpha = y,
+#       mean = K_test alpha.  Skipped unless sksparse is available.
+#
+# EXAMPLE
+#    python test_internal_GP.py --as-test
+
+import numpy as np
+from RIFT.interpolators import internal_GP
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--n-dim",default=3,type=int)
+parser.add_option("--n-pts",default=300,type=int)
+parser.add_option("--n-chunk",default=70,type=int)
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+def dense_kernel(Xp, Xq, thetas, white_noise):
+    """
+    Compact kernel (eta_+^(j+1) ((j+1) r + 1), r the scaled distance), as a dense array
+    """
+    j = np.floor(len(thetas)/2.0) + 2
+    r = np.linalg.norm((Xp/thetas)[:,np.newaxis,:] - (Xq/thetas)[np.newaxis,:,:], axis=-1)
+    eta = np.maximum(1.0 - r, 0.0)
+    K = (eta**(j + 1))*((j + 1)*r + 1.0)
+    if white_noise != 0.0:
+        K += white_noise*np.eye(K.shape[0], K.shape[1])
+    return K
+
+np.random.seed(0)
+x_train = np.random.uniform(-1, 1, size=(opts.n_pts, opts.n_dim))
+y_train = 10 - 5*np.sum(x_train**2, axis=1) + 0.01*np.random.normal(size=opts.n_pts)
+x_test = np.random.uniform(-1, 1, size=(3*opts.n_pts+1, opts.n_dim))
+thetas = 0.5*np.ones(opts.n_dim)
+white_noise = 0.01
+
+errors = {}
+K_dense = dense_kernel(x_train, x_train, thetas, white_noise)
+K = internal_GP.compact_kernel(x_train, None, thetas, white_noise)
+errors['training kernel'] = np.max(np.abs(K.toarray() - K_dense))
+Kt_dense = dense_kernel(x_test, x_train, thetas, 0.0)
+errors['test kernel'] = np.max(np.abs(internal_GP.compact_kernel(x_test, x_train, thetas, 0.0).toarray() - Kt_dense))
+tree_train = internal_GP.compact_kernel_tree(x_train, thetas)
+errors['test kernel, prebuilt tree'] = np.max(np.abs(internal_GP.compact_kernel(x_test, x_train, thetas, 0.0, tree_q=tree_train).toarray() - Kt_dense))
+print(" Kernel nonzero fraction ", K.nnz/float(opts.n_pts**2))
+
+try:
+    import sksparse
+    sksparse_ok = True
+except ImportError:
+    sksparse_ok = False
+    print(" sksparse not available, skipping GP_fit_function ")
+if sksparse_ok:
+    my_fit = internal_GP.GP_fit_function(x_train, y_train, thetas, white_noise, n_chunk=opts.n_chunk)
+    y_dense = np.dot(Kt_dense, np.linalg.solve(K_dense, y_train))
+    errors['chunked prediction'] = np.max(np.abs(my_fit(x_test) - y_dense))/np.max(np.abs(y_dense))
+
+for name in errors:
+    print(" ", name, " max diff ", errors[name])
+
+if opts.as_test:
+    for name in errors:
+        assert errors[name] < 1e-10, name
@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   local_GP (CIP --fit-method gp-local):
+#     - kd_partition: leaves partition the points, none larger than requested
+#     - fit_gp_restarts: restarts in a process pool give the same fit as serial restarts
+#     - LocalExpertGP with one expert is the usual GP; with several experts, the held-out residual stays comparable
+#     - warm_start_kernel copies hyperparameters from a previous fit
+#   Reports fit times.
+#
+# EXAMPLE
+#    python test_local_GP.py --as-test
+
+import time
+import warnings
+import numpy as np
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, RBF, WhiteKernel
+from RIFT.interpolators import local_GP
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--n-dim",default=2,type=int)
+parser.add_option("--n-pts",default=2000,type=int)
+parser.add_option("--n-expert",default=400,type=int)
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+warnings.filterwarnings('ignore', category=ConvergenceWarning)   # hyperparameters at their bounds, for this smooth function
+
+np.random.seed(0)
+def lnL(x):
+    return 30 - 0.5*np.sum((x/0.4)**2, axis=-1) + np.sin(3*x[:,0])
+x = np.random.uniform(-1, 1, size=(opts.n_pts, opts.n_dim))
+y = lnL(x)
+x_test = np.random.uniform(-0.9, 0.9, size=(2000, opts.n_dim))
+y_test = lnL(x_test)
+kernel = ConstantKernel(10., (1e-2, 1e6))*RBF(np.ones(opts.n_dim), (1e-2, 1e1)) + WhiteKernel(1e-4, (1e-8, 1e-1))
+
+# kd_partition
+leaves = local_GP.kd_partition(x, opts.n_expert)
+indx_all = np.sort(np.concatenate(leaves))
+partition_ok = np.array_equal(indx_all, np.arange(opts.n_pts)) and np.max([len(l) for l in leaves]) <= opts.n_expert
+print(" kd_partition: ", len(leaves), " leaves, partition ok ", partition_ok)
+
+# restarts: serial and pool agree
+x_small, y_small = x[:300], y[:300]
+gp_serial = local_GP.fit_gp_restarts(x_small, y_small, kernel, n_restarts=3, n_procs=1, random_state=0)
+gp_pool = local_GP.fit_gp_restarts(x_small, y_small, kernel, n_restarts=3, n_procs=2, random_state=0)
+err_restarts = np.max(np.abs(gp_serial.kernel_.theta - gp_pool.kernel_.theta))
+print(" Restarts, serial vs pool: max theta diff ", err_restarts)
+
+# one expert: the usual GP, with the same kernel
+lgp_one = local_GP.LocalExpertGP(x_small, y_small, kernel, n_expert=1000, n_restarts=3, random_state=0)
+gp_ref = GaussianProcessRegressor(kernel=lgp_one.kernel_, optimizer=None).fit(x_small, y_small)
+err_one = np.max(np.abs(lgp_one.predict(x_test) - gp_ref.predict(x_test)))
+y_one, std_one = lgp_one.predict(x_test, return_std=True)
+y_ref, std_ref = gp_ref.predict(x_test, return_std=True)
+err_one_std = np.max(np.abs(std_one - std_ref))
+print(" One expert vs GaussianProcessRegressor: max diff ", err_one, " std ", err_one_std)
+
+# several experts vs one GP on all the points
+t_start = time.time()
+lgp = local_GP.LocalExpertGP(x, y, kernel, n_expert=opts.n_expert, n_hyper=500, n_restarts=1, random_state=0)
+t_local = time.time() - t_start
+t_start = time.time()
+gp_full = GaussianProcessRegressor(kernel=lgp.kernel_, optimizer=None).fit(x, y)
+t_full = time.time() - t_start
+res_local = np.std(lgp.predict(x_test) - y_test)
+res_full = np.std(gp_full.predict(x_test) - y_test)
+print(" Held-out residual: local ({} experts, fit {}s) {}  full GP (conditioning only, {}s) {} ".format(len(lgp.experts), t_local, res_local, t_full, res_full))
+
+# warm start: hyperparameters copied, within bounds
+kernel_warm = local_GP.warm_start_kernel(kernel, gp_serial.kernel_)
+err_warm = np.max(np.abs(kernel_warm.theta - np.clip(gp_serial.kernel_.theta, kernel.bounds[:,0], kernel.bounds[:,1])))
+print(" warm_start_kernel: max theta diff ", err_warm)
+
+if opts.as_test:
+    assert partition_ok
+    assert err_restarts < 1e-10
+    assert err_one < 1e-8 and err_one_std < 1e-8
+    assert res_local < 0.05*np.std(y_test)
+    assert err_warm < 1e-10
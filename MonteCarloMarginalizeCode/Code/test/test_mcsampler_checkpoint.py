@@ -0,0 +1,67 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   Interrupt an integral part way through (as if preempted), then resume it from the checkpoint file.
+#   Resumed integral should agree with the analytic answer, and only require the remaining chunks.
+#
+# EXAMPLE
+#    python test_mcsampler_checkpoint.py --as-test
+
+import os
+import numpy as np
+from RIFT.integrators import mcsamplerGPU, mcsamplerAdaptiveVolume
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--n-chunk",default=10000,type=int)
+parser.add_option("--n-chunks-before-preempt",default=3,type=int)
+parser.add_option("--checkpoint-file",default="test_mcsampler_checkpoint.npz")
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+llim, rlim = -5, 5
+lnL_offset = 100
+lnZ_expected = np.log(np.pi/2) - np.log((rlim-llim)**2)   # gaussian integral, times uniform prior
+
+class Preempted(Exception):
+    pass
+
+n_calls = [0]
+def make_ln_f(n_calls_max=None):
+    def ln_f(x1, x2):
+        n_calls[0] += 1
+        if n_calls_max and n_calls[0] > n_calls_max:
+            raise Preempted()
+        return lnL_offset - ((1.-x1)**2 + 4*(x2-x1)**2)
+    return ln_f
+
+def make_sampler(mod):
+    sampler = mod.MCSampler()
+    for p in ['x1','x2']:
+        sampler.add_parameter(p, pdf=np.vectorize(lambda x:1/(rlim-llim)),
+            prior_pdf=np.vectorize(lambda x:1/(rlim-llim)),
+            left_limit=llim, right_limit=rlim,adaptive_sampling=True)
+    sampler.setup()
+    return sampler
+
+extra_args = {'n':opts.n_chunk, 'nmax':30*opts.n_chunk, 'neff':3000, 'n_adapt':100, 'tempering_exp':0.1, 'use_lnL':True,'save_intg':True, 'enforce_bounds':True, 'no_protect_names':True, 'checkpoint_file':opts.checkpoint_file}
+np.random.seed(0)
+for mod in [mcsamplerGPU, mcsamplerAdaptiveVolume]:
+    if os.path.exists(opts.checkpoint_file):
+        os.remove(opts.checkpoint_file)
+    n_calls[0] = 0
+    make_sampler(mod).integrate_log(make_ln_f(), 'x1', 'x2', **dict(extra_args, checkpoint_file=None))
+    n_calls_full = n_calls[0]
+    n_calls[0] = 0
+    try:
+        make_sampler(mod).integrate_log(make_ln_f(opts.n_chunks_before_preempt), 'x1', 'x2', **extra_args)
+    except Preempted:
+        print(" Preempted ", mod.__name__, " checkpoint present: ", os.path.exists(opts.checkpoint_file))
+    n_calls[0] = 0
+    lnZ, lnvar, neff, _ = make_sampler(mod).integrate_log(make_ln_f(), 'x1', 'x2', **extra_args)
+    lnZ += -lnL_offset
+    print(mod.__name__, lnZ, lnZ_expected, neff, " chunks after resume ", n_calls[0], " chunks in full run ", n_calls_full)
+    if opts.as_test:
+        assert np.abs(lnZ - lnZ_expected) < 0.1
+        assert not(os.path.exists(opts.checkpoint_file))   # removed on completion
+        assert n_calls[0] < n_calls_full    # resumed, rather than started over
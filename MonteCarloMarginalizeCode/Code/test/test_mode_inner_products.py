@@ -0,0 +1,121 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   The batched, all-detector mode inner products used by PrecomputeLikelihoodTerms agree with the per-detector, per-mode originals:
+#     - ComputeModeCrossTermArrays  vs  ComputeModeCrossTermIP   (U = <h_lm|h_l'm'>, V = <h_lm^*|h_l'm'>)
+#     - ComputeModeIPTimeSeriesArrays  vs  ComputeModeIPTimeSeries   (rholm(t) = <h_lm(t)|d>, windowed), including a window that wraps
+#     - RholmInterpolator (all detectors and modes, batched)  vs  InterpolateRholm (one spline per mode), in and outside the window
+#   Reports timings.
+#
+# EXAMPLE
+#    python test_mode_inner_products.py --as-test
+
+import time
+import numpy as np
+import lal
+import lalsimulation as lalsim
+import RIFT.lalsimutils as lsu
+from RIFT.likelihood import factored_likelihood as factored_likelihood
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--Lmax",default=3,type=int)
+parser.add_option("--approx",default="IMRPhenomXHM")
+parser.add_option("--t-window",default=0.1,type=float)
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+detectors = ['H1', 'L1', 'V1']
+fmin = 20.
+fMax = 1024.
+tref = 1000000000.
+P = lsu.ChooseWaveformParams(m1=30*lal.MSUN_SI, m2=25*lal.MSUN_SI, s1z=0.3, approx=lalsim.GetApproximantFromString(opts.approx),
+                             fmin=fmin, deltaT=1./2048, deltaF=1./8, dist=400e6*lal.PC_SI, tref=tref, phi=1., theta=0.3, incl=0.5, radec=True)
+fNyq = 1./2./P.deltaT
+rng = np.random.RandomState(0)
+data_dict = {}
+psd_dict = {}
+for det in detectors:
+    P.detector = det
+    data_dict[det] = lsu.non_herm_hoff(P)
+    data_dict[det].data.data += 1e-24*(rng.randn(data_dict[det].data.length) + 1j*rng.randn(data_dict[det].data.length))
+    psd_dict[det] = lalsim.SimNoisePSDAdvVirgo if det == 'V1' else lalsim.SimNoisePSDaLIGOZeroDetHighPower
+P.dist = factored_likelihood.distMpcRef*1e6*lal.PC_SI
+hlms, hlms_conj = lsu.std_and_conj_hlmoff(P, opts.Lmax)
+modes = list(hlms.keys())
+print(" Modes ", modes, " length ", hlms[modes[0]].data.length, data_dict[detectors[0]].data.length)
+
+def max_rel_diff(dict_a, dict_b):
+    keys = list(dict_b.keys())
+    vals_a = np.array([dict_a[key] for key in keys])
+    vals_b = np.array([dict_b[key] for key in keys])
+    return np.max(np.abs(vals_a - vals_b))/np.max(np.abs(vals_b))
+
+errors = {}
+
+# U, V cross terms
+t_start = time.perf_counter()
+U_ref = {}
+V_ref = {}
+for det in detectors:
+    U_ref[det] = factored_likelihood.ComputeModeCrossTermIP(hlms, hlms, psd_dict[det], fmin, fMax, fNyq, P.deltaF, analyticPSD_Q=True, verbose=False)
+    V_ref[det] = factored_likelihood.ComputeModeCrossTermIP(hlms_conj, hlms, psd_dict[det], fmin, fMax, fNyq, P.deltaF, analyticPSD_Q=True, verbose=False, prefix="V")
+t_ref = time.perf_counter() - t_start
+t_start = time.perf_counter()
+U, V = factored_likelihood.ComputeModeCrossTermArrays(hlms, hlms_conj, psd_dict, detectors, fmin, fMax, fNyq, P.deltaF, analyticPSD_Q=True, verbose=False)
+print(" Cross terms: ComputeModeCrossTermIP time {}  ComputeModeCrossTermArrays time {} ".format(t_ref, time.perf_counter() - t_start))
+for det in detectors:
+    errors['U ' + det] = max_rel_diff(U[det], U_ref[det])
+    errors['V ' + det] = max_rel_diff(V[det], V_ref[det])
+    errors['U hermitian ' + det] = np.max([np.abs(U[det][(m1, m2)] - np.conj(U[det][(m2, m1)])) for m1 in modes for m2 in modes])/np.max(np.abs(list(U[det].values())))
+
+# rholm(t) time series, windowed as in PrecomputeLikelihoodTerms; H1 window shifted to wrap around the end of the series
+N_window = int(2*opts.t_window/P.deltaT)
+npts = data_dict[detectors[0]].data.length
+N_shift_dict = {}
+for det in detectors:
+    t_det = factored_likelihood.ComputeArrivalTimeAtDetector(det, P.phi, P.theta, tref)
+    rho_epoch = data_dict[det].epoch - hlms[modes[0]].epoch
+    N_shift_dict[det] = int((float(t_det) - opts.t_window - float(rho_epoch))/P.deltaT + 0.5)
+N_shift_dict['H1'] = npts - N_window//2
+t_start = time.perf_counter()
+rholms_ref = {}
+for det in detectors:
+    rholms_ref[det] = factored_likelihood.ComputeModeIPTimeSeries(hlms, data_dict[det], psd_dict[det], fmin, fMax, fNyq, N_shift_dict[det], N_window, analyticPSD_Q=True)
+t_ref = time.perf_counter() - t_start
+t_start = time.perf_counter()
+rholms = factored_likelihood.ComputeModeIPTimeSeriesArrays(hlms, data_dict, psd_dict, detectors, fmin, fMax, fNyq, N_shift_dict, N_window, analyticPSD_Q=True)
+print(" rholm time series: ComputeModeIPTimeSeries time {}  ComputeModeIPTimeSeriesArrays time {} ".format(t_ref, time.perf_counter() - t_start))
+for det in detectors:
+    rho_ref = np.array([rholms_ref[det][mode].data.data for mode in modes])
+    rho = np.array([rholms[det][mode].data.data for mode in modes])
+    errors['rholm ' + det] = np.max(np.abs(rho - rho_ref))/np.max(np.abs(rho_ref))
+    errors['rholm epoch ' + det] = np.max([np.abs(float(rholms[det][mode].epoch - rholms_ref[det][mode].epoch)) for mode in modes])
+    errors['rholm deltaT ' + det] = np.max([np.abs(rholms[det][mode].deltaT - rholms_ref[det][mode].deltaT) for mode in modes])
+
+# rholm(t) interpolation
+t_dict = dict([(det, float(rholms[det][modes[0]].epoch) + np.arange(N_window)*P.deltaT) for det in detectors])
+n_eval = 20000
+t_eval = dict([(det, rng.uniform(t_dict[det][0] - 0.01, t_dict[det][-1] + 0.01, size=n_eval)) for det in detectors])
+t_start = time.perf_counter()
+rho_intp_ref = {}
+for det in detectors:
+    rho_intp_ref[det] = dict([(mode, factored_likelihood.InterpolateRholm(rholms[det][mode], t_dict[det])(t_eval[det])) for mode in modes])
+t_ref = time.perf_counter() - t_start
+rholm_interpolator = factored_likelihood.RholmInterpolator(rholms, t_dict, detectors)
+rholms_intp = dict([(det, rholm_interpolator.mode_functions(det)) for det in detectors])
+t_start = time.perf_counter()
+rho_intp = factored_likelihood.EvaluateRholmsInterpolated(rholms_intp, t_eval)
+print(" rholm interpolation: InterpolateRholm time {}  RholmInterpolator time {} ".format(t_ref, time.perf_counter() - t_start))
+for det in detectors:
+    scale = np.max(np.abs(np.array(list(rho_intp_ref[det].values()))))
+    errors['rholm interpolated ' + det] = np.max([np.abs(rho_intp[det][mode] - rho_intp_ref[det][mode]) for mode in modes])/scale
+    errors['rholm interpolated, one mode ' + det] = np.max(np.abs(rholms_intp[det][modes[0]](t_eval[det]) - rho_intp_ref[det][modes[0]]))/scale
+    errors['rholm interpolated, at samples ' + det] = np.max([np.abs(rholms_intp[det][mode](t_dict[det]) - rholms[det][mode].data.data) for mode in modes])/scale
+
+for name in errors:
+    print(" ", name, " max diff (relative, for values) ", errors[name])
+
+if opts.as_test:
+    for name in errors:
+        assert errors[name] < 1e-10, name
@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   Independent sampler chains (CIP --sampler-n-chains), merged with statutils.merge_chain_estimates/merge_chain_samples:
+#     - on a gaussian integrand with an analytic evidence, the merged lnZ and its error agree with a single run drawing the same
+#       total number of samples (and with the analytic answer)
+#     - ln I / ln var(I) merge agrees with the merge of I / var(I); the retained samples are concatenated
+#     - chain checkpoint files keep the extension (x.npz -> x_chain0.npz)
+#
+# EXAMPLE
+#    python test_sampler_chains.py --as-test
+
+import numpy as np
+from RIFT.integrators import mcsamplerGPU, statutils
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--n-chunk",default=4000,type=int)
+parser.add_option("--n-chunks-per-chain",default=10,type=int)
+parser.add_option("--n-chains",default=4,type=int)
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+llim, rlim = -5, 5
+lnL_offset = 50
+sigma = np.array([0.3, 0.8])
+lnZ_expected = np.log(2*np.pi*np.prod(sigma)) - np.log((rlim-llim)**2)   # gaussian integral, times uniform prior
+
+def ln_f(x1, x2):
+    return lnL_offset - 0.5*((x1/sigma[0])**2 + (x2/sigma[1])**2)
+
+def run(n_chunks, seed):
+    np.random.seed(seed)
+    sampler = mcsamplerGPU.MCSampler()
+    for p in ['x1','x2']:
+        sampler.add_parameter(p, pdf=np.vectorize(lambda x:1/(rlim-llim)),
+            prior_pdf=np.vectorize(lambda x:1/(rlim-llim)),
+            left_limit=llim, right_limit=rlim,adaptive_sampling=True)
+    sampler.setup()
+    lnZ, lnvar, neff, _ = sampler.integrate_log(ln_f, 'x1', 'x2', n=opts.n_chunk, nmax=n_chunks*opts.n_chunk, neff=np.inf, n_adapt=100, tempering_exp=0.1,
+                                                save_intg=True, enforce_bounds=True, no_protect_names=True, verbose=False)
+    rvs = {k: sampler.identity_convert(v) if hasattr(sampler,'identity_convert') else v for k,v in sampler._rvs.items()}
+    return lnZ - lnL_offset, lnvar - 2*lnL_offset, rvs, sampler.ntotal
+
+checks = {}
+
+# chains, merged, vs one run with the same total number of draws
+chain_results = [run(opts.n_chunks_per_chain, 1+indx) for indx in range(opts.n_chains)]
+res_chains = np.array([r[0] for r in chain_results])
+var_chains = np.array([r[1] for r in chain_results])
+n_chain_draws = np.array([r[3] for r in chain_results], dtype=float)
+lnZ_merged, lnvar_merged = statutils.merge_chain_estimates(res_chains, var_chains, n_chain_draws, use_lnL=True)
+err_merged = np.exp(0.5*lnvar_merged - lnZ_merged)
+lnZ_single, lnvar_single, rvs_single, n_single = run(opts.n_chains*opts.n_chunks_per_chain, 100)
+err_single = np.exp(0.5*lnvar_single - lnZ_single)
+for indx in range(opts.n_chains):
+    print(" Chain ", indx, " lnZ ", res_chains[indx], " sigma/Z ", np.exp(0.5*var_chains[indx] - res_chains[indx]), " ndraw ", int(n_chain_draws[indx]))
+print(" Merged lnZ ", lnZ_merged, " sigma/Z ", err_merged, " ndraw ", int(np.sum(n_chain_draws)))
+print(" Single lnZ ", lnZ_single, " sigma/Z ", err_single, " ndraw ", n_single)
+print(" Expected lnZ ", lnZ_expected)
+checks['same total draws'] = np.sum(n_chain_draws) == n_single
+checks['merged lnZ vs analytic'] = np.abs(lnZ_merged - lnZ_expected) < 4*err_merged + 1e-3
+checks['merged lnZ vs single run'] = np.abs(lnZ_merged - lnZ_single) < 4*np.sqrt(err_merged**2 + err_single**2) + 1e-3
+checks['merged error vs single run'] = 0.5 < err_merged/err_single < 2
+checks['merged error vs chains'] = err_merged < np.min(np.exp(0.5*var_chains - res_chains))
+
+# log and linear merges agree
+res_lin, var_lin = statutils.merge_chain_estimates(np.exp(res_chains), np.exp(var_chains), n_chain_draws)
+checks['log and linear merges agree'] = np.abs(np.log(res_lin) - lnZ_merged) < 1e-10 and np.abs(np.log(var_lin) - lnvar_merged) < 1e-10
+
+# retained samples concatenated
+n_chain_samples = np.array([len(r[2]['x1']) for r in chain_results])
+rvs_merged = statutils.merge_chain_samples([r[2] for r in chain_results], n_chain_samples)
+checks['samples concatenated'] = all([len(rvs_merged[k]) == np.sum(n_chain_samples) for k in ['x1', 'x2', 'log_integrand', 'log_weights']]) and \
+    np.array_equal(rvs_merged['x1'], np.concatenate([r[2]['x1'] for r in chain_results]))
+
+# checkpoint file names
+checks['chain checkpoint file'] = statutils.chain_checkpoint_file('run/x.npz', 0) == 'run/x_chain0.npz' and statutils.chain_checkpoint_file('x', 3) == 'x_chain3'
+
+for name in checks:
+    print(" ", name, checks[name])
+
+if opts.as_test:
+    for name in checks:
+        assert checks[name], name
@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   senni.Interpolator (CIP --fit-method nn) learns a smooth quadratic lnL:
+#     - without early stopping (patience=None: all epochs) and with a finite patience (CIP --fit-nn-patience): training stops once
+#       the validation chi2 has not improved for that many epochs, and the best network is kept
+#     - evaluate (input scaling folded into the first layer; raw inputs) agrees with the network applied to explicitly scaled inputs,
+#       including for a narrow, offset input (like chirp mass)
+#   Skipped unless torch is available.
+#
+# EXAMPLE
+#    python test_senni.py --as-test
+
+import sys
+import numpy as np
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--n-pts",default=2000,type=int)
+parser.add_option("--epochs",default=60,type=int)
+parser.add_option("--patience",default=5,type=int)
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+try:
+    import torch
+    from RIFT.interpolators import senni
+except ImportError as e:
+    print(" torch not available, skipping: ", e)
+    sys.exit(0)
+
+x_center = np.array([1.2, 0.])
+x_width = np.array([1e-3, 1.])
+def quadratic_data(n_pts, seed):
+    rng = np.random.default_rng(seed)
+    u = rng.uniform(-1, 1, size=(n_pts, len(x_center)))
+    return x_center + x_width*u, 20 - 10*np.sum(u**2, axis=1)
+
+checks = {}
+x, y = quadratic_data(opts.n_pts, 0)
+x_test, y_test = quadratic_data(500, 1)
+for patience in [None, opts.patience]:
+    torch.manual_seed(0)
+    np.random.seed(0)
+    validation_losses = []
+    nn_interpolator = senni.Interpolator(x, y[:,np.newaxis], None, epochs=opts.epochs, frac=0.2, test_frac=0, no_pad=True, patience=patience)
+    validation_loss_value = nn_interpolator.validation_loss_value
+    def validation_loss_recorded():
+        validation_losses.append(float(validation_loss_value()))
+        return validation_losses[-1]
+    nn_interpolator.validation_loss_value = validation_loss_recorded
+    nn_interpolator.train(debug=False)
+    residual = nn_interpolator.evaluate(x_test) - y_test
+    print(" patience {}: epochs run {}, residual std {}, data std {} ".format(patience, len(validation_losses), np.std(residual), np.std(y_test)))
+    checks['fit, patience {}'.format(patience)] = np.std(residual) < 0.1*np.std(y_test)
+    if patience is None:
+        checks['all epochs, patience None'] = len(validation_losses) == opts.epochs
+    else:
+        checks['stopped early or at the end, patience {}'.format(patience)] = len(validation_losses) <= opts.epochs
+        checks['keeps best network, patience {}'.format(patience)] = float(nn_interpolator.valid_loss) <= np.min(validation_losses)*(1+1e-5)
+
+    # evaluate (folded first layer) vs the network on explicitly scaled inputs
+    nn_interpolator.net.eval()
+    with torch.no_grad():
+        y_scaled = nn_interpolator.net(torch.from_numpy(nn_interpolator.scale_input(x_test)).float()).numpy()[:,0]
+    y_ref = y_scaled*nn_interpolator.target_sigma + nn_interpolator.target_mu
+    err = np.max(np.abs(nn_interpolator.evaluate(x_test) - y_ref))/np.std(y_test)
+    print(" evaluate vs scaled inputs: max diff (relative to data std) ", err)
+    checks['evaluate, raw inputs, patience {}'.format(patience)] = err < 1e-4
+
+for name in checks:
+    print(" ", name, checks[name])
+
+if opts.as_test:
+    for name in checks:
+        assert checks[name], name
@@ -0,0 +1,54 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   convert_waveform_coordinates, generic vectorized engine: coordinate systems without a hand-written conversion (formerly a
+#   per-sample ChooseWaveformParams loop) agree with ChooseWaveformParams.extract_param, point by point
+#
+# EXAMPLE
+#    python test_vector_coordinates_engine.py --as-test
+
+
+import numpy as np
+import RIFT.lalsimutils as lalsimutils
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--npts",type=int,default=20)
+parser.add_option("--as-test",action='store_true')
+parser.add_option("--verbose",action='store_true')
+opts, args = parser.parse_args()
+
+np.random.seed(0)
+npts=opts.npts
+P_list =[]
+for indx in np.arange(npts):
+    P = lalsimutils.ChooseWaveformParams()
+    P.randomize()
+    P.lambda1, P.lambda2 = np.random.uniform(0, 1000, size=2)
+    P_list.append(P)
+
+errors = {}
+for coord_names, low_level_coord_names in [
+        [['mc','eta','q','chi_p','chi1','cos_theta1','phi1'], ['mtot','q','s1x','s1y','s1z','s2x','s2y','s2z']],
+        [['m1','m2','xi','chiMinus','chi1_perp_bar','LambdaTilde','DeltaLambdaTilde'], ['mc','eta','s1z_bar','chi1_perp_bar','phi1','s2z_bar','chi2_perp_bar','phi2','lambda1','lambda2']],
+        [['mtot','delta_mc','lambda1','lambda2','chiz_plus','chiz_minus'], ['mc','delta_mc','s1z','s2z','LambdaTilde','DeltaLambdaTilde']],
+        ]:
+    x1 = np.zeros((npts,len(coord_names)))
+    y2 = np.zeros((npts,len(low_level_coord_names)))
+    for indx in np.arange(npts):
+        P = P_list[indx]
+        for indx_name  in np.arange(len(coord_names)):
+            x1[indx,indx_name]  = P.extract_param( coord_names[indx_name])
+        for indx_name2 in np.arange(len(low_level_coord_names)):
+            y2[indx,indx_name2]  = P.extract_param( low_level_coord_names[indx_name2])
+    x2 = lalsimutils.convert_waveform_coordinates(y2, coord_names=coord_names, low_level_coord_names=low_level_coord_names)
+    if opts.verbose:
+        print(x2)
+    err = np.max(np.abs(x1 - x2)/(1e-10+np.abs(x1)))
+    print("Generic engine test ", low_level_coord_names, " -> ", coord_names, err)
+    errors[tuple(low_level_coord_names)] = err
+
+if opts.as_test:
+    for name in errors:
+        if errors[name] > 1e-3:  # tidal inversion is poorly conditioned near equal mass
+            raise ValueError(" Large deviation seen: {} ".format(name))
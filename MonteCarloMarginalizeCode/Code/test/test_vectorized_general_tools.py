@@ -0,0 +1,53 @@
+#! /usr/bin/env python
+#
+# GOAL
+#   Batched histogram / inverse cdf (used by mcsamplerGPU) agree with numpy.histogram / numpy.interp, row by row.
+#   Also reports the time of the compiled (numba) and numpy.interp inverse cdf paths.
+#
+# EXAMPLE
+#    python test_vectorized_general_tools.py --as-test
+
+import time
+import numpy as np
+import RIFT.likelihood.vectorized_general_tools as vgt
+
+import optparse
+parser = optparse.OptionParser()
+parser.add_option("--n-rows",default=8,type=int)
+parser.add_option("--n-bins",default=100,type=int)
+parser.add_option("--n-samples",default=400000,type=int)
+parser.add_option("--as-test",action='store_true')
+opts, args = parser.parse_args()
+
+rng = np.random.default_rng(0)
+n_rows, n_bins, n_samples = opts.n_rows, opts.n_bins, opts.n_samples
+
+# histogram_batched vs numpy.histogram
+x = rng.random((n_rows, n_samples))
+wt = rng.random(n_samples)
+hist = vgt.histogram_batched(x, n_bins, weights=wt)
+hist_np = np.array([np.histogram(x[k], bins=n_bins, range=(0,1), weights=wt)[0] for k in range(n_rows)])
+print(" histogram_batched max diff ", np.max(np.abs(hist - hist_np)))
+
+# inverse_cdf_batched vs numpy.interp; spiky cdfs with empty bins
+w = rng.random((n_rows, n_bins))**4
+w[:, ::7] = 0
+cdf = np.concatenate([np.zeros((n_rows,1)), np.cumsum(w, axis=1)], axis=1)
+cdf /= cdf[:,-1:]
+P = rng.random((n_rows, n_samples))
+edges = np.linspace(0, 1, n_bins+1)
+y_np = np.array([np.interp(P[k], cdf[k], edges) for k in range(n_rows)])
+
+vgt.inverse_cdf_batched(P[:,:10], cdf)  # compile, if numba
+for use_numba in [False, True]:
+    t_start = time.perf_counter()
+    y, indx = vgt.inverse_cdf_batched(P, cdf, return_bins=True, use_numba=use_numba)
+    t_here = time.perf_counter() - t_start
+    err = np.max(np.abs(y - y_np))
+    print(" inverse_cdf_batched use_numba={} (numba available {}) : time {} max diff {} ".format(use_numba, vgt.numba_ok, t_here, err))
+    if opts.as_test:
+        assert err < 1e-9
+        assert np.all(edges[indx] <= y + 1e-12) and np.all(y <= edges[indx+1] + 1e-12)   # bins contain the samples
+
+if opts.as_test:
+    assert np.allclose(hist, hist_np)